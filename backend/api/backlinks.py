@@ -0,0 +1,118 @@
+import copy
+import logging
+from typing import Iterable, Optional, Tuple
+from aiohttp import web
+from bson import ObjectId
+from backend.api import linker
+from backend.db_clients.base_client import DBClient
+
+LOG = logging.getLogger(__name__)
+
+# the "linked_records" array of every record is the (multikey indexed, see backend.indexes) reverse index of all links
+BACKLINK_FIELD = "linked_records"
+BACKLINK_PROJECTION = ["_id", "name_id", "type", "names", "last_name"]
+MAX_PAGE_SIZE = 100
+
+
+async def get_backlinks(
+    db_client: DBClient,
+    record_id: ObjectId,
+    after: Optional[ObjectId] = None,
+    limit: int = 20,
+) -> Tuple[list, Optional[ObjectId]]:
+    """Fetches a page of the records that link to a record (keyset pagination on _id)
+
+    Args:
+        db_client (DBClient): A database client
+        record_id (ObjectId): _id of the linked record
+        after (Optional[ObjectId], optional): _id of the last record of the previous page. Defaults to None.
+        limit (int, optional): page size. Defaults to 20.
+
+    Returns:
+        Tuple[list, Optional[ObjectId]]: the linking records and the key of the next page (None if this is the last page)
+    """
+    filter = {BACKLINK_FIELD: record_id}
+    if after is not None:
+        filter["_id"] = {"$gt": after}
+
+    # fetch one more to know if there is a next page
+    records = await db_client.find_many(
+        filter, BACKLINK_PROJECTION, sort=[("_id", 1)], limit=limit + 1
+    )
+    if len(records) > limit:
+        records = records[:limit]
+        return records, records[-1]["_id"]
+    return records, None
+
+
+def unlink_record(it: Iterable, name_id: str) -> Iterable:
+    """Recursively removes all links to a record (keeping the link text) from any iterable of a record
+
+    Args:
+        it (Iterable): the record (or a part of it)
+        name_id (str): name_id of the record the links point to
+
+    Returns:
+        Iterable: the iterable without links to the record
+    """
+    if isinstance(it, dict):
+        for key, value in it.items():
+            it[key] = unlink_record(value, name_id)
+        return it
+
+    if isinstance(it, list):
+        for index, entry in enumerate(it):
+            it[index] = unlink_record(entry, name_id)
+        return it
+
+    if isinstance(it, str) and f'href="{name_id}"' in it:
+        parts = []
+        for plain_text, html in linker.split_html(it):
+            parts.append(plain_text)
+            href = linker.HREF_PATTERN.search(html)
+            if href and href.group(1) == name_id and html.endswith("</a>"):
+                # link text is everything between the opening and the closing tag
+                html = html[html.index(">") + 1 : -len("</a>")]
+            parts.append(html)
+        return "".join(parts)
+
+    return it
+
+
+async def relink_backlinks(
+    app: web.Application, record_id: ObjectId, old_name_id: Optional[str] = None
+) -> int:
+    """Relinks only the records that link to a renamed or deleted record
+
+    Args:
+        app (web.Application): the app (provides db client, known records and config)
+        record_id (ObjectId): _id of the renamed or deleted record
+        old_name_id (Optional[str], optional): the name_id the existing links point to. Defaults to None.
+
+    Returns:
+        int: number of modified records
+    """
+    db_client = app.db_clients["mongo"]
+    snapshot = app.known_records.snapshot()
+    storage = linker.get_storage_mode(app.config)
+    records = await db_client.find_many({BACKLINK_FIELD: record_id})
+
+    def relinked_records():
+        for record in records:
+            filter = {"_id": record.pop("_id")}
+            stored = copy.deepcopy(record)
+            if old_name_id:
+                unlink_record(record, old_name_id)
+            record = snapshot.insert_links(record, storage)
+            yield filter, linker.stamp_link_state(
+                linker.get_record_diff(stored, record), record, stored.get("link_state")
+            )
+
+    config = app.config.get("linker", {})
+    modified = await db_client.bulk_apply_diffs(
+        relinked_records(),
+        batch_size=config.get("write_batch_size", 500),
+        max_in_flight=config.get("writes_in_flight", 4),
+    )
+    LOG.info(f"Relinked {modified} of {len(records)} records linking to {record_id}")
+    return modified
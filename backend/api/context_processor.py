@@ -4,7 +4,6 @@ from bson import ObjectId
 import typing
 from aiohttp import web
 
-
 LOG = logging.getLogger(__name__)
 
 # legacy from file based initial exploration
@@ -45,6 +44,36 @@ async def get_context(request: web.Request):
     return {}
 
 
+def get_record_filter(request: web.Request) -> typing.Optional[dict]:
+    """the filter of the record of the request (by _id or name_id)"""
+    record_id = request.match_info.get("identifier")
+    if not record_id:
+        return None
+
+    if ObjectId.is_valid(record_id):
+        return {"_id": ObjectId(record_id)}
+    return {"name_id": record_id}
+
+
+async def get_record_version(request: web.Request) -> typing.Optional[dict]:
+    """Fetches only the fields that identify the version of the requested record (see http_cache)
+
+    Args:
+        request (web.Request): the client's web request
+
+    Returns:
+        dict/None: "_id", "last_modified" and "creation_date" of the record, or None
+    """
+    filter = get_record_filter(request)
+    if filter is None:
+        return None
+
+    # TODO not "default". read the db client name from the user session (users should be able to select which db they want to use)
+    return await request.app.db_clients["mongo"].find(
+        filter, ["_id", "last_modified", "creation_date"]
+    )
+
+
 async def get_record_context(request: web.Request) -> typing.Optional[dict]:
     """Gets the specific information required to render an article page.
 
@@ -55,14 +84,11 @@ async def get_record_context(request: web.Request) -> typing.Optional[dict]:
         dict/None: a dict containing the article information, or None
     """
 
-    record_id = request.match_info.get("identifier")
-    if not record_id:
+    filter = get_record_filter(request)
+    if filter is None:
         return {}
 
-    filter = {"_id": record_id}
-    if not ObjectId.is_valid(record_id):
-        filter = {"name_id": record_id}
-
+    # concurrent requests of the same record page already share this find (see records.get)
     # TODO not "default". read the db client name from the user session (users should be able to select which db they want to use)
     record = await request.app.db_clients["mongo"].find(filter)
     return record
@@ -1,66 +1,269 @@
+import asyncio
+import json
 import logging
 import aiohttp_jinja2
 from aiohttp import web
 from bson import ObjectId
-from backend.api import linker, context_processor
+from pymongo.errors import DuplicateKeyError
+from backend.api import (
+    backlinks as backlinks_index,
+    context_processor,
+    linker,
+    relink_queue,
+)
+from backend import http_cache
 from backend.api.handlers import error_pages
 from backend.api.errors import RequestError
 
 LOG = logging.getLogger(__name__)
 
+# name_ids are unique (see backend.indexes)
+NAME_ID_CONFLICT = {
+    **RequestError.conflict,
+    "message": "A record with this name_id exists already",
+}
+
 
 async def get(request: web.Request) -> web.Response:
+    # conditional requests of unchanged pages are answered by the version of the record (no fetch, no render)
+    if http_cache.is_conditional(request):
+        version = await context_processor.get_record_version(request)
+        validators = version and http_cache.get_record_validators(request.app, version)
+        if validators and http_cache.is_not_modified(request, validators):
+            return http_cache.not_modified(request.app, validators)
+
+    # concurrent requests of the same record share one lookup and render (the page does not depend on the user)
+    page = await request.app.record_pages.do(
+        request.match_info.get("identifier"), lambda: render_record(request)
+    )
+    if isinstance(page, dict):
+        return error_pages.get_error_page(request, page)
+
+    text, validators = page
+    return http_cache.set_validators(
+        web.Response(text=text, content_type="text/html"), request.app, validators
+    )
+
+
+async def render_record(request: web.Request):
+    """renders the page of the requested record and its cache validators (returns the RequestError if there is none)"""
     context = await context_processor.get_context(request)
     if not context:
-        return error_pages.get_error_page(request, RequestError.not_found)
+        return RequestError.not_found
 
     record_type = context.get("type")
     if not record_type:
-        return error_pages.get_error_page(request, RequestError.corrupt)
+        return RequestError.corrupt
+
+    # validators of the stored record (before the links are rendered into the context)
+    validators = http_cache.get_record_validators(request.app, context)
+
+    # records stored with mention spans get their links when they are rendered
+    if context.get("mentions"):
+        context.update(render_mentions(request.app, context))
+
+    text = aiohttp_jinja2.render_string("{}.html".format(record_type), request, context)
+    return text, validators
+
 
-    return aiohttp_jinja2.render_template(
-        "{}.html".format(record_type), request, context
+def render_mentions(app: web.Application, record: dict) -> dict:
+    """Renders the links of a record stored with mention spans. The output is cached per span set version
+    and the current name_ids of the linked records (links follow renamed records without rewriting the record)
+    """
+    name_ids = {}
+    for record_id in record.get("linked_records", []):
+        known_record = app.known_records.get(record_id)
+        name_ids[record_id] = known_record["name_id"] if known_record else None
+
+    key = (
+        record.get("_id"),
+        record.get("mentions_version"),
+        tuple(name_ids.items()),
     )
+    rendered = app.rendered_mentions.get(key)
+    if rendered is None:
+        rendered = linker.render_mentions(record, name_ids.get)
+        app.rendered_mentions.set(key, rendered)
+    return rendered
 
 
 async def post(request: web.Request) -> web.Response:
     data = await request.json()
     # TODO not "default". read the db client name from the user session (users should be able to select which db they want to use)
-    known_records = await linker.get_known_records_map(request.app.db_clients["mongo"])
-    data = linker.insert_links(data, known_records)
-    result = await request.app.db_clients["mongo"].store(data)
+    known_records = request.app.known_records.snapshot()
+    data = await request.app.link_executor.insert_links(data, known_records)
+    try:
+        result = await request.app.db_clients["mongo"].store(data)
+    except DuplicateKeyError:
+        return NAME_ID_CONFLICT
     if not result:
         return RequestError.service_unavailable
+
+    # existing records that mention the new record are linked to it in the background
+    await relink_queue.schedule(request.app, result)
     return {"data": result, "status": 201}
 
 
+async def bulk(request: web.Request) -> web.Response:
+    """Creates many records at once from a JSON array or an NDJSON stream (one record per line).
+    The records of the batch are known to each other while linking, so they link to each other as well.
+    Answers with one result per record (status and _id or error).
+    """
+    config = request.app.config.get("linker", {})
+    try:
+        items = await read_bulk_items(request, config.get("bulk_max_records", 10000))
+    except ValueError as error:
+        return {**RequestError.malformed_request, "message": str(error)}
+
+    results = [None] * len(items)
+    records = []
+    for index, item in enumerate(items):
+        if (
+            not isinstance(item, dict)
+            or not item.get("name_id")
+            or not item.get("type")
+        ):
+            results[index] = {"index": index, **RequestError.malformed_request}
+            continue
+        # the _ids are needed before storing because records of the batch link to each other
+        item["_id"] = ObjectId()
+        records.append((index, item))
+
+    snapshot = request.app.known_records.snapshot().extend(item for _, item in records)
+    in_flight = asyncio.Semaphore(config.get("link_concurrency", 4))
+
+    async def link(item: dict) -> dict:
+        async with in_flight:
+            return await request.app.link_executor.insert_links(item, snapshot)
+
+    linked = await asyncio.gather(*(link(item) for _, item in records))
+    stored_ids = await request.app.db_clients["mongo"].store_many(
+        linked, batch_size=config.get("write_batch_size", 500)
+    )
+
+    # existing records that mention the new records are linked to them in the background
+    await relink_queue.schedule_many(
+        request.app, [record_id for record_id in stored_ids if record_id is not None]
+    )
+
+    for (index, _), record_id in zip(records, stored_ids):
+        if record_id is None:
+            # the only expected insert error is a duplicate name_id
+            results[index] = {"index": index, **NAME_ID_CONFLICT}
+        else:
+            results[index] = {"index": index, "status": 201, "_id": record_id}
+
+    created = all(result["status"] == 201 for result in results)
+    return {"data": {"results": results}, "status": 201 if created else 207}
+
+
+async def read_bulk_items(request: web.Request, max_items: int) -> list:
+    """Reads the records of a bulk request (JSON array or NDJSON if the content type says so)
+
+    Raises:
+        ValueError: if the body is no JSON array / NDJSON or has more than max_items records
+    """
+    items = []
+    if request.content_type in ("application/x-ndjson", "application/jsonl"):
+        # NDJSON is parsed while it is received
+        async for line in request.content:
+            line = line.strip()
+            if not line:
+                continue
+            items.append(json.loads(line))
+            if len(items) > max_items:
+                raise ValueError(f"at most {max_items} records per request")
+        return items
+
+    items = await request.json()
+    if not isinstance(items, list):
+        raise ValueError("expected a JSON array of records")
+    if len(items) > max_items:
+        raise ValueError(f"at most {max_items} records per request")
+    return items
+
+
 async def put(request: web.Request) -> web.Response:
     data = await request.json()
     record_id = request.match_info.get("record_id")
     if not record_id or not ObjectId.is_valid(record_id):
         return RequestError.malformed_request
 
+    record_id = ObjectId(record_id)
     filter = {"_id": record_id}
     # TODO not "default". read the db client name from the user session (users should be able to select which db they want to use)
-    known_records = await linker.get_known_records_map(request.app.db_clients["mongo"])
-    data = linker.insert_links(data, known_records)
-    result = await request.app.db_clients["mongo"].update(filter, data)
-    if not result:
+    db_client = request.app.db_clients["mongo"]
+    stored = await db_client.find(filter)
+    if not stored:
+        return RequestError.not_found
+
+    known_records = request.app.known_records.snapshot()
+    previous = request.app.known_records.get(record_id)
+    data = await request.app.link_executor.insert_links(data, known_records)
+    # only the changed parts of the record are written (nothing if the record did not change)
+    try:
+        # the stored record is linked already, so the next link_all does not relink it
+        diff = linker.stamp_link_state(
+            linker.get_record_diff(stored, data), data, stored.get("link_state")
+        )
+        result = await db_client.apply_diff(filter, diff)
+    except DuplicateKeyError:
+        # renamed to the name_id of another record
+        return NAME_ID_CONFLICT
+    if result is None:
         return RequestError.service_unavailable
+
+    # if the names of the record changed, records that mention the new names have to link to it and links to
+    # the old name have to be replaced (mention spans point to the _id, so they don't need to be updated)
+    if previous != request.app.known_records.get(record_id):
+        renamed = previous and previous["name_id"] != data.get("name_id")
+        await relink_queue.schedule(
+            request.app, record_id, [previous["name_id"]] if renamed else []
+        )
     return {"data": result, "status": 200}
 
 
 async def delete(request: web.Request) -> web.Response:
-    data = await request.json()
     record_id = request.match_info.get("record_id")
     if not record_id or not ObjectId.is_valid(record_id):
         return web.Response(status=404)
 
+    record_id = ObjectId(record_id)
     filter = {"_id": record_id}
     # TODO not "default". read the db client name from the user session (users should be able to select which db they want to use)
-    known_records = await linker.get_known_records_map(request.app.db_clients["mongo"])
-    data = linker.insert_links(data, known_records)
-    result = await request.app.db_clients["mongo"].update(filter, data)
+    previous = request.app.known_records.get(record_id)
+    result = await request.app.db_clients["mongo"].delete(filter, None)
     if not result:
         return RequestError.service_unavailable
+
+    # links to the deleted record have to be removed from all records that link to it
+    # (mention spans of deleted records are not rendered as links)
+    if previous:
+        await relink_queue.schedule(request.app, record_id, [previous["name_id"]])
     return {"data": result, "status": 200}
+
+
+async def backlinks(request: web.Request) -> web.Response:
+    identifier = request.match_info.get("identifier")
+    filter = {"name_id": identifier}
+    if ObjectId.is_valid(identifier):
+        filter = {"_id": ObjectId(identifier)}
+
+    db_client = request.app.db_clients["mongo"]
+    record = await db_client.find(filter, ["_id"])
+    if not record:
+        return RequestError.not_found
+
+    after = request.query.get("after")
+    if after is not None and not ObjectId.is_valid(after):
+        return RequestError.malformed_request
+    try:
+        limit = int(request.query.get("limit", 20))
+    except ValueError:
+        return RequestError.malformed_request
+    limit = max(1, min(limit, backlinks_index.MAX_PAGE_SIZE))
+
+    records, next_after = await backlinks_index.get_backlinks(
+        db_client, record["_id"], ObjectId(after) if after else None, limit
+    )
+    return {"data": {"backlinks": records, "next": next_after}, "status": 200}
@@ -0,0 +1,52 @@
+import logging
+from aiohttp import web
+from backend.api import search as search_index
+from backend.api.errors import RequestError
+
+LOG = logging.getLogger(__name__)
+
+
+async def get(request: web.Request) -> web.Response:
+    query = request.query.get("q", "").strip()
+    if not query or len(query) > search_index.MAX_QUERY_LENGTH:
+        return RequestError.malformed_request
+
+    types = get_types(request)
+    try:
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 20))
+    except ValueError:
+        return RequestError.malformed_request
+    if not 0 <= offset < search_index.MAX_OFFSET:
+        return RequestError.malformed_request
+    limit = max(1, min(limit, search_index.MAX_PAGE_SIZE))
+
+    records, next_offset = await search_index.search_records(
+        request.app.db_clients["mongo"], query, types, offset, limit
+    )
+    return {"data": {"results": records, "next": next_offset}, "status": 200}
+
+
+async def autocomplete(request: web.Request) -> web.Response:
+    # answered from the in-memory name trie of the known records, so typing does not hit the db
+    prefix = request.query.get("prefix", "").strip()
+    if not prefix or len(prefix) > search_index.MAX_QUERY_LENGTH:
+        return RequestError.malformed_request
+    try:
+        limit = int(request.query.get("limit", 10))
+    except ValueError:
+        return RequestError.malformed_request
+    limit = max(1, min(limit, search_index.MAX_PAGE_SIZE))
+
+    completions = request.app.known_records.complete(prefix, limit, get_types(request))
+    return {"data": {"results": completions}, "status": 200}
+
+
+def get_types(request: web.Request) -> list:
+    # ?type=person&type=location or ?type=person,location
+    return [
+        record_type
+        for value in request.query.getall("type", [])
+        for record_type in value.split(",")
+        if record_type
+    ]
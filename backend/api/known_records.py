@@ -0,0 +1,269 @@
+import asyncio
+import itertools
+import logging
+from typing import Hashable, Iterable, List, Optional
+from backend.api import linker
+from backend.api.mention_matcher import MentionMatcher
+from backend.api.name_trie import NameTrie
+from backend.db_clients.base_client import DBClient
+
+LOG = logging.getLogger(__name__)
+
+# versions of extended snapshots must never be reused (worker processes identify their warm copy by the version)
+_extension_ids = itertools.count(1)
+
+
+class KnownRecordsSnapshot:
+    """Consistent view of the known records map at a specific version.
+    The map of a snapshot is shared by all requests and must never be modified.
+    """
+
+    def __init__(self, version: Hashable, records_map: dict):
+        self.version = version
+        self.records_map = records_map
+        self._name_variants = None
+        self._matcher = None
+
+    @property
+    def name_variants(self) -> dict:
+        """the precomputed names of all persons of this version (built on first use)"""
+        if self._name_variants is None:
+            self._name_variants = linker.build_name_variants(self.records_map)
+        return self._name_variants
+
+    @property
+    def matcher(self) -> MentionMatcher:
+        """the mention matcher of this version (built on first use)"""
+        if self._matcher is None:
+            self._matcher = linker.build_mention_matcher(
+                self.records_map, self.name_variants
+            )
+        return self._matcher
+
+    def extend(self, records: Iterable[dict]) -> "KnownRecordsSnapshot":
+        """Returns a snapshot that also knows records that are not stored yet (e.g. a batch of new records
+        that should link to each other). This snapshot is not modified.
+
+        Args:
+            records (Iterable[dict]): the new records (at least the known record fields, incl. their future _id)
+
+        Returns:
+            KnownRecordsSnapshot: the extended snapshot (with a version of its own)
+        """
+        records_map = dict(self.records_map)
+        for record in records:
+            name = linker.purify_name(record["name_id"])
+            if name in records_map:
+                # the first record of a name wins (see linker.build_known_records_map)
+                continue
+            records_map[name] = {
+                field: record[field]
+                for field in linker.KNOWN_RECORD_FIELDS
+                if field in record
+            }
+        return KnownRecordsSnapshot((self.version, next(_extension_ids)), records_map)
+
+    def insert_links(self, record: dict, storage: str = "html") -> dict:
+        """links a record to the known records of this version (see linker.insert_links)"""
+        return linker.insert_links(
+            record, self.records_map, self.matcher, storage, self.name_variants
+        )
+
+
+class KnownRecords:
+    """Versioned in-memory known records map that is shared by the whole application.
+    It is loaded once and then kept up to date by the writes of the db client (write-through).
+    Every change publishes a new snapshot, so readers keep a consistent map while writers update it.
+    """
+
+    def __init__(self, collection: str = "records"):
+        self.collection = collection
+        # _id -> projected record
+        self._records = {}
+        # purified name -> _ids of the records with that name (in insertion order)
+        self._names = {}
+        # all names the records are mentioned by (see get_mention_names) for autocompletion
+        self._trie = NameTrie()
+        self._snapshot = KnownRecordsSnapshot(0, {})
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def get(self, record_id) -> Optional[dict]:
+        """returns the known fields of a record by its _id (or None if unknown)"""
+        return self._records.get(record_id)
+
+    def complete(
+        self, prefix: str, limit: int = 10, types: Optional[Iterable[str]] = None
+    ) -> List[dict]:
+        """Completes a prefix of the name of a record (alphabetically, so exact matches come first)
+
+        Args:
+            prefix (str): the typed prefix (case insensitive)
+            limit (int, optional): max number of completions. Defaults to 10.
+            types (Optional[Iterable[str]], optional): only records of these types. Defaults to None.
+
+        Returns:
+            List[dict]: the completed "name" with "_id", "name_id" and "type" of its record
+        """
+        if not types:
+            return self._trie.complete(prefix, limit)
+
+        types = set(types)
+
+        def accept(completion: dict) -> bool:
+            return completion["type"] in types
+
+        return self._trie.complete(prefix, limit, accept)
+
+    def snapshot(self) -> KnownRecordsSnapshot:
+        """returns the current snapshot. Keep using the same snapshot for the whole request"""
+        return self._snapshot
+
+    async def load(self, db_client: DBClient):
+        """(Re)builds the map from all records of the collection
+
+        Args:
+            db_client (DBClient): A database client
+        """
+        async with self._lock:
+            self._records = {}
+            self._names = {}
+            self._trie = NameTrie()
+            # records are streamed, only their projected known record fields are kept
+            async for record in db_client.iter_many(
+                {}, linker.KNOWN_RECORD_FIELDS, coll=self.collection
+            ):
+                self._add(record)
+            records_map = linker.build_known_records_map(
+                dict(record) for record in self._records.values()
+            )
+            self._publish(records_map)
+            LOG.info(
+                f"Loaded {len(records_map)} known records (version {self.version})"
+            )
+
+    async def on_write(self, collection: str, operation: str, documents: list):
+        """Callback for the writes of a db client. Updates the map if a write touched the records collection
+
+        Args:
+            collection (str): name of the written collection
+            operation (str): "store", "update", "replace" or "delete"
+            documents (list): the written documents (after the write, or before the write for deletes)
+        """
+        if collection != self.collection or not documents:
+            return
+
+        async with self._lock:
+            if operation == "delete":
+                self.remove(document["_id"] for document in documents)
+            else:
+                self.upsert(documents)
+
+    def upsert(self, documents: Iterable[dict]):
+        """Adds or updates records in the map and publishes a new snapshot if their known record fields changed
+
+        Args:
+            documents (Iterable[dict]): the stored records (at least the known record fields)
+        """
+        changed_names = set()
+        for document in documents:
+            if document.get("_id") is None or not document.get("name_id"):
+                continue
+
+            previous = self._records.get(document["_id"])
+            if previous and previous["name_id"] == document["name_id"]:
+                record = self._project(document)
+                if record == previous:
+                    # e.g. only links or articles changed: the snapshot (and its matcher) stays valid
+                    continue
+                # same name: keep the position so the entry of a shared name does not change
+                self._untrie(previous)
+                self._records[document["_id"]] = record
+                self._trie_names(record)
+                changed_names.add(linker.purify_name(document["name_id"]))
+                continue
+
+            changed_names.update(self._discard(document["_id"]))
+            changed_names.add(self._add(document))
+        self._update_names(changed_names)
+
+    def remove(self, record_ids: Iterable):
+        """Removes records from the map and publishes a new snapshot
+
+        Args:
+            record_ids (Iterable): _ids of the removed records
+        """
+        changed_names = set()
+        for record_id in record_ids:
+            changed_names.update(self._discard(record_id))
+        self._update_names(changed_names)
+
+    def _project(self, document: dict) -> dict:
+        return {
+            field: document[field]
+            for field in linker.KNOWN_RECORD_FIELDS
+            if field in document
+        }
+
+    def _add(self, document: dict) -> str:
+        record = self._project(document)
+        name = linker.purify_name(record["name_id"])
+        self._records[record["_id"]] = record
+        self._names.setdefault(name, []).append(record["_id"])
+        self._trie_names(record)
+        return name
+
+    def _discard(self, record_id) -> set:
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return set()
+
+        self._untrie(record)
+        name = linker.purify_name(record["name_id"])
+        self._names[name].remove(record_id)
+        if not self._names[name]:
+            del self._names[name]
+        return {name}
+
+    def _trie_names(self, record: dict):
+        completion = {
+            "_id": record["_id"],
+            "name_id": record["name_id"],
+            "type": record.get("type"),
+        }
+        for name in get_mention_names(record):
+            self._trie.add(name, record["_id"], {"name": name, **completion})
+
+    def _untrie(self, record: dict):
+        for name in get_mention_names(record):
+            self._trie.remove(name, record["_id"])
+
+    def _update_names(self, names: set):
+        if not names:
+            return
+
+        # copy on write: the map of the current snapshot may still be in use
+        records_map = dict(self._snapshot.records_map)
+        for name in names:
+            record_ids = self._names.get(name)
+            if not record_ids:
+                records_map.pop(name, None)
+                continue
+            records_map[name] = dict(self._records[record_ids[0]])
+        self._publish(records_map)
+
+    def _publish(self, records_map: dict):
+        self._snapshot = KnownRecordsSnapshot(self.version + 1, records_map)
+
+
+def get_mention_names(record: dict) -> set:
+    """the names a record is mentioned by: its purified name_id (capitalized like the linker matches it)
+    and all name variants of persons (see linker.get_all_possible_names_from_record)"""
+    names = {linker.purify_name(record["name_id"]).capitalize()}
+    if record.get("type") == "person":
+        names.update(linker.get_all_possible_names_from_record(record))
+    names.discard("")
+    return names
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Hashable, Optional
+from aiohttp import web
+from backend.api import linker
+from backend.api.known_records import KnownRecordsSnapshot
+
+LOG = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+# warm copy of the known records (snapshot incl. its matcher) kept by every worker process
+_worker_snapshot = None
+
+
+def _insert_links_in_worker(
+    record: dict, storage: str, version: Hashable, records_map: Optional[dict] = None
+) -> Optional[dict]:
+    """Links a record in a worker process using the worker's warm copy of the known records.
+
+    Args:
+        record (dict): the record in which the links should be inserted
+        storage (str): how the links are stored ("html" or "spans")
+        version (Hashable): version of the known records the record should be linked with
+        records_map (Optional[dict], optional): the known records map of that version. Only sent when the worker is stale.
+
+    Returns:
+        Optional[dict]: the linked record or None if the worker does not know the requested version
+    """
+    global _worker_snapshot
+    if records_map is not None:
+        _worker_snapshot = KnownRecordsSnapshot(version, records_map)
+
+    if _worker_snapshot is None or _worker_snapshot.version != version:
+        return None
+
+    return _worker_snapshot.insert_links(record, storage)
+
+
+class LinkExecutor:
+    """Runs the CPU-bound linking of records either inline (on the event loop), in a thread pool or in a process pool.
+    Worker processes keep a warm copy of the known records and only receive the map when its version changed.
+    """
+
+    def __init__(
+        self, mode: str = "inline", workers: Optional[int] = None, storage: str = "html"
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(
+                f"unknown linker executor mode '{mode}' (expected one of {EXECUTOR_MODES})"
+            )
+
+        self.mode = mode
+        self.workers = workers
+        self.storage = storage
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(self.workers)
+        elif self.mode == "process":
+            self._executor = ProcessPoolExecutor(self.workers)
+        LOG.info(f"linking records {self.mode} (workers: {self.workers or 'default'})")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def insert_links(self, record: dict, snapshot: KnownRecordsSnapshot) -> dict:
+        """Inserts links into a record without blocking the event loop (unless running inline)
+
+        Args:
+            record (dict): the record in which the links should be inserted
+            snapshot (KnownRecordsSnapshot): the known records to link to
+
+        Returns:
+            dict: the linked record (a copy if linked in a worker process)
+        """
+        if self._executor is None:
+            return snapshot.insert_links(record, self.storage)
+
+        loop = asyncio.get_event_loop()
+        if self.mode == "thread":
+            # the matcher of a new snapshot is built in the thread as well
+            return await loop.run_in_executor(
+                self._executor, partial(snapshot.insert_links, record, self.storage)
+            )
+
+        linked = await loop.run_in_executor(
+            self._executor,
+            partial(_insert_links_in_worker, record, self.storage, snapshot.version),
+        )
+        if linked is None:
+            # the worker did not have this version of the map yet
+            linked = await loop.run_in_executor(
+                self._executor,
+                partial(
+                    _insert_links_in_worker,
+                    record,
+                    self.storage,
+                    snapshot.version,
+                    snapshot.records_map,
+                ),
+            )
+        return linked
+
+
+def from_config(config: dict) -> LinkExecutor:
+    linker_config = config.get("linker", {})
+    return LinkExecutor(
+        linker_config.get("executor", "inline"),
+        linker_config.get("workers"),
+        linker.get_storage_mode(config),
+    )
+
+
+async def enable(app: web.Application):
+    app.link_executor.start()
+
+
+async def disable(app: web.Application):
+    app.link_executor.shutdown()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Optional
+
+LOG = logging.getLogger(__name__)
+
+# marks the end of the stream of a stage
+_DONE = object()
+
+
+class LinkPipeline:
+    """Overlaps reading, linking and writing records. Every stage runs concurrently and the stages are connected
+    by bounded queues, so a slow stage pauses the ones before it (backpressure) instead of piling up records.
+
+    read -> (link_concurrency x link) -> write
+    """
+
+    def __init__(
+        self,
+        link: Callable[[dict], Awaitable[Optional[Any]]],
+        write: Callable[[AsyncIterable], Awaitable[int]],
+        link_concurrency: int = 4,
+        queue_size: int = 1000,
+        progress_interval: Optional[float] = 10.0,
+    ):
+        """
+        Args:
+            link (Callable[[dict], Awaitable[Optional[Any]]]): links a record. Returns what should be written or None to skip the record
+            write (Callable[[AsyncIterable], Awaitable[int]]): consumes the stream of linked records and returns the number of written records
+            link_concurrency (int, optional): number of records that are linked at the same time. Defaults to 4.
+            queue_size (int, optional): number of records that may wait between two stages. Defaults to 1000.
+            progress_interval (Optional[float], optional): seconds between progress logs (None: no progress logs). Defaults to 10.0.
+        """
+        self.link = link
+        self.write = write
+        self.link_concurrency = max(1, link_concurrency)
+        self.queue_size = queue_size
+        self.progress_interval = progress_interval
+        self.stats = {"read": 0, "linked": 0, "skipped": 0, "written": 0}
+
+    async def run(self, records: AsyncIterable[dict]) -> dict:
+        """Runs all records through the pipeline
+
+        Args:
+            records (AsyncIterable[dict]): stream of the records to link
+
+        Returns:
+            dict: number of read, linked, skipped and written records
+        """
+        read_queue = asyncio.Queue(self.queue_size)
+        write_queue = asyncio.Queue(self.queue_size)
+        started = time.monotonic()
+
+        async def read():
+            try:
+                async for record in records:
+                    self.stats["read"] += 1
+                    await read_queue.put(record)
+            finally:
+                for _ in range(self.link_concurrency):
+                    await read_queue.put(_DONE)
+
+        async def link():
+            try:
+                while True:
+                    record = await read_queue.get()
+                    if record is _DONE:
+                        break
+                    linked = await self.link(record)
+                    if linked is None:
+                        self.stats["skipped"] += 1
+                        continue
+                    self.stats["linked"] += 1
+                    await write_queue.put(linked)
+            finally:
+                await write_queue.put(_DONE)
+
+        async def linked_records() -> AsyncIterator:
+            done = 0
+            while done < self.link_concurrency:
+                linked = await write_queue.get()
+                if linked is _DONE:
+                    done += 1
+                    continue
+                yield linked
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                self.log_progress(time.monotonic() - started)
+
+        reader = asyncio.ensure_future(read())
+        linkers = [asyncio.ensure_future(link()) for _ in range(self.link_concurrency)]
+        reporter = asyncio.ensure_future(report()) if self.progress_interval else None
+        try:
+            self.stats["written"] = await self.write(linked_records()) or 0
+            # raises the errors of the link stage (the reader may be stuck if all linkers failed)
+            await asyncio.gather(*linkers)
+            await reader
+        finally:
+            for task in [reader, *linkers, reporter]:
+                if task is not None:
+                    task.cancel()
+
+        self.log_progress(time.monotonic() - started)
+        return self.stats
+
+    def log_progress(self, seconds: float):
+        rate = self.stats["read"] / seconds if seconds else 0
+        LOG.info(
+            f"link pipeline: read {self.stats['read']}, linked {self.stats['linked']}, "
+            f"skipped {self.stats['skipped']}, written {self.stats['written']} "
+            f"({rate:.1f} records/s)"
+        )
@@ -1,21 +1,320 @@
+import copy
+import hashlib
 import logging
+import re
 from aiohttp import web
+from functools import partial
+from bson import json_util
 from posixpath import dirname
-from typing import Any, Iterable, Tuple
+from typing import Any, Callable, Container, Iterable, Optional, Tuple
+from backend.api import backlinks
+from backend.api.link_pipeline import LinkPipeline
+from backend.api.mention_matcher import MentionMatcher
 from backend.db_clients.base_client import DBClient
 
 LOG = logging.getLogger(__name__)
 
+# existing links (with their link text) and any other html tags are never linked (again)
+HTML_PATTERN = re.compile(r"<a\s[^>]*>.*?</a>|<[^>]*>", re.DOTALL | re.IGNORECASE)
+HREF_PATTERN = re.compile(r'href="([^"]*)"')
+
+# the linking state of the last run is persisted so that startup only relinks what changed since then
+LINK_STATE_COLL = "linker_state"
+LINK_STATE_ID = "known_records"
+# fields that are not part of a record's content (bookkeeping of the db client and the linker)
+UNHASHED_FIELDS = {"_id", "creation_date", "last_modified", "link_state"}
+# links are either stored as html in the text or as mention spans that are rendered on request
+STORAGE_MODES = ("html", "spans")
+# fields of a record that are compared per article title / infobox path by get_record_diff
+DIFFED_FIELDS = ("articles", "infobox")
+_MISSING = object()
+
 
 async def link_all(app: web.Application):
+    """Relinks all records whose content changed or whose mentioned records were added, removed or renamed since the last run"""
     db_client = app.db_clients["mongo"]
-    known_records = await get_known_records_map(db_client)
-    records = await db_client.find_many({})  # default coll is records
-    for record in records:
+    snapshot = app.known_records.snapshot()
+    known_records = snapshot.records_map
+    storage = get_storage_mode(app.config)
+
+    link_state = await db_client.find({"_id": LINK_STATE_ID}, coll=LINK_STATE_COLL)
+    fingerprints = get_known_records_fingerprints(known_records)
+    changed_keys, changed_ids = get_changed_records(link_state, fingerprints)
+    # links to renamed or deleted records that were not relinked yet (e.g. the relink queue failed)
+    removed_name_ids = set()
+    if storage == "html":
+        removed_name_ids = get_removed_name_ids(link_state, fingerprints)
+    generation = (link_state or {}).get("generation", 0)
+    if link_state is None or changed_keys:
+        generation += 1
+
+    # only the changed records have to be searched for to find records affected by the changes
+    changed_matcher = build_mention_matcher(
+        {key: known_records[key] for key in changed_keys if key in known_records},
+        snapshot.name_variants,
+    )
+
+    config = app.config.get("linker", {})
+    # records are streamed, so memory stays bounded by the batch sizes no matter how large the lore is
+    records = db_client.iter_many(
+        {},  # default coll is records
+        batch_size=config.get("read_batch_size", 500),
+        no_cursor_timeout=True,
+    )
+    executor = getattr(app, "link_executor", None)
+
+    async def relink(record: dict) -> Optional[Tuple[dict, dict]]:
+        if not needs_relink(record, changed_keys, changed_ids, changed_matcher):
+            return None
+
         record_id = record.pop("_id")
-        filter = {"_id": record_id}
-        record = insert_links(record, known_records)
-        await db_client.replace(filter, record)
+        stored = copy.deepcopy(record)
+        for name_id in removed_name_ids:
+            backlinks.unlink_record(record, name_id)
+        if executor is None:
+            record = snapshot.insert_links(record, storage)
+        else:
+            record = await executor.insert_links(record, snapshot)
+        # only the changed articles / infobox values are written
+        diff = stamp_link_state(
+            get_record_diff(stored, record),
+            record,
+            stored.get("link_state"),
+            generation,
+        )
+        # linking did not change anything and the stored state is still valid
+        if not diff["set"] and not diff["unset"]:
+            return None
+        return {"_id": record_id}, diff
+
+    pipeline = LinkPipeline(
+        relink,
+        partial(
+            db_client.bulk_apply_diffs,
+            batch_size=config.get("write_batch_size", 500),
+            max_in_flight=config.get("writes_in_flight", 4),
+        ),
+        link_concurrency=config.get("link_concurrency", 4),
+        queue_size=config.get("queue_size", 1000),
+        progress_interval=config.get("progress_interval", 10),
+    )
+    stats = await pipeline.run(records)
+    LOG.info(
+        f"Relinked {stats['written']} of {stats['read']} records (known records generation {generation})"
+    )
+    await db_client.replace(
+        {"_id": LINK_STATE_ID},
+        {"generation": generation, "records": list(fingerprints.values())},
+        upsert=True,
+        coll=LINK_STATE_COLL,
+    )
+
+
+def get_content_hash(record: dict) -> str:
+    """Hashes the content of a record (ignoring bookkeeping fields like _id or modification dates)
+
+    Args:
+        record (dict): the record to hash
+
+    Returns:
+        str: hex digest of the record content
+    """
+    content = {
+        key: value for key, value in record.items() if key not in UNHASHED_FIELDS
+    }
+    return hashlib.sha1(json_util.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def stamp_link_state(
+    diff: dict,
+    record: dict,
+    link_state: Optional[dict],
+    generation: Optional[int] = None,
+) -> dict:
+    """Adds the link state of a linked record to its diff (see get_record_diff), so the next link_all only relinks
+    it if its content or the records it mentions change. Nothing is added if the stored state is still valid.
+
+    Args:
+        diff (dict): the diff of the stored and the linked record
+        record (dict): the linked record
+        link_state (Optional[dict]): the stored link state of the record
+        generation (Optional[int], optional): generation of the known records (None keeps the stored one). Defaults to None.
+
+    Returns:
+        dict: the diff
+    """
+    link_state = link_state or {}
+    content_hash = get_content_hash(record)
+    if generation is None:
+        generation = link_state.get("generation", 0)
+    if content_hash != link_state.get("hash"):
+        diff["set"]["link_state"] = {"generation": generation, "hash": content_hash}
+    return diff
+
+
+def get_known_records_fingerprints(records_map: dict) -> dict:
+    """Creates a fingerprint for every entry of the known records map that changes whenever the way the record is mentioned changes
+
+    Args:
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+
+    Returns:
+        dict: mapping of the records map keys to the persistable state of their entry ("key", "_id", "name_id", "fingerprint")
+    """
+    fingerprints = {}
+    for key, replace_context in records_map.items():
+        fingerprints[key] = {
+            "key": key,
+            "_id": replace_context.get("_id"),
+            "name_id": replace_context.get("name_id"),
+            "fingerprint": get_content_hash({"key": key, **replace_context}),
+        }
+    return fingerprints
+
+
+def get_changed_records(
+    link_state: Optional[dict], fingerprints: dict
+) -> Tuple[set, set]:
+    """Compares the fingerprints of the current known records with the ones persisted by the last run
+
+    Args:
+        link_state (Optional[dict]): the persisted linking state of the last run (or None)
+        fingerprints (dict): the fingerprints of the current known records (see get_known_records_fingerprints)
+
+    Returns:
+        Tuple[set, set]: keys of all added, removed or changed entries and the _ids of the records behind the removed or changed ones
+    """
+    previous = {entry["key"]: entry for entry in (link_state or {}).get("records", [])}
+    changed_keys = set()
+    changed_ids = set()
+    for key in previous.keys() | fingerprints.keys():
+        old_entry = previous.get(key)
+        new_entry = fingerprints.get(key)
+        if (
+            old_entry
+            and new_entry
+            and old_entry["fingerprint"] == new_entry["fingerprint"]
+        ):
+            continue
+
+        changed_keys.add(key)
+        if old_entry:
+            changed_ids.add(old_entry["_id"])
+    return changed_keys, changed_ids
+
+
+def get_removed_name_ids(link_state: Optional[dict], fingerprints: dict) -> set:
+    """Finds the name_ids of the last run that no known record has anymore (renamed or deleted records)
+
+    Args:
+        link_state (Optional[dict]): the persisted linking state of the last run (or None)
+        fingerprints (dict): the fingerprints of the current known records (see get_known_records_fingerprints)
+
+    Returns:
+        set: the name_ids that stored links may still point to
+    """
+    current = {entry["name_id"] for entry in fingerprints.values()}
+    return {
+        entry["name_id"]
+        for entry in (link_state or {}).get("records", [])
+        if entry.get("name_id") and entry["name_id"] not in current
+    }
+
+
+def needs_relink(
+    record: dict, changed_keys: set, changed_ids: set, changed_matcher: MentionMatcher
+) -> bool:
+    """Checks whether a record has to be relinked because its content or one of the records it mentions changed
+
+    Args:
+        record (dict): the stored record
+        changed_keys (set): keys of the known records map that were added, removed or changed
+        changed_ids (set): _ids of the records that were removed or changed
+        changed_matcher (MentionMatcher): matcher for the mentions of the added or changed records
+
+    Returns:
+        bool: True if the record should be relinked
+    """
+    link_state = record.get("link_state")
+    if not link_state or link_state.get("hash") != get_content_hash(record):
+        return True
+
+    return mentions_changed_records(record, changed_keys, changed_ids, changed_matcher)
+
+
+def mentions_changed_records(
+    record: dict, changed_keys: set, changed_ids: set, changed_matcher: MentionMatcher
+) -> bool:
+    """Checks whether a record links to or mentions one of the added, removed or changed records (see needs_relink)"""
+    if not changed_keys and not changed_ids:
+        return False
+
+    if any(record_id in changed_ids for record_id in record.get("linked_records", [])):
+        return True
+
+    for text in generate_str_from_iterable(record.get("infobox", {})):
+        if text.lower() in changed_keys:
+            return True
+
+    for article in (record.get("articles") or {}).values():
+        if not isinstance(article, str):
+            continue
+        for plain_text, _ in split_html(article):
+            if changed_matcher.find(plain_text):
+                return True
+
+    return False
+
+
+def get_record_diff(old_record: dict, new_record: dict) -> dict:
+    """Compares a stored record with its (re)linked version. Articles and the infobox are compared per
+    article title / infobox path, so a link inserted into one article only changes that article.
+
+    Args:
+        old_record (dict): the stored record
+        new_record (dict): the linked record
+
+    Returns:
+        dict: "set" maps the dotted paths of all changed values (e.g. "articles.history", "infobox.general.origin",
+            "linked_records") to their new values, "unset" lists the paths of removed values. Both are empty if nothing changed
+    """
+    diff = {"set": {}, "unset": []}
+    for field in old_record.keys() | new_record.keys():
+        if field in UNHASHED_FIELDS:
+            continue
+        if field not in new_record:
+            diff["unset"].append(field)
+        elif field in DIFFED_FIELDS:
+            _diff_values(
+                old_record.get(field, _MISSING), new_record[field], field, diff
+            )
+        elif old_record.get(field, _MISSING) != new_record[field]:
+            diff["set"][field] = new_record[field]
+    return diff
+
+
+def _diff_values(old: Any, new: Any, path: str, diff: dict):
+    if old == new:
+        return
+
+    if isinstance(old, dict) and isinstance(new, dict) and _are_path_keys(old, new):
+        for key in old.keys() | new.keys():
+            if key not in new:
+                diff["unset"].append(f"{path}.{key}")
+            else:
+                _diff_values(old.get(key, _MISSING), new[key], f"{path}.{key}", diff)
+        return
+
+    diff["set"][path] = new
+
+
+def _are_path_keys(*dicts: dict) -> bool:
+    # keys with dots or a leading "$" cannot be used in a field path, such values are set as a whole
+    return all(
+        isinstance(key, str) and key and "." not in key and not key.startswith("$")
+        for it in dicts
+        for key in it
+    )
 
 
 def purify_name(name: str) -> str:
@@ -35,6 +334,10 @@ def purify_name(name: str) -> str:
     return name
 
 
+# fields of a record that are needed to identify mentions of it and to link to it
+KNOWN_RECORD_FIELDS = ["_id", "name_id", "type", "names", "last_name"]
+
+
 async def get_known_records_map(db_client: DBClient) -> dict:
     """Fetches a projection of all known records from a database collection using the provided client
 
@@ -44,21 +347,37 @@ async def get_known_records_map(db_client: DBClient) -> dict:
     Returns:
         dict: Mapping of the "purified name_id (no digits or '_') to record fields (["_id", "name_id", "type", "names", "last_name"])
     """
+    filter = {}
     records_map = {}
+    async for record in db_client.iter_many(filter, KNOWN_RECORD_FIELDS):
+        add_known_record(records_map, record)
+    return records_map
 
-    filter = {}
-    projection = ["_id", "name_id", "type", "names", "last_name"]
-    records = await db_client.find_many(filter, projection)
+
+def build_known_records_map(records: Iterable[dict]) -> dict:
+    """Builds the known records map from projected records. The first record of a purified name wins,
+    further records with the same purified name are not linked.
+
+    Args:
+        records (Iterable[dict]): records projected to the known record fields
+
+    Returns:
+        dict: Mapping of the "purified name_id (no digits or '_') to record fields (["_id", "name_id", "type", "names", "last_name"])
+    """
+    records_map = {}
     for record in records:
-        name = purify_name(record["name_id"])
-        if name in records_map:
-            records_map[name]["multi"] = True
-            continue
-        record.update({"multi": False})
-        records_map[name] = record
+        add_known_record(records_map, record)
     return records_map
 
 
+def add_known_record(records_map: dict, record: dict):
+    """adds a projected record to the known records map (see build_known_records_map)"""
+    name = purify_name(record["name_id"])
+    if name in records_map:
+        return
+    records_map[name] = record
+
+
 def generate_str_from_iterable(it: Iterable):
     """Generator function that takes any Iterable and yields all (nested) occurrences of primitive types as str
 
@@ -116,38 +435,36 @@ def get_all_possible_names_from_record(record: dict) -> set:
     return possible_names
 
 
-def get_longest_matching_substring(text: str, substrings: Iterable) -> Tuple[str, int]:
-    """takes a sting and an Iterable of substrings and returns a tuple of the longest matching one and its index or (None, -1).
+def build_name_variants(records_map: dict) -> dict:
+    """Precomputes the possible names of all persons in the known records map (see get_all_possible_names_from_record)
 
     Args:
-        text (str): the text that should be searched for matches
-        substrings (Iterable): the substrings that should be searched for
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
 
     Returns:
-        Tuple[str, int]: longest match as string + its index in the text or (None, -1)
+        dict: mapping of the keys of all persons to their "names" (tuple, longest first)
     """
-    subtexts = sorted(substrings, key=len)
-    longest_subtext = None
-    longest_index = -1
-    for subtext in subtexts:
-        found_index = text.find(subtext)
-        # do not recursivley link links e.g. <a href="res"><a href="res">Res</a></a>
-        if text[found_index - 2 : found_index] == '">':
+    name_variants = {}
+    for key, replace_context in records_map.items():
+        if replace_context["type"] != "person":
             continue
 
-        # if we match something for the first time
-        # or we have already matched something, but also match a longer subtext at the same index
-        if found_index >= 0 and (longest_index == -1 or longest_index == found_index):
-            longest_subtext = subtext
-            longest_index = found_index
-
-    return (longest_subtext, longest_index)
+        names = tuple(
+            sorted(
+                get_all_possible_names_from_record(replace_context),
+                key=len,
+                reverse=True,
+            )
+        )
+        name_variants[key] = {"names": names}
+    return name_variants
 
 
 def recursive_replace_substings_with_links(
     original_text: str, substings: Iterable, resource_name: str
 ) -> str:
-    """Replaces the longest matching occurrences of names in the original text with corresponding links
+    """Replaces the longest matching occurrences of names in the original text with corresponding links.
+    Works in a single pass (linear in the length of the text), text within existing links is not replaced.
 
     Args:
         original_text (str): the text in which the replacements should be made
@@ -157,26 +474,28 @@ def recursive_replace_substings_with_links(
     Returns:
         str: the string in which all occurences of the substings are replaced by links
     """
-    longest_matching_substring, _ = get_longest_matching_substring(
-        original_text, substings
-    )
-    if not longest_matching_substring:
-        return original_text
-
-    link = f'<a href="{resource_name}">{longest_matching_substring}</a>'
-    pre_text, _, post_text = original_text.partition(longest_matching_substring)
-    return (
-        pre_text
-        + link
-        + recursive_replace_substings_with_links(post_text, substings, resource_name)
-    )
-
-
-# TODO multi
+    matcher = MentionMatcher()
+    for substring in substings:
+        matcher.add(substring, resource_name)
+    matcher.build()
+
+    parts = []
+    for plain_text, html in split_html(original_text):
+        position = 0
+        for start, end, _ in matcher.find(plain_text):
+            parts.append(plain_text[position:start])
+            parts.append(f'<a href="{resource_name}">{plain_text[start:end]}</a>')
+            position = end
+        parts.append(plain_text[position:])
+        parts.append(html)
+    return "".join(parts)
 
 
 def replace_text_with_links_for_records(
-    original_text: str, replaced_str: str, replace_context: dict
+    original_text: str,
+    replaced_str: str,
+    replace_context: dict,
+    name_variants: Optional[dict] = None,
 ):
     """Replaces mentions of other records within a given text with links based on the linked record type
 
@@ -184,6 +503,7 @@ def replace_text_with_links_for_records(
         original_text (str): the original text in which replacements shall be made
         replace_text (str): the text that is to be replaced with a link
         replace_context (dict): general information about the record that should be linked to
+        name_variants (Optional[dict], optional): precomputed names of the record if it is a person (see build_name_variants). Defaults to None.
 
     Returns:
         [type]: the text in which the specified strings are replaced by links
@@ -193,58 +513,211 @@ def replace_text_with_links_for_records(
 
         # avoid recursively inserting links into links by checking if a link already exists
         link = f'<a href="{replace_context["name_id"]}">{replaced_str.capitalize()}</a>'
-        LOG.debug("NOTICE ME!!!!!!!!!!!!!!!!!!!!!")
-        print(link, original_text, link in original_text)
-        if link not in original_text:
-            text = original_text.replace(replaced_str, link)
-        return text
+        if link in original_text:
+            return original_text
+        return original_text.replace(replaced_str, link)
 
     # if type is person, they can have multiple names that can be replaced by a link
-    possible_names = get_all_possible_names_from_record(replace_context)
+    if name_variants is None:
+        possible_names = get_all_possible_names_from_record(replace_context)
+    else:
+        possible_names = name_variants["names"]
     text = recursive_replace_substings_with_links(
         original_text, possible_names, replace_context["name_id"]
     )
     return text
 
 
-def insert_links(new_record: dict, records_map: dict) -> dict:
+def build_mention_matcher(
+    records_map: dict, name_variants: Optional[dict] = None
+) -> MentionMatcher:
+    """Builds an automaton that finds mentions of all known records in a single pass over a text.
+    Non-person records are mentioned by their capitalized key, persons by all of their possible names.
+
+    Args:
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        name_variants (Optional[dict], optional): precomputed names of all persons (see build_name_variants). Defaults to None.
+
+    Returns:
+        MentionMatcher: matcher whose values are the keys of the records map (ranked in map order)
+    """
+    if name_variants is None:
+        name_variants = build_name_variants(records_map)
+
+    matcher = MentionMatcher()
+    for key, replace_context in records_map.items():
+        if replace_context["type"] != "person":
+            matcher.add(key.capitalize(), key)
+            continue
+
+        for name in name_variants[key]["names"]:
+            matcher.add(name, key)
+    return matcher.build()
+
+
+def split_html(text: str) -> Iterable[Tuple[str, str]]:
+    """Splits a text into parts of plain text, each followed by an html tag or link (or "" at the end of the text)
+
+    Args:
+        text (str): the text to split
+
+    Yields:
+        Iterator[Tuple[str, str]]: plain text and the html that follows it
+    """
+    position = 0
+    for html in HTML_PATTERN.finditer(text):
+        yield text[position : html.start()], html.group()
+        position = html.end()
+    yield text[position:], ""
+
+
+def link_mentions(
+    text: str, records_map: dict, matcher: MentionMatcher, ignore: Container = ()
+) -> Tuple[str, set]:
+    """Replaces all mentions of known records in a text with links in one pass.
+    Text within existing links (or other html tags) is left untouched, but records that are already linked count as mentioned.
+
+    Args:
+        text (str): the text in which the mentions should be linked
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        matcher (MentionMatcher): matcher built from the records map with build_mention_matcher
+        ignore (Container, optional): keys of the records map that should not be linked. Defaults to ().
+
+    Returns:
+        Tuple[str, set]: the linked text and the keys of all mentioned records
+    """
+    parts = []
+    mentioned = set()
+    for plain_text, html in split_html(text):
+        plain_position = 0
+        for start, end, key in matcher.find(plain_text, ignore):
+            name_id = records_map[key]["name_id"]
+            parts.append(plain_text[plain_position:start])
+            parts.append(f'<a href="{name_id}">{plain_text[start:end]}</a>')
+            plain_position = end
+            mentioned.add(key)
+        parts.append(plain_text[plain_position:])
+
+        key = get_linked_key(html, records_map, ignore)
+        if key:
+            mentioned.add(key)
+        parts.append(html)
+
+    return "".join(parts), mentioned
+
+
+def get_linked_key(
+    html: str, records_map: dict, ignore: Container = ()
+) -> Optional[str]:
+    """returns the key of the known record an existing html link points to (or None)"""
+    href = HREF_PATTERN.search(html)
+    if not href:
+        return None
+
+    key = purify_name(href.group(1))
+    if (
+        key in records_map
+        and key not in ignore
+        and records_map[key]["name_id"] == href.group(1)
+    ):
+        return key
+    return None
+
+
+def find_mentions(
+    text: str, records_map: dict, matcher: MentionMatcher, ignore: Container = ()
+) -> Tuple[list, set]:
+    """Finds all mentions of known records in a text without changing it (see link_mentions)
+
+    Args:
+        text (str): the text in which the mentions should be found
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        matcher (MentionMatcher): matcher built from the records map with build_mention_matcher
+        ignore (Container, optional): keys of the records map that should not be linked. Defaults to ().
+
+    Returns:
+        Tuple[list, set]: the mention spans ([offset, length, target _id]) and the keys of all mentioned records
+    """
+    spans = []
+    mentioned = set()
+    offset = 0
+    for plain_text, html in split_html(text):
+        for start, end, key in matcher.find(plain_text, ignore):
+            spans.append([offset + start, end - start, records_map[key].get("_id")])
+            mentioned.add(key)
+
+        key = get_linked_key(html, records_map, ignore)
+        if key:
+            mentioned.add(key)
+        offset += len(plain_text) + len(html)
+
+    return spans, mentioned
+
+
+def insert_links(
+    new_record: dict,
+    records_map: dict,
+    matcher: Optional[MentionMatcher] = None,
+    storage: str = "html",
+    name_variants: Optional[dict] = None,
+) -> dict:
     """Inserts links to other records into a given record by replacing all mentions with corresponding html links
 
     Args:
         new_record (dict): the record in which the links should be inserted
         records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        matcher (MentionMatcher, optional): matcher built from the records map. Built on the fly if not provided.
+        storage (str, optional): "html" to store the links in the text or "spans" to only store the mentions (see insert_mentions). Defaults to "html".
+        name_variants (Optional[dict], optional): precomputed names of all persons (see build_name_variants). Built on the fly if not provided.
 
     Returns:
         dict: a record in which all mentions of other records have been replaced by links
     """
-    # we dont want to insert links for the record page we are currently on, so pop that entry from the map
+    if name_variants is None:
+        name_variants = build_name_variants(records_map)
+    if matcher is None:
+        matcher = build_mention_matcher(records_map, name_variants)
+
+    if storage == "spans":
+        return insert_mentions(new_record, records_map, matcher)
+
+    # we dont want to insert links for the record page we are currently on, so ignore that entry of the map
+    # (the map is not modified because it may be shared with other requests)
     own_name = purify_name(new_record["name_id"])
-    map_entry = records_map.pop(own_name, None)
 
     _, linked_record_ids_info = insert_links_into_infobox(
-        new_record.get("infobox", {}), records_map
+        new_record.get("infobox", {}),
+        records_map,
+        ignore={own_name},
+        name_variants=name_variants,
     )
     _, linked_record_ids_articles = insert_links_into_articles(
-        new_record.get("articles"), records_map
+        new_record.get("articles"), records_map, matcher, ignore={own_name}
     )
 
-    new_record["linked_records"] = linked_record_ids_info
-    new_record["linked_records"].extend(linked_record_ids_articles)
-
-    # if there was no entry in the map (completely new record) then we don't have to restore.
-    # TODO Update map function should be called after inserts that uses the DB so we get the _id of the new record in the map
-    if map_entry:
-        records_map[own_name] = map_entry
+    # linked_records is the reverse index of the links (see backlinks), so every record is listed once
+    linked_records = []
+    for record_id in linked_record_ids_info + linked_record_ids_articles:
+        if record_id is not None and record_id not in linked_records:
+            linked_records.append(record_id)
+    new_record["linked_records"] = linked_records
 
     return new_record
 
 
-def insert_links_into_infobox(it: Iterable, records_map: dict) -> Tuple[Iterable, list]:
+def insert_links_into_infobox(
+    it: Iterable,
+    records_map: dict,
+    ignore: Container = (),
+    name_variants: Optional[dict] = None,
+) -> Tuple[Iterable, list]:
     """Recursively Inserts links into any iterable (used for the 'infobox' part of records)
 
     Args:
         new_record (dict): the record in which the links should be inserted
         records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        ignore (Container, optional): keys of the records map that should not be linked. Defaults to ().
+        name_variants (Optional[dict], optional): precomputed names of all persons (see build_name_variants). Defaults to None.
 
     Returns:
         a tuple consisting of the initial Iterable with replaced texts, a list containing the ObjectIDs of all DB entries that were linked to
@@ -252,25 +725,34 @@ def insert_links_into_infobox(it: Iterable, records_map: dict) -> Tuple[Iterable
     linked_ids = []
     if isinstance(it, dict):
         for key, value in it.items():
-            new_item, new_ids = insert_links_into_infobox(value, records_map)
+            new_item, new_ids = insert_links_into_infobox(
+                value, records_map, ignore, name_variants
+            )
             it[key] = new_item
             linked_ids.extend(new_ids)
         return it, linked_ids
 
     if isinstance(it, list):
         for index, entry in enumerate(it):
-            new_entry, new_ids = insert_links_into_infobox(entry, records_map)
+            new_entry, new_ids = insert_links_into_infobox(
+                entry, records_map, ignore, name_variants
+            )
             it[index] = new_entry
             linked_ids.extend(new_ids)
         return it, linked_ids
 
     if isinstance(it, str):
         word = it.lower()
-        if word not in records_map:
+        if word not in records_map or word in ignore:
             return (it, linked_ids)
         linked_ids.append(records_map[word].get("_id"))
         return (
-            replace_text_with_links_for_records(word, word, records_map[word]),
+            replace_text_with_links_for_records(
+                word,
+                word,
+                records_map[word],
+                (name_variants or {}).get(word),
+            ),
             linked_ids,
         )
 
@@ -281,39 +763,160 @@ def insert_links_into_infobox(it: Iterable, records_map: dict) -> Tuple[Iterable
 
 
 def insert_links_into_articles(
-    articles: dict, records_map: dict
+    articles: dict,
+    records_map: dict,
+    matcher: Optional[MentionMatcher] = None,
+    ignore: Container = (),
 ) -> Tuple[Iterable, list]:
     """Inserts links only into the 'articles' part of records
 
     Args:
         articles (dict): amapping of titles to text
         records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        matcher (MentionMatcher, optional): matcher built from the records map. Built on the fly if not provided.
+        ignore (Container, optional): keys of the records map that should not be linked. Defaults to ().
 
     Returns:
         a tuple consisting of the initial Iterable with replaced texts, a list containing the ObjectIDs of all DB entries that were linked to
     """
-    # directly access artcles with the key because we want to continuously change articles
-    # (build on prev replacements), not a static copy
+    linked_ids = []
     if not articles:
-        return
+        return articles, linked_ids
 
-    linked_ids = []
+    if matcher is None:
+        matcher = build_mention_matcher(records_map)
 
-    for title in articles.keys():
-        # (going through it this way makes more sense than going through every word in the article
-        # (as long as there are fewer db entries than average words in an article))
-        # go through every entry of known records and replace each mention with a link
-        for key, replace_context in records_map.items():
-            # check if the purified unique name of another record can be found in the text
-            # capitalize because we only want to replace capitalized words (names)
-            article = articles.get(title, "")
-            reference_word = key.capitalize()
-            if not article or reference_word not in article:
-                continue
-
-            articles[title] = replace_text_with_links_for_records(
-                article, reference_word, replace_context
-            )
-            linked_ids.append(replace_context.get("_id"))
+    for title, article in articles.items():
+        if not article or not isinstance(article, str):
+            continue
+
+        # a single pass over the article finds the mentions of all known records at once
+        articles[title], mentioned = link_mentions(
+            article, records_map, matcher, ignore
+        )
+        # ids are listed in the order of the records map (per article)
+        linked_ids.extend(
+            records_map[key].get("_id") for key in sorted(mentioned, key=matcher.rank)
+        )
 
     return articles, linked_ids
+
+
+def get_storage_mode(config: dict) -> str:
+    """returns how links are stored: "html" (links in the text) or "spans" (raw text + mention spans)"""
+    storage = config.get("linker", {}).get("storage", "html")
+    if storage not in STORAGE_MODES:
+        raise ValueError(
+            f"unknown linker storage mode '{storage}' (expected one of {STORAGE_MODES})"
+        )
+    return storage
+
+
+def insert_mentions(
+    new_record: dict, records_map: dict, matcher: MentionMatcher
+) -> dict:
+    """Stores the mentions of other records as spans instead of inserting links into the text.
+    The links are generated when the record is rendered (see render_mentions).
+
+    Args:
+        new_record (dict): the record whose mentions should be found
+        records_map (dict): a mapping of strings that represent what is identified as a "mention" to general information of the corresponding record
+        matcher (MentionMatcher): matcher built from the records map
+
+    Returns:
+        dict: the record with unchanged text and its "mentions", "mentions_version" and "linked_records"
+    """
+    own_name = purify_name(new_record["name_id"])
+    linked_ids = []
+    mentions = {"infobox": {}, "articles": {}}
+
+    def find_in_infobox(it: Any, path: str):
+        if isinstance(it, dict):
+            for key, value in it.items():
+                find_in_infobox(value, f"{path}.{key}" if path else str(key))
+        elif isinstance(it, list):
+            for index, entry in enumerate(it):
+                find_in_infobox(entry, f"{path}.{index}" if path else str(index))
+        elif isinstance(it, str):
+            word = it.lower()
+            if word in records_map and word != own_name:
+                mentions["infobox"][path] = [[0, len(it), records_map[word].get("_id")]]
+                linked_ids.append(records_map[word].get("_id"))
+
+    find_in_infobox(new_record.get("infobox", {}), "")
+
+    for title, article in (new_record.get("articles") or {}).items():
+        if not article or not isinstance(article, str):
+            continue
+        spans, mentioned = find_mentions(article, records_map, matcher, {own_name})
+        if spans:
+            mentions["articles"][title] = spans
+        linked_ids.extend(
+            records_map[key].get("_id") for key in sorted(mentioned, key=matcher.rank)
+        )
+
+    new_record["mentions"] = mentions
+    new_record["mentions_version"] = get_content_hash({"mentions": mentions})
+    new_record["linked_records"] = []
+    for record_id in linked_ids:
+        if record_id is not None and record_id not in new_record["linked_records"]:
+            new_record["linked_records"].append(record_id)
+    return new_record
+
+
+def render_spans(
+    text: str, spans: list, get_name_id: Callable[[Any], Optional[str]]
+) -> str:
+    """Inserts links into a text at the given mention spans
+
+    Args:
+        text (str): the raw text
+        spans (list): the mention spans ([offset, length, target _id]) of the text
+        get_name_id (Callable[[Any], Optional[str]]): resolves the _id of a target to its current name_id (or None if it does not exist anymore)
+
+    Returns:
+        str: the text with links
+    """
+    parts = []
+    position = 0
+    for offset, length, target_id in sorted(spans, key=lambda span: span[0]):
+        name_id = get_name_id(target_id)
+        if not name_id or offset < position:
+            continue
+        parts.append(text[position:offset])
+        parts.append(f'<a href="{name_id}">{text[offset : offset + length]}</a>')
+        position = offset + length
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def render_mentions(record: dict, get_name_id: Callable[[Any], Optional[str]]) -> dict:
+    """Generates the links of a record stored with mention spans (see insert_mentions)
+
+    Args:
+        record (dict): the record with raw text and "mentions"
+        get_name_id (Callable[[Any], Optional[str]]): resolves the _id of a target to its current name_id (or None if it does not exist anymore)
+
+    Returns:
+        dict: the rendered "infobox" and "articles" of the record (the record itself is not changed)
+    """
+    mentions = record.get("mentions") or {}
+    articles = dict(record.get("articles") or {})
+    for title, spans in mentions.get("articles", {}).items():
+        if isinstance(articles.get(title), str):
+            articles[title] = render_spans(articles[title], spans, get_name_id)
+
+    infobox = copy.deepcopy(record.get("infobox", {}))
+    for path, spans in mentions.get("infobox", {}).items():
+        *parents, last = path.split(".")
+        parent = infobox
+        try:
+            for key in parents:
+                parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+            last = int(last) if isinstance(parent, list) else last
+            if isinstance(parent[last], str):
+                parent[last] = render_spans(parent[last], spans, get_name_id)
+        except (KeyError, IndexError, ValueError, TypeError):
+            LOG.warning(f"mention path {path} not found in record {record.get('_id')}")
+
+    return {"infobox": infobox, "articles": articles}
@@ -0,0 +1,135 @@
+import logging
+from collections import deque
+from typing import Any, Container, Iterator, List, Tuple
+
+LOG = logging.getLogger(__name__)
+
+
+class MentionMatcher:
+    """Aho-Corasick automaton that finds occurrences of many patterns in a single pass over a text.
+    Every pattern carries a value (e.g. the key of the record it refers to). If the same pattern is added twice,
+    the first value wins. Values are ranked by the order in which they were first added.
+    """
+
+    def __init__(self):
+        # state 0 is the root. each state has its transitions, a fail link, the pattern ending in it (if any)
+        # and a link to the next state along the fail chain that also ends a pattern
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        self._output_link = [0]
+        self._ranks = {}
+        self._built = False
+
+    def __len__(self) -> int:
+        return sum(1 for output in self._output if output is not None)
+
+    def add(self, pattern: str, value: Any):
+        """Adds a pattern to the automaton. Must be called before build().
+
+        Args:
+            pattern (str): the text to search for
+            value (Any): value that is returned for every match of the pattern
+        """
+        if self._built:
+            raise RuntimeError("cannot add patterns to an already built MentionMatcher")
+        if not pattern:
+            return
+
+        self._ranks.setdefault(value, len(self._ranks))
+
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+            state = next_state
+
+        if self._output[state] is None:
+            self._output[state] = (len(pattern), value)
+
+    def build(self) -> "MentionMatcher":
+        """Computes the fail links (breadth first). Returns the matcher itself for chaining."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output_link[next_state] = (
+                    fail if self._output[fail] is not None else self._output_link[fail]
+                )
+
+        self._built = True
+        return self
+
+    def rank(self, value: Any) -> int:
+        """returns the position at which a value was first added to the matcher"""
+        return self._ranks[value]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yields all (possibly overlapping) matches in the text
+
+        Args:
+            text (str): the text to search in
+
+        Yields:
+            Iterator[Tuple[int, int, Any]]: start index, end index (exclusive) and value of each match
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, output, output_link = (
+            self._goto,
+            self._fail,
+            self._output,
+            self._output_link,
+        )
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match_state = state if output[state] is not None else output_link[state]
+            while match_state:
+                length, value = output[match_state]
+                yield index + 1 - length, index + 1, value
+                match_state = output_link[match_state]
+
+    def find(self, text: str, ignore: Container = ()) -> List[Tuple[int, int, Any]]:
+        """Finds the leftmost-longest, non overlapping matches in the text
+
+        Args:
+            text (str): the text to search in
+            ignore (Container, optional): values whose matches should be skipped. Defaults to ().
+
+        Returns:
+            List[Tuple[int, int, Any]]: start index, end index (exclusive) and value of each match, ordered by start
+        """
+        longest_at = {}
+        for start, end, value in self.iter_matches(text):
+            if value in ignore:
+                continue
+            if start not in longest_at or longest_at[start][0] < end:
+                longest_at[start] = (end, value)
+
+        matches = []
+        last_end = 0
+        for start in sorted(longest_at):
+            if start < last_end:
+                continue
+            end, value = longest_at[start]
+            matches.append((start, end, value))
+            last_end = end
+        return matches
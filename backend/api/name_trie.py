@@ -0,0 +1,161 @@
+import bisect
+import logging
+from typing import Any, Callable, Hashable, List, Optional
+
+LOG = logging.getLogger(__name__)
+
+
+class _Node:
+    __slots__ = ("label", "children", "first_chars", "values")
+
+    def __init__(self, label: str):
+        # the part of the key on the edge from the parent to this node
+        self.label = label
+        # first char of the child labels -> child (and the sorted first chars for ordered traversal)
+        self.children = {}
+        self.first_chars = []
+        # id -> value of every key ending in this node
+        self.values = {}
+
+    def add_child(self, child: "_Node"):
+        first_char = child.label[0]
+        if first_char not in self.children:
+            bisect.insort(self.first_chars, first_char)
+        self.children[first_char] = child
+
+    def remove_child(self, first_char: str):
+        del self.children[first_char]
+        self.first_chars.remove(first_char)
+
+
+def _common_prefix_length(first: str, second: str) -> int:
+    length = 0
+    for first_char, second_char in zip(first, second):
+        if first_char != second_char:
+            break
+        length += 1
+    return length
+
+
+class NameTrie:
+    """Compressed (radix) trie that completes prefixes of names, e.g. for autocompletion.
+    Keys are case insensitive. Every key can hold many values (by an id, e.g. the _id of a record), so names
+    shared by several records complete to all of them. Completions are returned in alphabetical order of their
+    keys, so exact matches come first. Unlike the MentionMatcher it can be changed at any time.
+    """
+
+    def __init__(self):
+        self._root = _Node("")
+        self._size = 0
+
+    def __len__(self) -> int:
+        """number of (key, id) entries"""
+        return self._size
+
+    def add(self, key: str, value_id: Hashable, value: Any):
+        """Adds (or replaces) the value with this id under the key"""
+        key = key.lower()
+        if not key:
+            return
+
+        node = self._root
+        rest = key
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = _Node(rest)
+                node.add_child(child)
+                node = child
+                break
+
+            common = _common_prefix_length(child.label, rest)
+            if common < len(child.label):
+                # the key ends in or branches off the edge: split it
+                middle = _Node(child.label[:common])
+                child.label = child.label[common:]
+                middle.add_child(child)
+                node.children[middle.label[0]] = middle
+                child = middle
+            node = child
+            rest = rest[common:]
+
+        if value_id not in node.values:
+            self._size += 1
+        node.values[value_id] = value
+
+    def remove(self, key: str, value_id: Hashable):
+        """Removes the value with this id from the key (nothing happens if it is not there)"""
+        key = key.lower()
+        path = [self._root]
+        rest = key
+        while rest:
+            child = path[-1].children.get(rest[0])
+            if child is None or not rest.startswith(child.label):
+                return
+            path.append(child)
+            rest = rest[len(child.label) :]
+
+        node = path[-1]
+        if node.values.pop(value_id, None) is None:
+            return
+        self._size -= 1
+
+        # keep the trie compressed: drop empty leaves and merge nodes that only lead to a single child
+        while len(path) > 1 and not node.values:
+            parent = path[-2]
+            if not node.children:
+                parent.remove_child(node.label[0])
+            elif len(node.children) == 1:
+                child = node.children[node.first_chars[0]]
+                child.label = node.label + child.label
+                parent.children[child.label[0]] = child
+            else:
+                break
+            path.pop()
+            node = parent
+
+    def complete(
+        self,
+        prefix: str,
+        limit: int = 10,
+        accept: Optional[Callable[[Any], bool]] = None,
+    ) -> List[Any]:
+        """Returns the values of the first keys (alphabetically) that start with the prefix
+
+        Args:
+            prefix (str): the typed prefix
+            limit (int, optional): max number of values. Defaults to 10.
+            accept (Optional[Callable[[Any], bool]], optional): filters the values. Defaults to None.
+
+        Returns:
+            List[Any]: the values
+        """
+        node = self._root
+        rest = prefix.lower()
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return []
+            if rest.startswith(child.label):
+                rest = rest[len(child.label) :]
+            elif not child.label.startswith(rest):
+                return []
+            else:
+                # the prefix ends within the edge
+                rest = ""
+            node = child
+
+        # depth first in alphabetical order, stops as soon as there are enough values
+        completions = []
+        stack = [node]
+        while stack and len(completions) < limit:
+            node = stack.pop()
+            for value in node.values.values():
+                if accept is None or accept(value):
+                    completions.append(value)
+                    if len(completions) == limit:
+                        break
+            stack.extend(
+                node.children[first_char] for first_char in reversed(node.first_chars)
+            )
+        return completions
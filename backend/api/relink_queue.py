@@ -0,0 +1,411 @@
+import asyncio
+import copy
+import datetime
+import logging
+import time
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+from aiohttp import web
+from bson import ObjectId
+from prometheus_client import Counter
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from backend.api import backlinks, linker
+from backend.db_clients.base_client import DBClient
+
+LOG = logging.getLogger(__name__)
+
+JOBS_COLL = "relink_jobs"
+
+JOBS = Counter(
+    "relink_jobs_total", "finished relink jobs (done, retried or failed)", ["result"]
+)
+RELINKED_RECORDS = Counter(
+    "relink_queue_records_total", "records linked again by the relink queue"
+)
+
+
+class RelinkQueue:
+    """Persistent queue of records whose creation, change or deletion may change the links of other records
+    (collection "relink_jobs"). A background task of the app relinks the affected records, so requests only
+    enqueue a job.
+
+    Jobs of the same record coalesce: there is at most one pending job per record (unique partial index),
+    enqueuing it again only adds old name_ids to it. Jobs wait "delay" seconds before they run, so bursts of
+    writes of a record end up in one job. The worker relinks at most records_per_second records per second.
+
+    The candidates of a job are the records linking to the record and, with the "text" candidates, the records
+    the text index finds for the words of its names. The text index only matches whole words (and their stems),
+    so mentions within other words (e.g. "Umaronstadt") are not found. The "scan" candidates (all records) find them.
+    """
+
+    def __init__(
+        self,
+        app: web.Application,
+        delay: float = 1.0,
+        poll_interval: float = 5.0,
+        records_per_second: Optional[float] = None,
+        retry_delay: float = 30.0,
+        max_attempts: int = 5,
+        candidates: str = "text",
+        stale_after: float = 600.0,
+    ):
+        self.app = app
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self.records_per_second = records_per_second
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.candidates = candidates
+        self.stale_after = stale_after
+        self._task = None
+        self._wakeup = None
+        # monotonic time at which the next record may be relinked (see records_per_second)
+        self._next_slot = 0.0
+
+    @property
+    def db_client(self) -> DBClient:
+        # TODO not "default". relink the db of the written record once users can select their db
+        return self.app.db_clients["mongo"]
+
+    async def enqueue(self, record_id: ObjectId, old_name_ids: Iterable[str] = ()):
+        """Schedules the relinking of the records affected by a created, changed or deleted record
+
+        Args:
+            record_id (ObjectId): _id of the created, changed or deleted record
+            old_name_ids (Iterable[str], optional): previous name_ids of the record (links to them are replaced). Defaults to ().
+        """
+        await self._schedule(record_id, list(old_name_ids), self.delay, 0)
+        self._wake(self.delay)
+
+    async def enqueue_many(self, record_ids: List[ObjectId]):
+        """Schedules jobs for many new records at once (new records have no pending jobs, so there is nothing to coalesce)"""
+        run_after = _utcnow() + datetime.timedelta(seconds=self.delay)
+        jobs = [
+            {
+                "record_id": record_id,
+                "state": "pending",
+                "run_after": run_after,
+                "attempts": 0,
+                "old_name_ids": [],
+            }
+            for record_id in record_ids
+        ]
+        if jobs:
+            await self.db_client.store_many(jobs, coll=JOBS_COLL)
+            self._wake(self.delay)
+
+    async def _schedule(
+        self, record_id: ObjectId, old_name_ids: list, delay: float, attempts: int
+    ):
+        def get_update() -> dict:
+            return {
+                "$setOnInsert": {
+                    "run_after": _utcnow() + datetime.timedelta(seconds=delay),
+                    "attempts": attempts,
+                },
+                "$addToSet": {"old_name_ids": {"$each": old_name_ids}},
+            }
+
+        filter = {"record_id": record_id, "state": "pending"}
+        try:
+            await self.db_client.update(
+                filter, get_update(), upsert=True, coll=JOBS_COLL
+            )
+        except DuplicateKeyError:
+            # a concurrent enqueue inserted the pending job first
+            await self.db_client.update(filter, get_update(), coll=JOBS_COLL)
+
+    def _wake(self, delay: float):
+        if self._wakeup is not None:
+            asyncio.get_event_loop().call_later(delay, self._wakeup.set)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # a cancelled job stays "running" and is recovered on the next start
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run(self):
+        """Works off due jobs until it is cancelled"""
+        try:
+            await self._recover()
+        except Exception:
+            LOG.exception("Could not recover interrupted relink jobs")
+
+        while True:
+            job = None
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._run_job(job)
+            except Exception:
+                # e.g. the db is not reachable. The worker keeps polling
+                LOG.exception("Relink queue failed to claim or finish a job")
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _recover(self):
+        # jobs left running by a stopped worker are scheduled again. Jobs started within stale_after seconds
+        # may still be run by the worker of another instance
+        started_before = _utcnow() - datetime.timedelta(seconds=self.stale_after)
+        jobs = await self.db_client.find_many(
+            {"state": "running", "started": {"$lt": started_before}}, coll=JOBS_COLL
+        )
+        for job in jobs:
+            await self._schedule(
+                job["record_id"], job.get("old_name_ids", []), 0, job.get("attempts", 0)
+            )
+            await self.db_client.delete({"_id": job["_id"]}, None, coll=JOBS_COLL)
+        if jobs:
+            LOG.info(f"Recovered {len(jobs)} interrupted relink jobs")
+
+    async def _claim(self) -> Optional[dict]:
+        now = _utcnow()
+        jobs = await self.db_client.find_many(
+            {"state": "pending", "run_after": {"$lte": now}},
+            sort=[("run_after", 1)],
+            limit=1,
+            coll=JOBS_COLL,
+        )
+        for job in jobs:
+            # only one worker gets the job
+            claimed = await self.db_client.update(
+                {"_id": job["_id"], "state": "pending"},
+                {"$set": {"state": "running", "started": now}},
+                coll=JOBS_COLL,
+            )
+            if claimed:
+                return job
+        return None
+
+    async def _run_job(self, job: dict):
+        try:
+            modified = await self.relink(job["record_id"], job.get("old_name_ids", []))
+        except Exception:
+            LOG.exception(f"Relink job of {job['record_id']} failed")
+            await self._retry(job)
+            return
+
+        await self.db_client.delete({"_id": job["_id"]}, None, coll=JOBS_COLL)
+        JOBS.labels("done").inc()
+        LOG.debug(f"Relink job of {job['record_id']} modified {modified} records")
+
+    async def _retry(self, job: dict):
+        attempts = job.get("attempts", 0) + 1
+        if attempts >= self.max_attempts:
+            # failed jobs are kept for inspection, the next link_all catches up
+            await self.db_client.update(
+                {"_id": job["_id"]},
+                {"$set": {"state": "failed", "attempts": attempts}},
+                coll=JOBS_COLL,
+            )
+            JOBS.labels("failed").inc()
+            return
+
+        await self._schedule(
+            job["record_id"],
+            job.get("old_name_ids", []),
+            self.retry_delay * attempts,
+            attempts,
+        )
+        await self.db_client.delete({"_id": job["_id"]}, None, coll=JOBS_COLL)
+        JOBS.labels("retried").inc()
+
+    async def relink(self, record_id: ObjectId, old_name_ids: List[str]) -> int:
+        """Relinks the records that link to a record or mention one of its (old) names
+
+        Args:
+            record_id (ObjectId): _id of the created, changed or deleted record
+            old_name_ids (List[str]): previous name_ids of the record
+
+        Returns:
+            int: number of modified records
+        """
+        snapshot = self.app.known_records.snapshot()
+        changed_keys = {linker.purify_name(name_id) for name_id in old_name_ids}
+        known_record = self.app.known_records.get(record_id)
+        if known_record is not None:
+            changed_keys.add(linker.purify_name(known_record["name_id"]))
+        changed_records = {
+            key: snapshot.records_map[key]
+            for key in changed_keys
+            if key in snapshot.records_map
+        }
+        changed_matcher = linker.build_mention_matcher(
+            changed_records, snapshot.name_variants
+        )
+
+        async def relinked_records() -> AsyncIterator[Tuple[dict, dict]]:
+            async for record in self._find_candidates(
+                record_id, get_search_terms(changed_records, snapshot.name_variants)
+            ):
+                if not linker.mentions_changed_records(
+                    record, changed_keys, {record_id}, changed_matcher
+                ):
+                    continue
+
+                await self._pace()
+                filter = {"_id": record.pop("_id")}
+                stored = copy.deepcopy(record)
+                for name_id in old_name_ids:
+                    backlinks.unlink_record(record, name_id)
+                record = await self.app.link_executor.insert_links(record, snapshot)
+                RELINKED_RECORDS.inc()
+                # stamped, so the next link_all does not relink the record again
+                yield filter, linker.stamp_link_state(
+                    linker.get_record_diff(stored, record),
+                    record,
+                    stored.get("link_state"),
+                )
+
+        config = self.app.config.get("linker", {})
+        return await self.db_client.bulk_apply_diffs(
+            relinked_records(),
+            batch_size=config.get("write_batch_size", 500),
+            max_in_flight=1,
+        )
+
+    async def _find_candidates(
+        self, record_id: ObjectId, search_terms: List[str]
+    ) -> AsyncIterator[dict]:
+        # records linking to the record (reverse index) and records that contain its names (text index)
+        seen = set()
+        async for record in self.db_client.iter_many(
+            {backlinks.BACKLINK_FIELD: record_id}
+        ):
+            seen.add(record["_id"])
+            yield record
+
+        if self.candidates == "scan":
+            async for record in self.db_client.iter_many({}):
+                if record["_id"] not in seen:
+                    yield record
+            return
+
+        if not search_terms:
+            return
+        try:
+            async for record in self.db_client.iter_many(
+                {"$text": {"$search": " ".join(search_terms)}}
+            ):
+                if record["_id"] not in seen:
+                    yield record
+        except OperationFailure as error:
+            # no text index (e.g. it could not be created), so all records are candidates
+            LOG.warning(
+                f"Text search failed, relinking by scanning all records: {error}"
+            )
+            async for record in self.db_client.iter_many({}):
+                if record["_id"] not in seen:
+                    yield record
+
+    async def _pace(self):
+        if not self.records_per_second:
+            return
+        now = time.monotonic()
+        if self._next_slot > now:
+            await asyncio.sleep(self._next_slot - now)
+        self._next_slot = max(now, self._next_slot) + 1 / self.records_per_second
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def get_search_terms(records_map: dict, name_variants: dict) -> List[str]:
+    """the words of the text search that finds all records that may mention the records of the map"""
+    terms = set()
+    for key, replace_context in records_map.items():
+        if replace_context["type"] != "person":
+            terms.update(key.split())
+            continue
+        for name in name_variants[key]["names"]:
+            terms.update(name.split())
+    # quotes would turn the search into a phrase search
+    return sorted(term.replace('"', "") for term in terms)
+
+
+async def schedule(
+    app: web.Application, record_id: ObjectId, old_name_ids: Iterable[str] = ()
+):
+    """Schedules the relinking of the records affected by a created, changed or deleted record. Without the queue
+    only the records linking to a renamed or deleted record are relinked (html storage only, during the request)
+
+    Args:
+        app (web.Application): the app
+        record_id (ObjectId): _id of the created, changed or deleted record
+        old_name_ids (Iterable[str], optional): previous name_ids of the record. Defaults to ().
+    """
+    old_name_ids = list(old_name_ids)
+    queue = getattr(app, "relink_queue", None)
+    if queue is None:
+        if old_name_ids and linker.get_storage_mode(app.config) == "html":
+            await backlinks.relink_backlinks(app, record_id, old_name_ids[-1])
+        return
+
+    try:
+        await queue.enqueue(record_id, old_name_ids)
+    except Exception:
+        # the record is written already. The next link_all relinks the affected records
+        LOG.exception(
+            f"Could not schedule the relinking of records affected by {record_id}"
+        )
+
+
+async def schedule_many(app: web.Application, record_ids: List[ObjectId]):
+    """Schedules the relinking of the records affected by many new records (nothing to do without the queue)
+
+    Args:
+        app (web.Application): the app
+        record_ids (List[ObjectId]): _ids of the created records
+    """
+    queue = getattr(app, "relink_queue", None)
+    if queue is None:
+        return
+
+    try:
+        await queue.enqueue_many(record_ids)
+    except Exception:
+        # the records are written already. The next link_all relinks the affected records
+        LOG.exception(
+            f"Could not schedule the relinking of records affected by {len(record_ids)} new records"
+        )
+
+
+def from_config(app: web.Application) -> Optional[RelinkQueue]:
+    config = app.config.get("relink_queue", {})
+    if not config.get("enabled", False):
+        return None
+    return RelinkQueue(
+        app,
+        config.get("delay", 1.0),
+        config.get("poll_interval", 5.0),
+        config.get("records_per_second"),
+        config.get("retry_delay", 30.0),
+        config.get("max_attempts", 5),
+        config.get("candidates", "text"),
+        config.get("stale_after", 600.0),
+    )
+
+
+async def enable(app: web.Application):
+    if app.relink_queue is not None and app.config["relink_queue"].get("worker", True):
+        app.relink_queue.start()
+
+
+async def disable(app: web.Application):
+    if app.relink_queue is not None:
+        await app.relink_queue.stop()
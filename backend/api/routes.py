@@ -2,7 +2,7 @@ import logging
 import os
 import prometheus_async.aio
 from aiohttp import web
-from backend.api.handlers import favicon, index, records, users, login
+from backend.api.handlers import favicon, index, records, search, users, login
 
 LOG = logging.getLogger(__name__)
 
@@ -16,10 +16,16 @@ def register(app):
 
     # records
     routes.get("/records/{identifier}")(records.get)
+    routes.get("/records/{identifier}/backlinks")(records.backlinks)
     routes.post("/records")(records.post)
+    routes.post("/records/bulk")(records.bulk)
     routes.put("/records/{record_id}")(records.put)
     routes.delete("/records/{record_id}")(records.delete)
 
+    # search
+    routes.get("/search")(search.get)
+    routes.get("/autocomplete")(search.autocomplete)
+
     # users
     routes.get("/users/{identifier}")(users.get)
     routes.post("/users")(users.post)
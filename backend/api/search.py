@@ -0,0 +1,52 @@
+import logging
+from typing import Iterable, Optional, Tuple
+from backend.db_clients.base_client import DBClient
+
+LOG = logging.getLogger(__name__)
+
+# the text index of the records (see backend.indexes) weights matches in names higher than in infoboxes or articles
+SEARCH_PROJECTION = {
+    "name_id": 1,
+    "type": 1,
+    "names": 1,
+    "last_name": 1,
+    "score": {"$meta": "textScore"},
+}
+SEARCH_SORT = [("score", {"$meta": "textScore"}), ("_id", 1)]
+MAX_PAGE_SIZE = 50
+# skipping is linear in the offset, so deep pages are not served
+MAX_OFFSET = 1000
+MAX_QUERY_LENGTH = 200
+
+
+async def search_records(
+    db_client: DBClient,
+    query: str,
+    types: Optional[Iterable[str]] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> Tuple[list, Optional[int]]:
+    """Fetches a page of the records matching a full-text search, best matches first
+
+    Args:
+        db_client (DBClient): A database client
+        query (str): the search (words, "phrases" and -excluded words, see the $text operator of mongo)
+        types (Optional[Iterable[str]], optional): only records of these types. Defaults to None.
+        offset (int, optional): number of results of the previous pages. Defaults to 0.
+        limit (int, optional): page size. Defaults to 20.
+
+    Returns:
+        Tuple[list, Optional[int]]: the matching records (with their "score") and the offset of the next page
+            (None if this is the last page)
+    """
+    filter = {"$text": {"$search": query}}
+    if types:
+        filter["type"] = {"$in": list(types)}
+
+    # fetch one more to know if there is a next page
+    records = await db_client.find_many(
+        filter, SEARCH_PROJECTION, sort=SEARCH_SORT, skip=offset, limit=limit + 1
+    )
+    if len(records) > limit and offset + limit < MAX_OFFSET:
+        return records[:limit], offset + limit
+    return records[:limit], None
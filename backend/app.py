@@ -3,18 +3,23 @@ import sys
 import asyncio
 import yaml
 import os
-import jinja2
 import aiohttp_jinja2
 import base64
+import functools
 from functools import partial
 from aiohttp import web
 from aiohttp_session import setup
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 from . import mongo
 from backend.api import routes
+from backend.db_clients import metrics as db_metrics
+from backend.db_clients.memory_client import MemoryClient
 from backend.db_clients.mongo_client import MongoClient
-from backend import lang
-from backend.api import middlewares, linker
+from backend import http_cache, lang, template_cache
+from backend.api import middlewares, linker, link_executor, relink_queue
+from backend.api.known_records import KnownRecords
+from backend.lru_cache import LRUCache
+from backend.single_flight import SingleFlight
 
 
 BASE_PATH = os.path.dirname(__file__)
@@ -26,7 +31,7 @@ class Application(web.Application):
         super(Application, self).__init__(**kwargs)
         self.load_config(config)
         self.setup_attributes()
-        self.setup_templating()
+        self.setup_templating(debug)
         self.load_plugins()
         self.setup_sessions()
         self.add_middlewares()
@@ -57,27 +62,64 @@ class Application(web.Application):
         # probably needs to happen AFTER enabling underlying db clinets (mongo)
         self.on_startup.append(self.connect_db_clients)
 
+        # the known records map is shared by all requests and kept up to date by the db client writes
+        self.on_startup.append(self.load_known_records)
+
+        # linking is cpu-bound, so it can be run in a thread or process pool (see linker config)
+        self.on_startup.append(link_executor.enable)
+        self.on_cleanup.append(link_executor.disable)
+
         # automatically inserts html links into records to interlink them
         self.on_startup.append(linker.link_all)
 
+        # relinks records affected by later writes in the background (stopped before the db clients are closed)
+        self.on_startup.append(relink_queue.enable)
+        self.on_shutdown.append(relink_queue.disable)
+
     def setup_attributes(self):
         # needed for local loading of templates, statics, ...
         self.base_path = BASE_PATH
 
+        # everything a rendered page depends on besides the record (part of the ETags, see http_cache)
+        self.page_version = http_cache.get_files_version(
+            os.path.join(BASE_PATH, directory)
+            for directory in ("templates", "lang", "static")
+        )
+
         # needed like this for builtin jinja2 static lookup function
         self["static_root_url"] = "/static"
 
         # needed to store all (abstracted) database clients (set in load_plugins)
         self.db_clients = {}
 
-    def setup_templating(self):
-        loader = jinja2.FileSystemLoader(os.path.join(BASE_PATH, "templates/"))
+        # versioned map of all known records used by the linker (loaded in load_plugins)
+        self.known_records = KnownRecords()
+
+        # rendered links of records stored with mention spans (see linker storage mode)
+        linker_config = self.config.get("linker", {})
+        self.rendered_mentions = LRUCache(
+            linker_config.get("rendered_cache_size", 1024)
+        )
+
+        # coalesce concurrent finds and renders of the same record (see records.get)
+        self.record_pages = SingleFlight("record_pages")
+
+        # background jobs that relink the records affected by created, changed or deleted records
+        self.relink_queue = relink_queue.from_config(self)
+
+        # runs the linking of records inline or in a worker pool (started in load_plugins)
+        self.link_executor = link_executor.from_config(self.config)
+
+    def setup_templating(self, debug=False):
+        # compiled templates are cached on disk and only reloaded on changes in development (see template_cache)
+        templates_config = self.config.get("templates", {})
+        options = template_cache.get_environment_options(templates_config, debug)
 
         # context processors allow to define functions to automatically create a rendering context from the request
         # maybe if we need universal processors in the future (username, auth, login, ...)
         # processors = [context_processors.get_render_context, aiohttp_jinja2.request_processor]
         # ... context_processors=processors, ...
-        aiohttp_jinja2.setup(self, loader=loader)
+        aiohttp_jinja2.setup(self, **options)
 
         env = aiohttp_jinja2.get_env(self)
 
@@ -87,6 +129,16 @@ class Application(web.Application):
         translate = partial(lang.translate, locales.get(language, {}))
         env.globals.update(translate=translate)
 
+        # static urls carry the hash of the file (?v=), so browsers may cache them forever (see http_cache)
+        env.globals.update(static=functools.lru_cache()(self.get_static_url))
+
+        # compile all templates (or load them from the bytecode cache) before the first request
+        if templates_config.get("precompile", False):
+            template_cache.precompile(env)
+
+    def get_static_url(self, path: str) -> str:
+        return str(self.router["static"].url_for(filename=path))
+
     def setup_sessions(self):
         # session setup. needs custom encoder+decoder to store object ids
         fernet_key = self.config["session"]["secret"]
@@ -96,12 +148,26 @@ class Application(web.Application):
 
     def add_middlewares(self):
         self.middlewares.extend([middlewares.auth_middleware])
+        # long-lived caching of static assets
+        self.on_response_prepare.append(http_cache.set_static_cache_control)
 
     async def connect_db_clients(self, app: web.Application):
         """create a new DBClient that abstacts from the actual db used for each connection"""
-        # currently mongo only
-        for mongo_name in app.config["mongodb"].keys():
-            MongoClient(app, mongo_name)
+        # mongo or the in-process memory client (e.g. for load tests)
+        for mongo_name, client_attr in app.config["mongodb"].items():
+            if mongo.uses_memory(client_attr):
+                client = MemoryClient(app, mongo_name)
+            else:
+                client = MongoClient(app, mongo_name)
+            # latency, document and payload metrics of every operation (if enabled)
+            db_metrics.instrument(client, app.config.get("db_metrics"))
+
+    async def load_known_records(self, app: web.Application):
+        db_client = app.db_clients["mongo"]
+        db_client.on_write.append(app.known_records.on_write)
+        # the known records only need their fields of the written records
+        db_client.on_write_fields = linker.KNOWN_RECORD_FIELDS
+        await app.known_records.load(db_client)
 
 
 # used for aiohttp-devtools
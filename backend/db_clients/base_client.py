@@ -1,5 +1,5 @@
 from abc import ABC
-from typing import Optional
+from typing import AsyncIterator, Iterable, Optional, Tuple
 from aiohttp import web
 from bson import ObjectId
 import logging
@@ -17,12 +17,18 @@ class DBClient(ABC):
     async def store(self, data: dict, **kwargs) -> Optional[ObjectId]:
         pass
 
+    async def store_many(self, documents: list, **kwargs) -> list:
+        pass
+
     async def find_one(self, *args, **kwargs) -> Optional[dict]:
         pass
 
     async def find(self, *args, **kwargs) -> list:
         pass
 
+    async def iter_many(self, *args, **kwargs) -> AsyncIterator[dict]:
+        pass
+
     async def delete(self, *args, **kwargs) -> Optional[int]:
         pass
 
@@ -34,3 +40,19 @@ class DBClient(ABC):
 
     async def update_many(self, *args, **kwargs) -> Optional[int]:
         pass
+
+    async def replace(self, *args, **kwargs) -> Optional[int]:
+        pass
+
+    async def apply_diff(self, filter, diff: dict, **kwargs) -> Optional[int]:
+        pass
+
+    async def bulk_apply_diffs(
+        self, diffs: Iterable[Tuple[dict, dict]], **kwargs
+    ) -> Optional[int]:
+        pass
+
+    async def bulk_replace(
+        self, replacements: Iterable[Tuple[dict, dict]], **kwargs
+    ) -> Optional[int]:
+        pass
@@ -0,0 +1,584 @@
+import asyncio
+import copy
+import datetime
+import re
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from aiohttp import web
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from backend import indexes
+from backend.db_clients.base_client import DBClient
+from backend.db_clients.mongo_client import get_diff_update, iterate, set_last_modified
+
+_MISSING = object()
+TEXT_PATTERN = re.compile(r"\w+")
+
+
+def _get_path(document: dict, path: str) -> Any:
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def _compare(value: Any, operator: str, expected: Any) -> bool:
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(expected)
+    if operator == "$ne":
+        return not _equals(value, expected)
+    if operator == "$in":
+        return any(_equals(value, entry) for entry in expected)
+    if operator == "$nin":
+        return not any(_equals(value, entry) for entry in expected)
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > expected
+        if operator == "$gte":
+            return value >= expected
+        if operator == "$lt":
+            return value < expected
+        if operator == "$lte":
+            return value <= expected
+    except TypeError:
+        # like mongo, values of different types are not compared
+        return False
+    raise ValueError(f"unsupported query operator {operator}")
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    # arrays match if any of their entries matches (like mongo does)
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _get_strings(value: Any, path: str = "") -> Iterable[Tuple[str, str]]:
+    # (field path without array indexes, string) of all strings of a document
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, dict):
+        for key, entry in value.items():
+            yield from _get_strings(entry, f"{path}.{key}" if path else key)
+    elif isinstance(value, list):
+        for entry in value:
+            yield from _get_strings(entry, path)
+
+
+def _matches_text(document: dict, search: str) -> bool:
+    # like a text index over all string fields without stemming ("$**", default_language "none"):
+    # a document matches if it contains any of the search terms
+    terms = set(TEXT_PATTERN.findall(search.lower()))
+    return any(
+        word in terms
+        for _, text in _get_strings(document)
+        for word in TEXT_PATTERN.findall(text.lower())
+    )
+
+
+def text_score(document: dict, search: str, weights: Optional[dict] = None) -> float:
+    """relevance of a document for a text search: the share of matching words per field times the weight of the
+    field (see the text index of the collection), summed up. Approximates the textScore of mongo
+    """
+    terms = set(TEXT_PATTERN.findall(search.lower()))
+    score = 0.0
+    for path, text in _get_strings(document):
+        words = TEXT_PATTERN.findall(text.lower())
+        hits = sum(1 for word in words if word in terms)
+        if hits:
+            score += (weights or {}).get(path, 1) * hits / len(words)
+    return score
+
+
+def matches(document: dict, filter: dict) -> bool:
+    """checks if a document matches a query filter (equality, array membership, basic comparison operators and $text)"""
+    for path, expected in filter.items():
+        if path == "$text":
+            if not _matches_text(document, expected["$search"]):
+                return False
+            continue
+        value = _get_path(document, path)
+        if isinstance(expected, dict) and any(key.startswith("$") for key in expected):
+            if not all(
+                _compare(value, operator, operand)
+                for operator, operand in expected.items()
+            ):
+                return False
+        elif not _equals(value, expected):
+            return False
+    return True
+
+
+def _is_meta(value: Any) -> bool:
+    return isinstance(value, dict) and "$meta" in value
+
+
+def project(
+    document: dict,
+    projection: Union[None, list, dict],
+    get_score: Optional[Callable[[], float]] = None,
+) -> dict:
+    """returns a copy of the document with only the projected fields (list of fields or {field: 0/1}).
+    Fields projected as {"$meta": "textScore"} get the score of get_score"""
+    if not projection:
+        return copy.deepcopy(document)
+
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {
+        field: flag
+        for field, flag in projection.items()
+        if field != "_id" and not _is_meta(flag)
+    }
+
+    if fields and all(fields.values()):
+        projected = {
+            key: copy.deepcopy(value)
+            for key, value in document.items()
+            if key in fields
+        }
+    else:
+        projected = {
+            key: copy.deepcopy(value)
+            for key, value in document.items()
+            if key not in fields
+        }
+    if include_id and "_id" in document:
+        projected["_id"] = document["_id"]
+    else:
+        projected.pop("_id", None)
+    for field, flag in projection.items():
+        if _is_meta(flag) and get_score is not None:
+            projected[field] = get_score()
+    return projected
+
+
+def apply_update(document: dict, update: dict, insert: bool = False) -> dict:
+    """applies the $set, $unset, $addToSet and $setOnInsert (only if the update inserts) operators of an update
+    to a copy of the document"""
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+
+    document = copy.deepcopy(document)
+    for operator, fields in update.items():
+        if operator not in ("$set", "$unset", "$addToSet", "$setOnInsert"):
+            raise ValueError(f"unsupported update operator {operator}")
+        if operator == "$setOnInsert" and not insert:
+            continue
+        for path, value in fields.items():
+            *parents, key = path.split(".")
+            target = document
+            for parent in parents:
+                if operator == "$unset" and not isinstance(target.get(parent), dict):
+                    target = None
+                    break
+                target = target.setdefault(parent, {})
+            if target is None:
+                continue
+            if operator == "$unset":
+                target.pop(key, None)
+            elif operator == "$addToSet":
+                entries = target.setdefault(key, [])
+                if isinstance(value, dict) and "$each" in value:
+                    values = value["$each"]
+                else:
+                    values = [value]
+                entries.extend(
+                    copy.deepcopy(entry) for entry in values if entry not in entries
+                )
+            else:
+                target[key] = copy.deepcopy(value)
+    return document
+
+
+class MemoryCollection:
+    """Documents of one collection by _id plus hash indexes (value -> _ids) of single fields"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents = {}
+        # field -> value -> set of _ids
+        self.indexes = {}
+        self.unique = set()
+
+    def create_index(self, field: str, unique: bool = False):
+        if field in self.indexes:
+            return
+        self.indexes[field] = {}
+        for document in self.documents.values():
+            if unique:
+                self._check_unique(field, document)
+            self._index(field, document)
+        if unique:
+            self.unique.add(field)
+
+    @staticmethod
+    def _index_keys(value: Any) -> list:
+        # arrays are indexed by their entries (multikey), unhashable values are not indexed
+        values = value if isinstance(value, list) else [value]
+        keys = []
+        for entry in values:
+            try:
+                hash(entry)
+            except TypeError:
+                continue
+            keys.append(entry)
+        return keys
+
+    def _index(self, field: str, document: dict):
+        value = _get_path(document, field)
+        if value is _MISSING:
+            value = None
+        for key in self._index_keys(value):
+            self.indexes[field].setdefault(key, set()).add(document["_id"])
+
+    def _unindex(self, field: str, document: dict):
+        value = _get_path(document, field)
+        if value is _MISSING:
+            value = None
+        for key in self._index_keys(value):
+            ids = self.indexes[field].get(key)
+            if ids is not None:
+                ids.discard(document["_id"])
+                if not ids:
+                    del self.indexes[field][key]
+
+    def _check_unique(self, field: str, document: dict):
+        value = _get_path(document, field)
+        if value is _MISSING or isinstance(value, (list, dict)):
+            return
+        other_ids = self.indexes.get(field, {}).get(value, set()) - {document["_id"]}
+        if other_ids:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: {field}_1 dup key: {value!r}"
+            )
+
+    def put(self, document: dict):
+        """inserts or replaces a document (by _id) and updates the indexes"""
+        for field in self.unique:
+            self._check_unique(field, document)
+        self.remove(document["_id"])
+        self.documents[document["_id"]] = document
+        for field in self.indexes:
+            self._index(field, document)
+
+    def remove(self, record_id: Any) -> Optional[dict]:
+        document = self.documents.pop(record_id, None)
+        if document is not None:
+            for field in self.indexes:
+                self._unindex(field, document)
+        return document
+
+    def candidates(self, filter: dict) -> Iterable[dict]:
+        """the documents that may match the filter (narrowed by _id or an index if possible)"""
+        record_id = filter.get("_id", _MISSING)
+        if record_id is not _MISSING and not isinstance(record_id, dict):
+            document = self.documents.get(record_id)
+            return [document] if document is not None else []
+
+        for field, expected in filter.items():
+            if field not in self.indexes or isinstance(expected, (dict, list)):
+                continue
+            try:
+                ids = self.indexes[field].get(expected, ())
+            except TypeError:
+                continue
+            return [self.documents[record_id] for record_id in list(ids)]
+
+        return list(self.documents.values())
+
+    def find(self, filter: dict) -> List[dict]:
+        return [
+            document
+            for document in self.candidates(filter)
+            if matches(document, filter)
+        ]
+
+
+class MemoryClient(DBClient):
+    """In-process database client without persistence (e.g. for load tests and benchmarks).
+    Supports the subset of filters, projections and updates the app uses. Collections get the indexes
+    of backend.indexes (single fields only), so finds by name_id do not scan the collection.
+    Select it with "backend: memory" for a connection in the mongodb config.
+    """
+
+    def __init__(
+        self,
+        app: Optional[web.Application] = None,
+        mongo_name: str = "default",
+        default_coll="records",
+    ):
+        self.default_coll = default_coll
+        self.collections = {}
+        if app is not None:
+            conn_name = "mongo" if mongo_name == "default" else f"mongo_{mongo_name}"
+            app.db_clients[conn_name] = self
+
+        # same as MongoClient.on_write and on_write_fields
+        self.on_write = []
+        self.on_write_fields = None
+
+    def _collection(self, kwargs: dict) -> MemoryCollection:
+        name = kwargs.pop("coll", self.default_coll)
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = MemoryCollection(name)
+            for index in indexes.INDEXES.get(name, []):
+                # hash indexes only work for single ascending fields. Uniqueness of partial indexes
+                # cannot be enforced on all documents
+                if len(index["keys"]) == 1 and index["keys"][0][1] == 1:
+                    collection.create_index(
+                        index["keys"][0][0],
+                        index.get("unique", False)
+                        and "partialFilterExpression" not in index,
+                    )
+        return collection
+
+    async def _notify(self, collection: str, operation: str, documents: list):
+        if collection != self.default_coll or not documents:
+            return
+        for callback in self.on_write:
+            await callback(
+                collection,
+                operation,
+                [project(document, self.on_write_fields) for document in documents],
+            )
+
+    async def store(self, data: dict, **kwargs) -> Optional[ObjectId]:
+        collection = self._collection(kwargs)
+        data.update({"creation_date": datetime.datetime.utcnow()})
+        data.setdefault("_id", ObjectId())
+        if data["_id"] in collection.documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {collection.name} index: _id_"
+            )
+        collection.put(copy.deepcopy(data))
+        await self._notify(collection.name, "store", [data])
+        return data["_id"]
+
+    async def store_many(
+        self, documents: List[dict], batch_size: int = 500, **kwargs
+    ) -> List[Optional[ObjectId]]:
+        collection = self._collection(kwargs)
+        creation_date = datetime.datetime.utcnow()
+        stored = []
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            document.update({"creation_date": creation_date})
+            if document["_id"] in collection.documents:
+                continue
+            try:
+                collection.put(copy.deepcopy(document))
+            except DuplicateKeyError:
+                continue
+            stored.append(document)
+
+        if stored:
+            await self._notify(collection.name, "store", stored)
+        stored_ids = {document["_id"] for document in stored}
+        return [
+            document["_id"] if document["_id"] in stored_ids else None
+            for document in documents
+        ]
+
+    async def find(self, filter, *args, **kwargs) -> Optional[dict]:
+        get_score = self._get_scorer(filter, kwargs)
+        documents = self._select(filter, {**kwargs, "limit": 1})
+        if not documents:
+            return None
+        return project(
+            documents[0], args[0] if args else None, partial(get_score, documents[0])
+        )
+
+    async def find_many(self, filter, projection=None, **kwargs) -> list:
+        get_score = self._get_scorer(filter, kwargs)
+        return [
+            project(document, projection, partial(get_score, document))
+            for document in self._select(filter, kwargs)
+        ]
+
+    def _get_scorer(self, filter: dict, kwargs: dict) -> Callable[[dict], float]:
+        """scores documents for the $text search of the filter (weights of the text index of the collection)"""
+        search = (filter or {}).get("$text", {}).get("$search", "")
+        weights = {}
+        for index in indexes.INDEXES.get(kwargs.get("coll", self.default_coll), []):
+            if any(direction == "text" for _, direction in index["keys"]):
+                weights = index.get("weights", {})
+        return lambda document: text_score(document, search, weights)
+
+    def _select(self, filter: dict, kwargs: dict) -> List[dict]:
+        get_score = self._get_scorer(filter, kwargs)
+        collection = self._collection(kwargs)
+        documents = collection.find(filter or {})
+        for key, direction in reversed(kwargs.get("sort") or []):
+            if _is_meta(direction):
+                # {"$meta": "textScore"}: best matches first
+                documents.sort(key=get_score, reverse=True)
+                continue
+            documents.sort(
+                key=lambda document: (
+                    _get_path(document, key) is _MISSING,
+                    _get_path(document, key),
+                ),
+                reverse=direction < 0,
+            )
+        skip = kwargs.get("skip") or 0
+        limit = kwargs.get("limit") or None
+        return documents[skip : skip + limit if limit else None]
+
+    async def iter_many(
+        self, filter, projection=None, batch_size: int = 500, **kwargs
+    ) -> AsyncIterator[dict]:
+        kwargs.pop("no_cursor_timeout", None)
+        get_score = self._get_scorer(filter, kwargs)
+        # documents are only copied when they are consumed
+        for index, document in enumerate(self._select(filter, kwargs)):
+            yield project(document, projection, partial(get_score, document))
+            # give other tasks a chance to run between batches (like the round trips of a cursor)
+            if (index + 1) % batch_size == 0:
+                await asyncio.sleep(0)
+
+    async def delete(self, filter, data, *args, **kwargs) -> Optional[int]:
+        if kwargs.pop("false_delete", False):
+            data.update({"deletion_date": datetime.datetime.utcnow()})
+            return await self.update(filter, data, *args, **kwargs)
+
+        collection = self._collection(kwargs)
+        for document in collection.find(filter):
+            collection.remove(document["_id"])
+            await self._notify(collection.name, "delete", [document])
+            return 1
+        return 0
+
+    async def delete_many(self, filter, data, *args, **kwargs) -> Optional[int]:
+        collection = self._collection(kwargs)
+        deleted = collection.find(filter)
+        for document in deleted:
+            collection.remove(document["_id"])
+        await self._notify(collection.name, "delete", deleted)
+        return len(deleted)
+
+    async def update(self, filter, data, *args, **kwargs) -> Optional[int]:
+        return await self._update(filter, data, many=False, **kwargs)
+
+    async def update_many(self, filter, data, *args, **kwargs) -> Optional[int]:
+        return await self._update(filter, data, many=True, **kwargs)
+
+    async def _update(self, filter, data, many: bool, **kwargs) -> int:
+        collection = self._collection(kwargs)
+        # updates without $ operators are not valid (apply_update raises like mongo would)
+        set_last_modified(data)
+        found = collection.find(filter)
+        if not found and kwargs.get("upsert", False):
+            # like mongo, the inserted document starts with the equality fields of the filter
+            document = {
+                path: copy.deepcopy(value)
+                for path, value in filter.items()
+                if not path.startswith("$")
+                and not (
+                    isinstance(value, dict)
+                    and any(key.startswith("$") for key in value)
+                )
+            }
+            document = apply_update(document, data, insert=True)
+            document.setdefault("_id", ObjectId())
+            collection.put(document)
+            await self._notify(collection.name, "update", [document])
+            # mongo does not count upserted documents as modified
+            return 0
+
+        updated_documents = []
+        for document in found:
+            updated = apply_update(document, data)
+            if updated != document:
+                collection.put(updated)
+                updated_documents.append(updated)
+            if not many:
+                break
+        await self._notify(collection.name, "update", updated_documents)
+        return len(updated_documents)
+
+    async def replace(self, filter, data, *args, **kwargs) -> Optional[int]:
+        collection = self._collection(kwargs)
+        upsert = kwargs.pop("upsert", False)
+        data.update({"last_modified": datetime.datetime.utcnow()})
+
+        found = collection.find(filter)
+        if not found and not upsert:
+            return 0
+
+        record_id = (
+            found[0]["_id"] if found else filter.get("_id", data.get("_id", ObjectId()))
+        )
+        document = {**copy.deepcopy(data), "_id": record_id}
+        collection.put(document)
+        await self._notify(collection.name, "replace", [document])
+        return 1 if found else 0
+
+    async def apply_diff(self, filter, diff: dict, **kwargs) -> Optional[int]:
+        update = get_diff_update(diff)
+        if update is None:
+            return 0
+        return await self._update(filter, update, many=False, **kwargs)
+
+    async def create_index(self, keys, **kwargs) -> str:
+        collection = self._collection(kwargs)
+        if not isinstance(keys, str):
+            keys = keys[0][0]
+        collection.create_index(keys, kwargs.get("unique", False))
+        return f"{keys}_1"
+
+    async def bulk_replace(
+        self,
+        replacements: Union[
+            Iterable[Tuple[dict, dict]], AsyncIterable[Tuple[dict, dict]]
+        ],
+        **kwargs,
+    ) -> Optional[int]:
+        kwargs.pop("batch_size", None)
+        kwargs.pop("max_in_flight", None)
+        collection = self._collection(kwargs)
+        replaced = []
+        async for filter, data in iterate(replacements):
+            data.update({"last_modified": datetime.datetime.utcnow()})
+            for document in collection.find(filter)[:1]:
+                replaced.append({**copy.deepcopy(data), "_id": document["_id"]})
+                collection.put(replaced[-1])
+        await self._notify(collection.name, "replace", replaced)
+        return len(replaced)
+
+    async def bulk_apply_diffs(
+        self,
+        diffs: Union[Iterable[Tuple[dict, dict]], AsyncIterable[Tuple[dict, dict]]],
+        **kwargs,
+    ) -> Optional[int]:
+        kwargs.pop("batch_size", None)
+        kwargs.pop("max_in_flight", None)
+        collection = self._collection(kwargs)
+        updated = []
+        async for filter, diff in iterate(diffs):
+            update = get_diff_update(diff)
+            if update is None:
+                continue
+            for document in collection.find(filter)[:1]:
+                updated.append(apply_update(document, update))
+                collection.put(updated[-1])
+        await self._notify(collection.name, "update", updated)
+        return len(updated)
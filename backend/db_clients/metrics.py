@@ -0,0 +1,192 @@
+import contextvars
+import functools
+import logging
+import time
+from typing import Any, Callable, Optional
+import bson
+from prometheus_client import Counter, Histogram
+from backend.db_clients.base_client import DBClient
+
+LOG = logging.getLogger(__name__)
+
+OPERATION_SECONDS = Histogram(
+    "db_operation_seconds",
+    "latency of the operations of the db clients",
+    ["operation", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+OPERATION_ERRORS = Counter(
+    "db_operation_errors_total",
+    "operations of the db clients that raised an error",
+    ["operation", "collection"],
+)
+DOCUMENTS = Counter(
+    "db_documents_total",
+    "documents read, written or deleted by the db clients",
+    ["operation", "collection"],
+)
+PAYLOAD_BYTES = Counter(
+    "db_payload_bytes_total",
+    "BSON size of the documents read or written by the db clients",
+    ["operation", "collection"],
+)
+
+
+def _count_result(result: Any) -> int:
+    if isinstance(result, list):
+        # store_many returns None for documents that were not stored
+        return sum(1 for entry in result if entry is not None)
+    if isinstance(result, bool) or result is None:
+        return 0
+    if isinstance(result, int):
+        return result
+    return 1
+
+
+def _get_payload(operation: str, args: tuple, result: Any) -> Any:
+    if operation in ("find", "find_many"):
+        return result
+    if operation == "store_many":
+        return args[0] if args else None
+    # the written document / update / diff
+    position = 0 if operation == "store" else 1
+    if (
+        operation in ("store", "update", "replace", "apply_diff")
+        and len(args) > position
+    ):
+        return args[position]
+    return None
+
+
+def _get_size(payload: Any) -> int:
+    documents = payload if isinstance(payload, list) else [payload]
+    size = 0
+    for document in documents:
+        if isinstance(document, dict):
+            try:
+                size += len(bson.encode(document))
+            except Exception:
+                # e.g. a diff with paths as keys. The size is not worth failing the operation
+                pass
+    return size
+
+
+# operations that return their result at once (iter_many is a stream, see _instrument_stream)
+OPERATIONS = (
+    "store",
+    "store_many",
+    "find",
+    "find_many",
+    "delete",
+    "delete_many",
+    "update",
+    "update_many",
+    "replace",
+    "apply_diff",
+    "bulk_replace",
+    "bulk_apply_diffs",
+)
+# operations that consume iterables of the caller, which may run operations of their own (e.g. a relinking
+# generator that reads records), so operations within them are not nested operations of the client
+CALLER_ITERABLE_OPERATIONS = ("bulk_replace", "bulk_apply_diffs")
+
+# set while an operation runs, so operations it calls itself (e.g. delete with false_delete calls update)
+# are not recorded a second time
+_in_operation = contextvars.ContextVar("db_operation", default=False)
+
+
+def _instrument(
+    method: Callable, operation: str, default_coll: str, payload_sizes: bool
+) -> Callable:
+    marks_nested = operation not in CALLER_ITERABLE_OPERATIONS
+
+    @functools.wraps(method)
+    async def instrumented(*args, **kwargs):
+        if _in_operation.get():
+            return await method(*args, **kwargs)
+
+        collection = kwargs.get("coll", default_coll)
+        token = _in_operation.set(True) if marks_nested else None
+        start = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception:
+            OPERATION_ERRORS.labels(operation, collection).inc()
+            raise
+        finally:
+            OPERATION_SECONDS.labels(operation, collection).observe(
+                time.perf_counter() - start
+            )
+            if token is not None:
+                _in_operation.reset(token)
+
+        DOCUMENTS.labels(operation, collection).inc(_count_result(result))
+        if payload_sizes:
+            payload = _get_payload(operation, args, result)
+            if payload is not None:
+                PAYLOAD_BYTES.labels(operation, collection).inc(_get_size(payload))
+        return result
+
+    return instrumented
+
+
+def _instrument_stream(
+    method: Callable, default_coll: str, payload_sizes: bool
+) -> Callable:
+    @functools.wraps(method)
+    async def instrumented(*args, **kwargs):
+        collection = kwargs.get("coll", default_coll)
+        start = time.perf_counter()
+        documents = 0
+        size = 0
+        try:
+            async for document in method(*args, **kwargs):
+                documents += 1
+                if payload_sizes:
+                    size += _get_size(document)
+                yield document
+        finally:
+            # the latency of a stream is the time until it was consumed (or closed)
+            OPERATION_SECONDS.labels("iter_many", collection).observe(
+                time.perf_counter() - start
+            )
+            DOCUMENTS.labels("iter_many", collection).inc(documents)
+            if payload_sizes:
+                PAYLOAD_BYTES.labels("iter_many", collection).inc(size)
+
+    return instrumented
+
+
+def instrument(client: DBClient, config: Optional[dict] = None) -> DBClient:
+    """Wraps the operations of a db client to export latency histograms and document / payload counters
+    (labeled by operation and collection) on /metrics. Operations called by another operation of the client
+    are part of it and not recorded on their own. Nothing is wrapped if the metrics are disabled,
+    so disabled metrics cost nothing.
+
+    Args:
+        client (DBClient): the db client
+        config (Optional[dict], optional): the "db_metrics" config ("enabled", "payload_sizes"). Defaults to None.
+
+    Returns:
+        DBClient: the same client
+    """
+    config = config or {}
+    if not config.get("enabled", False):
+        return client
+
+    payload_sizes = config.get("payload_sizes", False)
+    default_coll = getattr(client, "default_coll", None)
+    for operation in OPERATIONS:
+        method = getattr(client, operation, None)
+        if method is not None:
+            setattr(
+                client,
+                operation,
+                _instrument(method, operation, default_coll, payload_sizes),
+            )
+    if getattr(client, "iter_many", None) is not None:
+        client.iter_many = _instrument_stream(
+            client.iter_many, default_coll, payload_sizes
+        )
+    LOG.info(f"db metrics enabled for {type(client).__name__}")
+    return client
@@ -1,9 +1,53 @@
+import asyncio
 import datetime
 from backend.db_clients.base_client import DBClient
+from backend.db_clients.record_cache import RecordCache
 from aiohttp import web
 from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId
-from typing import Optional
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+
+async def iterate(iterable: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    """iterates sync and async iterables alike"""
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+def set_last_modified(data: dict):
+    """stamps an update with the modification date (in $set for updates with $ operators)"""
+    now = datetime.datetime.utcnow()
+    if any(key.startswith("$") for key in data):
+        data.setdefault("$set", {})["last_modified"] = now
+    else:
+        data.update({"last_modified": now})
+
+
+def get_diff_update(diff: dict) -> Optional[dict]:
+    """turns a record diff into a $set / $unset update document (None if nothing changed)"""
+    if not diff.get("set") and not diff.get("unset"):
+        return None
+
+    update = {
+        "$set": {**diff.get("set", {}), "last_modified": datetime.datetime.utcnow()}
+    }
+    if diff.get("unset"):
+        update["$unset"] = {path: "" for path in diff["unset"]}
+    return update
 
 
 class MongoClient(DBClient):
@@ -25,17 +69,117 @@ class MongoClient(DBClient):
         self.db = app[conn_name][db_name]
         app.db_clients[conn_name] = self
 
+        # async callbacks (collection, operation, documents) that are awaited after every successful write
+        # (store, update, replace, delete, also of many / bulk operations) to the default collection.
+        # Used to keep in-memory structures of the app up to date.
+        self.on_write = []
+        # projection of the written documents the client fetches for the callbacks (None: whole documents)
+        self.on_write_fields = None
+
+        # read-through cache of records found by _id or name_id (invalidated by the writes of this client)
+        cache_config = app.config.get("record_cache", {})
+        self.cache = None
+        if cache_config.get("size"):
+            self.cache = RecordCache(
+                default_coll, cache_config["size"], cache_config.get("ttl", 30)
+            )
+
+    def _invalidate(self, collection: str, filter: Optional[dict] = None):
+        if self.cache is not None:
+            self.cache.invalidate(collection, filter)
+
+    def _watches(self, collection: str) -> bool:
+        return bool(self.on_write) and collection == self.default_coll
+
+    async def _notify(self, collection: str, operation: str, documents: list):
+        if not self._watches(collection) or not documents:
+            return
+        for callback in self.on_write:
+            await callback(collection, operation, documents)
+
+    def _changes_written_fields(self, diff: dict) -> bool:
+        # e.g. diffs that only change links do not change the known record fields
+        if self.on_write_fields is None:
+            return True
+        paths = [*diff.get("set", {}), *diff.get("unset", [])]
+        return any(path.split(".")[0] in self.on_write_fields for path in paths)
+
+    async def _find_written(self, collection: str, filter: dict) -> list:
+        # only fetch what was written if anyone is interested
+        if not self._watches(collection):
+            return []
+        document = await self.db[collection].find_one(filter, self.on_write_fields)
+        return [document] if document else []
+
+    async def _find_all_written(self, collection: str, filter: dict) -> list:
+        if not self._watches(collection):
+            return []
+        return (
+            await self.db[collection].find(filter, self.on_write_fields).to_list(None)
+        )
+
     async def store(self, data: dict, **kwargs) -> Optional[ObjectId]:
         collection = kwargs.pop("coll", self.default_coll)
         data.update({"creation_date": datetime.datetime.utcnow()})
         result = await self.db[collection].insert_one(data)
         if result.acknowledged:
+            await self._notify(collection, "store", [data])
             return result.inserted_id
         return None
 
+    async def store_many(
+        self, documents: List[dict], batch_size: int = 500, **kwargs
+    ) -> List[Optional[ObjectId]]:
+        """Inserts many documents with unordered insert_many batches. A failing document (e.g. a duplicate name_id)
+        does not stop the others.
+
+        Args:
+            documents (List[dict]): the documents to insert (documents without _id get one)
+            batch_size (int, optional): number of documents per insert_many. Defaults to 500.
+
+        Returns:
+            List[Optional[ObjectId]]: per document the inserted _id or None if it was not inserted
+        """
+        collection = kwargs.pop("coll", self.default_coll)
+        creation_date = datetime.datetime.utcnow()
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            document.update({"creation_date": creation_date})
+
+        failed = set()
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start : start + batch_size]
+            try:
+                await self.db[collection].insert_many(batch, ordered=False, **kwargs)
+            except BulkWriteError as error:
+                failed.update(
+                    start + write_error["index"]
+                    for write_error in error.details.get("writeErrors", [])
+                )
+
+        stored = [
+            document for index, document in enumerate(documents) if index not in failed
+        ]
+        if stored:
+            await self._notify(collection, "store", stored)
+        return [
+            None if index in failed else document["_id"]
+            for index, document in enumerate(documents)
+        ]
+
     async def find(self, filter, *args, **kwargs) -> Optional[dict]:
         collection = kwargs.pop("coll", self.default_coll)
-        return await self.db[collection].find_one(filter, *args, **kwargs)
+        key = self.cache and self.cache.get_key(collection, filter, args, kwargs)
+        if not key:
+            return await self.db[collection].find_one(filter, *args, **kwargs)
+
+        document = self.cache.get(key)
+        if document is None:
+            epoch = self.cache.epoch
+            document = await self.db[collection].find_one(filter)
+            if document is not None:
+                self.cache.set(document, epoch)
+        return document
 
     async def find_many(self, filter, *args, **kwargs) -> list:
         collection = kwargs.pop("coll", self.default_coll)
@@ -44,14 +188,52 @@ class MongoClient(DBClient):
             documents.append(document)
         return documents
 
+    async def iter_many(
+        self,
+        filter,
+        *args,
+        batch_size: int = 500,
+        no_cursor_timeout: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[dict]:
+        """Streams the documents matching the filter instead of collecting them into a list.
+        At most one batch of documents is held in memory at a time.
+
+        Args:
+            filter (dict): the query filter
+            batch_size (int, optional): number of documents fetched per round trip. Defaults to 500.
+            no_cursor_timeout (bool, optional): keep the cursor alive while the consumer is slow. Defaults to False.
+
+        Yields:
+            AsyncIterator[dict]: the matching documents (projected if a projection is given)
+        """
+        collection = kwargs.pop("coll", self.default_coll)
+        cursor = self.db[collection].find(
+            filter,
+            *args,
+            batch_size=batch_size,
+            no_cursor_timeout=no_cursor_timeout,
+            **kwargs,
+        )
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            # cursors without timeout are never cleaned up by the server
+            await cursor.close()
+
     async def delete(self, filter, data, *args, **kwargs) -> Optional[int]:
         collection = kwargs.pop("coll", self.default_coll)
         if kwargs.pop("false_delete", False):
             data.update({"deletion_date": datetime.datetime.utcnow()})
             return await self.update(filter, data, *args, **kwargs)
 
+        deleted = await self._find_written(collection, filter)
         result = await self.db[collection].delete_one(filter, data, *args, **kwargs)
+        self._invalidate(collection, filter)
         if result.acknowledged:
+            if result.deleted_count:
+                await self._notify(collection, "delete", deleted)
             return result.deleted_count
         return None
 
@@ -61,24 +243,47 @@ class MongoClient(DBClient):
             data.update_many({"deletion_date": datetime.datetime.utcnow()})
             return await self.update(filter, data, *args, **kwargs)
 
+        deleted = await self._find_all_written(collection, filter)
         result = await self.db[collection].delete_many(filter, data, *args, **kwargs)
+        self._invalidate(collection)
         if result.acknowledged:
+            if result.deleted_count:
+                await self._notify(collection, "delete", deleted)
             return result.deleted_count
         return None
 
     async def update(self, filter, data, *args, **kwargs) -> Optional[int]:
         collection = kwargs.pop("coll", self.default_coll)
-        data.update({"last_modified": datetime.datetime.utcnow()})
+        set_last_modified(data)
         result = await self.db[collection].update_one(filter, data, *args, **kwargs)
+        self._invalidate(collection, filter)
         if result.acknowledged:
+            if result.modified_count:
+                await self._notify(
+                    collection, "update", await self._find_written(collection, filter)
+                )
             return result.modified_count
         return None
 
     async def update_many(self, filter, data, *args, **kwargs) -> Optional[int]:
         collection = kwargs.pop("coll", self.default_coll)
-        data.update({"last_modified": datetime.datetime.utcnow()})
+        set_last_modified(data)
+        # the filter may not match the documents anymore after the update
+        written_ids = [
+            document["_id"]
+            for document in await self._find_all_written(collection, filter)
+        ]
         result = await self.db[collection].update_many(filter, data, *args, **kwargs)
+        self._invalidate(collection)
         if result.acknowledged:
+            if result.modified_count:
+                await self._notify(
+                    collection,
+                    "update",
+                    await self._find_all_written(
+                        collection, {"_id": {"$in": written_ids}}
+                    ),
+                )
             return result.modified_count
         return None
 
@@ -86,6 +291,153 @@ class MongoClient(DBClient):
         collection = kwargs.pop("coll", self.default_coll)
         data.update({"last_modified": datetime.datetime.utcnow()})
         result = await self.db[collection].replace_one(filter, data, *args, **kwargs)
+        self._invalidate(collection, filter)
+        if result.acknowledged:
+            if result.modified_count or result.upserted_id is not None:
+                await self._notify(
+                    collection, "replace", await self._find_written(collection, filter)
+                )
+            return result.modified_count
+        return None
+
+    async def create_index(self, keys, **kwargs) -> str:
+        collection = kwargs.pop("coll", self.default_coll)
+        return await self.db[collection].create_index(keys, **kwargs)
+
+    async def bulk_replace(
+        self,
+        replacements: Union[
+            Iterable[Tuple[dict, dict]], AsyncIterable[Tuple[dict, dict]]
+        ],
+        batch_size: int = 500,
+        max_in_flight: int = 4,
+        **kwargs,
+    ) -> Optional[int]:
+        """Replaces many documents using unordered bulk writes. The replacements are consumed lazily,
+        a new batch is only sent when less than max_in_flight batches are being written.
+
+        Args:
+            replacements (Union[Iterable, AsyncIterable]): pairs of filter and replacement document (also as async stream)
+            batch_size (int, optional): number of replacements per bulk write. Defaults to 500.
+            max_in_flight (int, optional): number of bulk writes that may run concurrently. Defaults to 4.
+
+        Returns:
+            Optional[int]: number of modified documents
+        """
+
+        async def requests():
+            async for filter, data in iterate(replacements):
+                data.update({"last_modified": datetime.datetime.utcnow()})
+                yield filter, ReplaceOne(filter, data)
+
+        return await self._bulk_write(
+            requests(), "replace", batch_size, max_in_flight, **kwargs
+        )
+
+    async def apply_diff(self, filter, diff: dict, **kwargs) -> Optional[int]:
+        """Writes only what changed according to a record diff (see linker.get_record_diff) using $set / $unset.
+        Nothing is written if the diff is empty.
+
+        Args:
+            filter (dict): the query filter of the document
+            diff (dict): the "set" and "unset" field paths of the diff
+
+        Returns:
+            Optional[int]: number of modified documents
+        """
+        collection = kwargs.pop("coll", self.default_coll)
+        update = get_diff_update(diff)
+        if update is None:
+            return 0
+
+        result = await self.db[collection].update_one(filter, update, **kwargs)
+        self._invalidate(collection, filter)
         if result.acknowledged:
+            if result.modified_count and self._changes_written_fields(diff):
+                await self._notify(
+                    collection, "update", await self._find_written(collection, filter)
+                )
             return result.modified_count
         return None
+
+    async def bulk_apply_diffs(
+        self,
+        diffs: Union[Iterable[Tuple[dict, dict]], AsyncIterable[Tuple[dict, dict]]],
+        batch_size: int = 500,
+        max_in_flight: int = 4,
+        **kwargs,
+    ) -> Optional[int]:
+        """Like bulk_replace, but applies record diffs (see apply_diff). Empty diffs are not written at all.
+
+        Args:
+            diffs (Union[Iterable, AsyncIterable]): pairs of filter and record diff (also as async stream)
+            batch_size (int, optional): number of updates per bulk write. Defaults to 500.
+            max_in_flight (int, optional): number of bulk writes that may run concurrently. Defaults to 4.
+
+        Returns:
+            Optional[int]: number of modified documents
+        """
+
+        async def requests():
+            async for filter, diff in iterate(diffs):
+                update = get_diff_update(diff)
+                if update is not None:
+                    # only records with changed fields are fetched for on_write
+                    notified = filter if self._changes_written_fields(diff) else None
+                    yield notified, UpdateOne(filter, update)
+
+        return await self._bulk_write(
+            requests(), "update", batch_size, max_in_flight, **kwargs
+        )
+
+    async def _bulk_write(
+        self,
+        requests: AsyncIterable,
+        operation: str,
+        batch_size: int,
+        max_in_flight: int,
+        **kwargs,
+    ) -> int:
+        collection = kwargs.pop("coll", self.default_coll)
+        in_flight = asyncio.Semaphore(max_in_flight)
+        writes = []
+
+        async def write(batch: list) -> int:
+            try:
+                result = await self.db[collection].bulk_write(
+                    [request for _, request in batch], ordered=False, **kwargs
+                )
+                if not result.acknowledged:
+                    return 0
+                filters = [filter for filter, _ in batch if filter is not None]
+                if result.modified_count and filters:
+                    written = await self._find_all_written(collection, {"$or": filters})
+                    await self._notify(collection, operation, written)
+                return result.modified_count
+            finally:
+                in_flight.release()
+
+        async def flush(batch: list):
+            await in_flight.acquire()
+            writes.append(asyncio.ensure_future(write(batch)))
+
+        try:
+            batch = []
+            async for filter, request in requests:
+                batch.append((filter, request))
+                if len(batch) >= batch_size:
+                    await flush(batch)
+                    batch = []
+            if batch:
+                await flush(batch)
+            return sum(await asyncio.gather(*writes)) if writes else 0
+        except BaseException:
+            # e.g. the requests (which may read records themselves) or a batch failed: no write may be left
+            # running unobserved
+            for pending in writes:
+                pending.cancel()
+            await asyncio.gather(*writes, return_exceptions=True)
+            raise
+        finally:
+            # the written documents are only known to the generator of the requests
+            self._invalidate(collection)
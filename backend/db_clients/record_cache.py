@@ -0,0 +1,97 @@
+import copy
+import logging
+from typing import Optional
+from prometheus_client import Counter
+from backend.lru_cache import LRUCache
+
+LOG = logging.getLogger(__name__)
+
+CACHE_HITS = Counter(
+    "record_cache_hits_total", "finds answered by the record cache", ["collection"]
+)
+CACHE_MISSES = Counter(
+    "record_cache_misses_total",
+    "cacheable finds that went to the database",
+    ["collection"],
+)
+
+
+class RecordCache:
+    """Read-through cache for finds of single documents of one collection by their _id or name_id.
+    Documents are cached by _id, name_ids only point to the _id. The db client invalidates the cache on
+    every write, so cached documents are never older than the last write of the client itself. Writes of other
+    processes are not seen until the documents expire (ttl).
+    """
+
+    def __init__(
+        self,
+        collection: str = "records",
+        maxsize: int = 4096,
+        ttl: Optional[float] = None,
+    ):
+        self.collection = collection
+        self._documents = LRUCache(maxsize, ttl)
+        self._name_ids = LRUCache(maxsize, ttl)
+        # increased by every invalidation. Finds that started before an invalidation must not fill the cache
+        self._epoch = 0
+
+    def get_key(
+        self, collection: str, filter: dict, args: tuple, kwargs: dict
+    ) -> Optional[tuple]:
+        """returns the cache key of a find (None if the find cannot be cached, e.g. because of a projection)"""
+        if collection != self.collection or args or kwargs or len(filter) != 1:
+            return None
+
+        field, value = next(iter(filter.items()))
+        if field not in ("_id", "name_id") or isinstance(value, (dict, list)):
+            return None
+        return field, value
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """returns a copy of the cached document (None on a miss)"""
+        field, value = key
+        record_id = value if field == "_id" else self._name_ids.get(value)
+        document = self._documents.get(record_id) if record_id is not None else None
+        # the name may point to a record that was renamed since
+        if document is not None and (
+            field == "_id" or document.get("name_id") == value
+        ):
+            CACHE_HITS.labels(self.collection).inc()
+            return copy.deepcopy(document)
+
+        CACHE_MISSES.labels(self.collection).inc()
+        return None
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def set(self, document: dict, epoch: int):
+        """caches a found document unless the cache was invalidated since the find started (epoch)"""
+        if epoch != self._epoch or document.get("_id") is None:
+            return
+
+        self._documents.set(document["_id"], copy.deepcopy(document))
+        if document.get("name_id") is not None:
+            self._name_ids.set(document["name_id"], document["_id"])
+
+    def invalidate(self, collection: str, filter: Optional[dict] = None):
+        """Drops the documents a write with this filter may have changed
+
+        Args:
+            collection (str): the written collection
+            filter (Optional[dict], optional): the filter of the write. Everything is dropped if the written _id is unknown. Defaults to None.
+        """
+        if collection != self.collection:
+            return
+
+        self._epoch += 1
+        record_id = (filter or {}).get("_id")
+        if record_id is None or isinstance(record_id, (dict, list)):
+            self.clear()
+            return
+        self._documents.pop(record_id)
+
+    def clear(self):
+        self._documents.clear()
+        self._name_ids.clear()
@@ -0,0 +1,146 @@
+import datetime
+import email.utils
+import hashlib
+import logging
+import os
+from typing import Iterable, List, Optional
+from aiohttp import hdrs, web
+from backend.api import linker
+
+LOG = logging.getLogger(__name__)
+
+RECORD_CACHE_CONTROL = "private, no-cache"
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+VERSIONED_STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def get_files_version(directories: Iterable[str]) -> str:
+    """Hashes the paths and contents of all files below the directories (e.g. templates, locales and static
+    assets, which all end up in a rendered page)
+
+    Args:
+        directories (Iterable[str]): the directories
+
+    Returns:
+        str: hex digest of the files
+    """
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            dirs[:] = [name for name in dirs if name != "__pycache__"]
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                digest.update(os.path.relpath(path, directory).encode())
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()
+
+
+def get_record_validators(app: web.Application, record: dict) -> Optional[dict]:
+    """Creates the validators of the page of a record: a strong ETag of the record version (its last
+    modification), the version of templates, locales and assets (app.page_version) and, if links are rendered
+    on request, the version of the known records. Records without a modification date get no validators.
+
+    Args:
+        app (web.Application): the app
+        record (dict): the record (at least "_id", "last_modified" and "creation_date")
+
+    Returns:
+        Optional[dict]: the "etag" and "last_modified" (aware UTC datetime) or None
+    """
+    modified = record.get("last_modified") or record.get("creation_date")
+    if modified is None:
+        return None
+
+    parts = [str(record.get("_id")), modified.isoformat(), app.page_version]
+    if linker.get_storage_mode(app.config) == "spans":
+        # rendered links of mention spans follow renamed records (see records.render_mentions)
+        parts.append(str(app.known_records.version))
+    etag = hashlib.sha1(":".join(parts).encode()).hexdigest()[:24]
+    return {
+        "etag": etag,
+        "last_modified": modified.replace(tzinfo=datetime.timezone.utc),
+    }
+
+
+def parse_etags(header: Optional[str]) -> Optional[List[str]]:
+    """parses an If-None-Match header into the entity tags without quotes and weakness ("*" stays "*")"""
+    if header is None:
+        return None
+    etags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        # If-None-Match uses the weak comparison
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        etags.append(tag.strip('"'))
+    return etags
+
+
+def parse_http_date(header: Optional[str]) -> Optional[datetime.datetime]:
+    """parses an http date (e.g. of If-Modified-Since) into an aware datetime (None if it is invalid)"""
+    if header is None:
+        return None
+    try:
+        date = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+def is_not_modified(request: web.Request, validators: dict) -> bool:
+    """checks the conditional headers of a request (If-None-Match wins over If-Modified-Since)"""
+    etags = parse_etags(request.headers.get(hdrs.IF_NONE_MATCH))
+    if etags is not None:
+        return any(etag in (validators["etag"], "*") for etag in etags)
+    modified_since = parse_http_date(request.headers.get(hdrs.IF_MODIFIED_SINCE))
+    if modified_since is not None:
+        # http dates have no fractions of seconds
+        modified = validators["last_modified"].replace(microsecond=0)
+        return modified <= modified_since
+    return False
+
+
+def is_conditional(request: web.Request) -> bool:
+    return (
+        hdrs.IF_NONE_MATCH in request.headers
+        or parse_http_date(request.headers.get(hdrs.IF_MODIFIED_SINCE)) is not None
+    )
+
+
+def set_validators(
+    response: web.StreamResponse, app: web.Application, validators: Optional[dict]
+) -> web.StreamResponse:
+    """adds ETag, Last-Modified and Cache-Control headers to the response of a record page"""
+    if validators is None:
+        return response
+    response.headers[hdrs.ETAG] = f'"{validators["etag"]}"'
+    response.last_modified = validators["last_modified"]
+    response.headers["Cache-Control"] = app.config.get("http_cache", {}).get(
+        "records", RECORD_CACHE_CONTROL
+    )
+    return response
+
+
+def not_modified(app: web.Application, validators: dict) -> web.Response:
+    return set_validators(web.Response(status=304), app, validators)
+
+
+async def set_static_cache_control(request: web.Request, response: web.StreamResponse):
+    """on_response_prepare signal: lets browsers cache static assets. Urls of the static() template
+    function carry the hash of the file (?v=), so they never change and can be cached forever
+    """
+    if not request.path.startswith(request.app["static_root_url"] + "/"):
+        return
+    if response.status not in (200, 304):
+        return
+
+    config = request.app.config.get("http_cache", {})
+    if "v" in request.query:
+        cache_control = config.get("static_versioned", VERSIONED_STATIC_CACHE_CONTROL)
+    else:
+        cache_control = config.get("static", STATIC_CACHE_CONTROL)
+    response.headers["Cache-Control"] = cache_control
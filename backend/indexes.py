@@ -0,0 +1,121 @@
+import logging
+from typing import Dict, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+LOG = logging.getLogger(__name__)
+
+# indexes every collection should have (besides _id). Indexes get the default names of mongo (e.g. "name_id_1")
+INDEXES = {
+    "records": [
+        # context_processor.get_record_context, migrations
+        {"keys": [("name_id", ASCENDING)], "unique": True},
+        # reverse index of the links (see api.backlinks)
+        {"keys": [("linked_records", ASCENDING)]},
+        # candidates that may mention a new or renamed record (see api.relink_queue) and the search (see api.search).
+        # No stemming, names are no words. Matches in names rank higher than matches in infoboxes or articles
+        {
+            "keys": [("$**", TEXT)],
+            "default_language": "none",
+            "weights": {"name_id": 10, "names": 10, "last_name": 10},
+        },
+    ],
+    "relink_jobs": [
+        # at most one pending job per record, so duplicate jobs coalesce (see api.relink_queue)
+        {
+            "keys": [("record_id", ASCENDING)],
+            "unique": True,
+            "partialFilterExpression": {"state": "pending"},
+        },
+        # the next due job
+        {"keys": [("state", ASCENDING), ("run_after", ASCENDING)]},
+    ],
+    "users": [
+        # login.post
+        {"keys": [("name", ASCENDING)], "unique": True},
+    ],
+    "lores": [
+        {"keys": [("name", ASCENDING)]},
+    ],
+}
+
+
+def get_index_models(spec: List[dict]) -> List[IndexModel]:
+    return [
+        IndexModel(
+            index["keys"],
+            **{key: value for key, value in index.items() if key != "keys"},
+        )
+        for index in spec
+    ]
+
+
+async def ensure_indexes(
+    db: AsyncIOMotorDatabase, indexes: Dict[str, List[dict]] = INDEXES
+) -> List[str]:
+    """Creates the missing indexes of the spec. Existing indexes are left alone, so this can be run on every startup
+
+    Args:
+        db (AsyncIOMotorDatabase): the database
+        indexes (Dict[str, List[dict]], optional): the index spec per collection. Defaults to INDEXES.
+
+    Returns:
+        List[str]: "collection.index" of all indexes that could not be created
+    """
+    failed = []
+    for collection, spec in indexes.items():
+        for model in get_index_models(spec):
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as error:
+                # e.g. duplicates prevent a unique index or an index with the same keys but other options exists
+                LOG.error(f"Could not create index {collection}.{name}: {error}")
+                failed.append(f"{collection}.{name}")
+    LOG.info(f"Ensured indexes of {', '.join(indexes)} ({len(failed)} failed)")
+    return failed
+
+
+async def get_index_report(
+    db: AsyncIOMotorDatabase, indexes: Dict[str, List[dict]] = INDEXES
+) -> dict:
+    """Compares the existing indexes with the spec and collects the indexes that were never used since the server started
+
+    Args:
+        db (AsyncIOMotorDatabase): the database
+        indexes (Dict[str, List[dict]], optional): the index spec per collection. Defaults to INDEXES.
+
+    Returns:
+        dict: per collection the "missing" (in the spec, but not in the database), "unknown" (in the database, but not in the spec)
+            and "unused" (no accesses according to $indexStats) index names
+    """
+    report = {}
+    for collection, spec in indexes.items():
+        existing = {
+            index["name"]: index async for index in db[collection].list_indexes()
+        }
+        expected = {model.document["name"] for model in get_index_models(spec)}
+
+        unused = []
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and not stats["accesses"]["ops"]:
+                    unused.append(stats["name"])
+        except OperationFailure as error:
+            # $indexStats needs the clusterMonitor role (or similar)
+            LOG.warning(f"Could not read index stats of {collection}: {error}")
+
+        report[collection] = {
+            "missing": sorted(expected - existing.keys()),
+            "unknown": sorted(existing.keys() - expected - {"_id_"}),
+            "unused": sorted(unused),
+        }
+    return report
+
+
+def log_index_report(report: dict):
+    for collection, entry in report.items():
+        for kind in ("missing", "unknown", "unused"):
+            if entry[kind]:
+                LOG.warning(f"{kind} indexes in {collection}: {', '.join(entry[kind])}")
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Size bounded mapping that evicts the least recently used entry when it is full.
+    Entries optionally expire ttl seconds after they were set.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (value, expiry time or None)
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._get_entry(key) is not None
+
+    def _get_entry(self, key: Hashable) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._get_entry(key)
+        if entry is None:
+            return default
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._get_entry(key)
+        if entry is None:
+            return default
+        del self._entries[key]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
@@ -3,9 +3,20 @@ import logging
 import motor.motor_asyncio
 from pymongo.errors import ServerSelectionTimeoutError
 from aiohttp import web
+from backend import indexes
+from backend.pool_metrics import PoolMetricsListener
 
 LOG = logging.getLogger(__name__)
 
+# connection pool options of every connection (see pymongo.MongoClient) and their defaults
+POOL_OPTIONS = {
+    "maxPoolSize": 100,
+    "minPoolSize": 0,
+    "waitQueueTimeoutMS": None,
+    "maxIdleTimeMS": None,
+}
+POOL_SIZE_OPTIONS = ("maxPoolSize", "minPoolSize")
+
 
 def get_app_key(type: str, key: str) -> str:
     if key == "default":
@@ -15,8 +26,42 @@ def get_app_key(type: str, key: str) -> str:
     return template.format(type=type, name=key)
 
 
+def uses_memory(client_attr: dict) -> bool:
+    """connections with "backend: memory" use the in-process MemoryClient instead of a mongo server"""
+    return client_attr.get("backend", "mongo") == "memory"
+
+
+def get_pool_options(client_attr: dict) -> dict:
+    """Returns the validated connection pool options of a connection (defaults of POOL_OPTIONS for missing ones)
+
+    Args:
+        client_attr (dict): the config of the connection
+
+    Returns:
+        dict: keyword arguments for the motor client
+    """
+    options = {
+        option: client_attr.get(option, default)
+        for option, default in POOL_OPTIONS.items()
+    }
+    for option, value in options.items():
+        if value is None:
+            continue
+        # pymongo accepts 0 for the pool sizes (maxPoolSize 0: no limit), but not for the timeouts
+        minimum = 0 if option in POOL_SIZE_OPTIONS else 1
+        # bools are ints in python, but true / false in the config are mistakes
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            kind = "non-negative" if minimum == 0 else "positive"
+            raise ValueError(f"{option} must be a {kind} integer (got {value!r})")
+    if options["maxPoolSize"] and options["minPoolSize"] > options["maxPoolSize"]:
+        raise ValueError("minPoolSize must not be larger than maxPoolSize")
+    return options
+
+
 def test_connection(app: web.Application):
-    for key, _ in app.config["mongodb"].items():
+    for key, client_attr in app.config["mongodb"].items():
+        if uses_memory(client_attr):
+            continue
         key = get_app_key("mongo", key)
         try:
             app[key].is_mongos
@@ -29,8 +74,17 @@ async def enable(app: web.Application):
         raise AttributeError("mongodb config is missing")
 
     for key, client_attr in app.config["mongodb"].items():
+        if uses_memory(client_attr):
+            continue
         client_attr = copy.copy(client_attr)
+        client_attr.pop("backend", None)
         db = client_attr.pop("db")
+        client_attr.update(get_pool_options(client_attr))
+        # exports checkout latency, waiters and connections of the pool on /metrics
+        client_attr["event_listeners"] = [
+            *client_attr.get("event_listeners", []),
+            PoolMetricsListener(key),
+        ]
         client = motor.motor_asyncio.AsyncIOMotorClient(**client_attr)
 
         app_key = get_app_key("mongo", key)
@@ -42,10 +96,23 @@ async def enable(app: web.Application):
 
     test_connection(app)
 
+    # indexes are created idempotently (existing indexes are left alone)
+    index_config = app.config.get("indexes", {})
+    for key, client_attr in app.config["mongodb"].items():
+        if uses_memory(client_attr):
+            continue
+        db = app[get_app_key("mongo", key)][client_attr["db"]]
+        if index_config.get("ensure", True):
+            await indexes.ensure_indexes(db)
+        if index_config.get("report", False):
+            indexes.log_index_report(await indexes.get_index_report(db))
+
 
 async def disable(app: web.Application):
 
-    for key, _ in app.config["mongodb"].items():
+    for key, client_attr in app.config["mongodb"].items():
+        if uses_memory(client_attr):
+            continue
         key = get_app_key("mongo", key)
         app[key].close()
 
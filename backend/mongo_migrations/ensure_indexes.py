@@ -0,0 +1,24 @@
+import asyncio
+import logging
+from backend import indexes
+from backend.mongo_migrations import migration_basics as basics
+
+LOG = logging.getLogger(__name__)
+
+
+async def ensure_indexes():
+    LOG.info("Ensuring indexes")
+    config = basics.load_config()
+    db = basics.get_mongo_db(config)
+    await indexes.ensure_indexes(db)
+    indexes.log_index_report(await indexes.get_index_report(db))
+
+
+async def main():
+    basics.setup_logging()
+    await ensure_indexes()
+
+
+if __name__ == "__main__":
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
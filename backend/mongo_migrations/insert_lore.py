@@ -1,10 +1,11 @@
 import os
 import asyncio
 import logging
+from backend import indexes
 from backend.mongo_migrations import migration_basics as basics
 from backend.mongo_migrations.migration_mongo_client import MigrationMongoClient
 from backend.api import linker
-
+from backend.api.known_records import KnownRecords
 
 LOG = logging.getLogger(__name__)
 
@@ -17,15 +18,17 @@ async def insert_lore():
     config = basics.load_config()
     db = basics.get_mongo_db(config)
     db_client = MigrationMongoClient(db)
+    # name_id lookups of exists() need the index
+    await indexes.ensure_indexes(db)
     COLLECTION_NAME = "records"
     coll = db[COLLECTION_NAME]
+    known_records = KnownRecords(COLLECTION_NAME)
+    await known_records.load(db_client)
 
     for root, _, files in os.walk(
         os.path.join(basics.BASE_PATH, LORE_FOLDER_NAME), topdown=False
     ):
         for name in files:
-            # update known records after every insert
-            known_records = await linker.get_known_records_map(db_client)
             file_name = os.path.splitext(name)[0]
 
             document = basics.load_yaml(os.path.join(root, name))
@@ -35,11 +38,15 @@ async def insert_lore():
             LOG.info(f"have {name}")
             if not await basics.exists(coll, {"name_id": document["name_id"]}):
                 LOG.info("Linking document")
-                document = linker.insert_links(document, known_records)
+                document = known_records.snapshot().insert_links(
+                    document, linker.get_storage_mode(config)
+                )
                 LOG.info(
                     f"Inserting {file_name} into the database under {COLLECTION_NAME}"
                 )
                 await coll.insert_one(document)
+                # update known records after every insert
+                known_records.upsert([document])
             else:
                 LOG.info("Record already exists in the dabase!")
 
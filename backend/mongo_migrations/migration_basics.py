@@ -62,7 +62,8 @@ async def exists(
     coll: motor.motor_asyncio.AsyncIOMotorCollection, doc_filter: dict
 ) -> bool:
     LOG.info(f"Checking if document with {doc_filter} exists...")
-    if await coll.count_documents(doc_filter) > 0:
+    # find_one stops at the first match (count_documents would count all of them)
+    if await coll.find_one(doc_filter, {"_id": 1}) is not None:
         LOG.info("Yes")
         return True
     LOG.info("No")
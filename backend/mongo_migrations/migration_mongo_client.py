@@ -2,7 +2,7 @@ import datetime
 from backend.db_clients.base_client import DBClient
 from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 from bson import ObjectId
-from typing import Optional
+from typing import AsyncIterator, Optional
 import logging
 
 
@@ -17,7 +17,7 @@ class MigrationMongoClient(DBClient):
         self.db = db
 
     async def store(self, data: dict, **kwargs) -> Optional[ObjectId]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         data.update({"creation_date": datetime.datetime.utcnow()})
         result = await self.db[collection].insert_one(data)
         if result.acknowledged:
@@ -25,18 +25,40 @@ class MigrationMongoClient(DBClient):
         return None
 
     async def find(self, filter, *args, **kwargs) -> Optional[dict]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         return await self.db[collection].find_one(filter, *args, **kwargs)
 
     async def find_many(self, filter, *args, **kwargs) -> list:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         documents = []
         async for document in self.db[collection].find(filter, *args, **kwargs):
             documents.append(document)
         return documents
 
+    async def iter_many(
+        self,
+        filter,
+        *args,
+        batch_size: int = 500,
+        no_cursor_timeout: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[dict]:
+        collection = kwargs.pop("coll", self.default_coll)
+        cursor = self.db[collection].find(
+            filter,
+            *args,
+            batch_size=batch_size,
+            no_cursor_timeout=no_cursor_timeout,
+            **kwargs,
+        )
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            await cursor.close()
+
     async def delete(self, filter, data, *args, **kwargs) -> Optional[int]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         if kwargs.pop("false_delete", False):
             data.update({"deletion_date": datetime.datetime.utcnow()})
             return await self.update(filter, data, *args, **kwargs)
@@ -47,7 +69,7 @@ class MigrationMongoClient(DBClient):
         return None
 
     async def delete_many(self, filter, data, *args, **kwargs) -> Optional[int]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         if kwargs.pop("false_delete", False):
             data.update_many({"deletion_date": datetime.datetime.utcnow()})
             return await self.update(filter, data, *args, **kwargs)
@@ -58,7 +80,7 @@ class MigrationMongoClient(DBClient):
         return None
 
     async def update(self, filter, data, *args, **kwargs) -> Optional[int]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         data.update({"last_modified": datetime.datetime.utcnow()})
         result = await self.db[collection].update_one(filter, data, *args, **kwargs)
         if result.acknowledged:
@@ -66,7 +88,7 @@ class MigrationMongoClient(DBClient):
         return None
 
     async def update_many(self, filter, data, *args, **kwargs) -> Optional[int]:
-        collection = kwargs.get("coll", self.default_coll)
+        collection = kwargs.pop("coll", self.default_coll)
         data.update({"last_modified": datetime.datetime.utcnow()})
         result = await self.db[collection].update_many(filter, data, *args, **kwargs)
         if result.acknowledged:
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+LOG = logging.getLogger(__name__)
+
+CHECKOUT_SECONDS = Histogram(
+    "mongo_pool_checkout_seconds",
+    "time waited for a connection of the pool",
+    ["connection"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "failed connection checkouts (e.g. wait queue timeouts)",
+    ["connection", "reason"],
+)
+WAITERS = Gauge(
+    "mongo_pool_waiters", "operations waiting for a connection", ["connection"]
+)
+IN_USE = Gauge(
+    "mongo_pool_connections_in_use", "checked out connections", ["connection"]
+)
+OPEN = Gauge("mongo_pool_connections", "open connections of the pool", ["connection"])
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Exports the state of the connection pools of one mongo connection (see config "mongodb") to prometheus.
+    pymongo calls the listener from the threads that run the operations, so checkout start times are thread local.
+    """
+
+    def __init__(self, connection: str):
+        self.connection = connection
+        self._checkout_started = threading.local()
+
+    def _finish_checkout(self) -> bool:
+        started = getattr(self._checkout_started, "time", None)
+        if started is None:
+            return False
+        self._checkout_started.time = None
+        WAITERS.labels(self.connection).dec()
+        CHECKOUT_SECONDS.labels(self.connection).observe(time.perf_counter() - started)
+        return True
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.time = time.perf_counter()
+        WAITERS.labels(self.connection).inc()
+
+    def connection_checked_out(self, event):
+        self._finish_checkout()
+        IN_USE.labels(self.connection).inc()
+
+    def connection_check_out_failed(self, event):
+        self._finish_checkout()
+        CHECKOUT_FAILURES.labels(self.connection, str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        IN_USE.labels(self.connection).dec()
+
+    def connection_created(self, event):
+        OPEN.labels(self.connection).inc()
+
+    def connection_closed(self, event):
+        OPEN.labels(self.connection).dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        LOG.debug(f"connection pool of {self.connection} created for {event.address}")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        LOG.warning(f"connection pool of {self.connection} cleared ({event.address})")
+
+    def pool_closed(self, event):
+        pass
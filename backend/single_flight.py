@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+from prometheus_client import Counter
+
+LOG = logging.getLogger(__name__)
+
+SHARED_CALLS = Counter(
+    "single_flight_shared_total",
+    "calls that joined a call with the same key that was already in flight",
+    ["flight"],
+)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key: the first caller starts the call, callers that arrive
+    while it is in flight wait for the same result (or error). Nothing is cached, the next call after
+    the flight landed starts a new one.
+
+    The call runs in a task of its own, so a cancelled caller does not cancel the call of the others.
+    The call is only cancelled when all of its callers were cancelled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # key -> (task, number of waiting callers)
+        self._flights = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]) -> Any:
+        """Runs call() unless a call with this key is in flight already and returns its result
+
+        Args:
+            key (Hashable): identifies calls with the same result
+            call (Callable[[], Awaitable]): starts the call (only invoked if no call with this key is in flight)
+
+        Raises:
+            Exception: the exception of the call (every caller gets the same exception)
+
+        Returns:
+            Any: the result of the call (the same object for every caller, callers must not modify it)
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self._land(key, done))
+            flight = self._flights[key] = [task, 0]
+        else:
+            SHARED_CALLS.labels(self.name).inc()
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                flight[1] -= 1
+                if flight[1] == 0:
+                    LOG.debug(f"{self.name}: all callers of {key} were cancelled")
+                    # land the flight now, callers that arrive before the task is done start a new call
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    task.cancel()
+            raise
+
+    def _land(self, key: Hashable, task: asyncio.Future):
+        flight = self._flights.get(key)
+        if flight is not None and flight[0] is task:
+            del self._flights[key]
+        # callers that were cancelled at the same time did not retrieve the exception
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+from typing import Optional
+import click
+import jinja2
+import yaml
+
+LOG = logging.getLogger(__name__)
+
+BASE_PATH = os.path.dirname(__file__)
+TEMPLATES_PATH = os.path.join(BASE_PATH, "templates")
+
+
+class ReadOnlyBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Bytecode cache in a directory that cannot be written: templates that are not cached are compiled
+    on every start instead of failing to load"""
+
+    def dump_bytecode(self, bucket: jinja2.bccache.Bucket):
+        pass
+
+
+def get_bytecode_cache(config: dict) -> Optional[jinja2.BytecodeCache]:
+    """Creates the on-disk cache of compiled templates (shared by all workers and kept across restarts).
+    Entries are keyed by the template and the checksum of its source, so changed templates are compiled again.
+
+    Args:
+        config (dict): the "templates" config
+
+    Returns:
+        Optional[jinja2.BytecodeCache]: the cache or None if it is disabled or its directory cannot be created
+    """
+    directory = config.get("bytecode_cache")
+    if not directory:
+        return None
+
+    # relative to the backend or absolute (e.g. outside of the code in a read-only image)
+    directory = os.path.join(BASE_PATH, os.path.expanduser(directory))
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as error:
+        LOG.warning(f"Templates are compiled without bytecode cache: {error}")
+        return None
+    if not os.access(directory, os.W_OK):
+        # e.g. precompiled into a read-only image
+        LOG.warning(f"The bytecode cache {directory} is not writable, it is only read")
+        return ReadOnlyBytecodeCache(directory)
+    return jinja2.FileSystemBytecodeCache(directory)
+
+
+def get_environment_options(config: dict, debug: bool = False) -> dict:
+    """Options of the jinja2 environment of the app
+
+    Args:
+        config (dict): the "templates" config
+        debug (bool, optional): development mode (templates are reloaded if auto_reload is not configured). Defaults to False.
+
+    Returns:
+        dict: loader, bytecode_cache and auto_reload
+    """
+    auto_reload = config.get("auto_reload")
+    return {
+        "loader": jinja2.FileSystemLoader(TEMPLATES_PATH),
+        "bytecode_cache": get_bytecode_cache(config),
+        # without auto reload, loaded templates are never checked for changes on disk
+        "auto_reload": debug if auto_reload is None else auto_reload,
+    }
+
+
+def precompile(env: jinja2.Environment) -> int:
+    """Loads all templates, so they are compiled (or loaded from the bytecode cache) before the first request
+
+    Args:
+        env (jinja2.Environment): the environment
+
+    Returns:
+        int: number of templates
+    """
+    start = time.perf_counter()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    LOG.info(
+        f"Precompiled {len(names)} templates in {time.perf_counter() - start:.3f}s"
+    )
+    return len(names)
+
+
+@click.command()
+@click.option(
+    "--config",
+    "config_path",
+    default=os.path.join(BASE_PATH, "config_default.yml"),
+    help="config file with the templates settings",
+)
+def main(config_path: str):
+    """Fills the bytecode cache at build time (e.g. in the image), so workers never compile templates"""
+    with open(config_path, "r") as ymlfile:
+        config = yaml.load(ymlfile, Loader=yaml.Loader).get("templates", {})
+    if not config.get("bytecode_cache"):
+        raise click.ClickException("templates.bytecode_cache is not configured")
+
+    # autoescape has to match the environment of aiohttp_jinja2, it is compiled into the templates
+    env = jinja2.Environment(autoescape=True, **get_environment_options(config))
+    if env.bytecode_cache is None or isinstance(
+        env.bytecode_cache, ReadOnlyBytecodeCache
+    ):
+        raise click.ClickException(
+            f"the bytecode cache {config['bytecode_cache']} cannot be written"
+        )
+    click.echo(
+        f"Precompiled {precompile(env)} templates into {config['bytecode_cache']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
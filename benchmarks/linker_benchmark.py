@@ -0,0 +1,249 @@
+"""Benchmarks of the linker against synthetic lore.
+
+Timings depend on the machine, so the baseline is never committed: the first run on a machine stores its
+results in benchmarks/baseline.json and later runs are compared with it. Regenerate the baseline with --save
+(or by deleting the file) after changing the machine or accepting a slowdown.
+
+Usage:
+    python -m benchmarks.linker_benchmark                 # run and compare with benchmarks/baseline.json
+    python -m benchmarks.linker_benchmark --save          # run and store the results as new baseline
+"""
+
+import asyncio
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, Optional
+import click
+from backend.api import linker
+from backend.api.known_records import KnownRecords
+from backend.db_clients.memory_client import MemoryClient
+from benchmarks.lore_generator import generate_lore
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def get_host() -> dict:
+    """the machine and interpreter the results were measured on (baselines of other hosts are not compared)"""
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+    }
+
+
+def measure(func: Callable, items: int, repeat: int = 3) -> dict:
+    """Runs func repeat times and returns the best duration, the throughput and the peak memory of the first run
+
+    Args:
+        func (Callable): the benchmarked function (without arguments)
+        items (int): number of items processed by one call of func (for the throughput)
+        repeat (int, optional): number of runs. Defaults to 3.
+
+    Returns:
+        dict: seconds, items_per_second and peak_memory_kib
+    """
+    # memory is traced in a separate run because tracing slows everything down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    seconds = min(durations)
+    return {
+        "seconds": round(seconds, 6),
+        "items_per_second": round(items / seconds, 2) if seconds else None,
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(lore_options: dict, repeat: int = 3) -> dict:
+    """Generates the lore and runs all benchmarks on it
+
+    Args:
+        lore_options (dict): arguments of generate_lore
+        repeat (int, optional): number of runs per benchmark. Defaults to 3.
+
+    Returns:
+        dict: the results by benchmark name
+    """
+    records = generate_lore(**lore_options)
+    words = sum(
+        len(article.split())
+        for record in records
+        for article in record["articles"].values()
+    )
+    loop = asyncio.new_event_loop()
+
+    async def create_client() -> MemoryClient:
+        client = MemoryClient()
+        for record in records:
+            await client.store(copy.deepcopy(record))
+        return client
+
+    db_client = loop.run_until_complete(create_client())
+    records_map = loop.run_until_complete(linker.get_known_records_map(db_client))
+    name_variants = linker.build_name_variants(records_map)
+    matcher = linker.build_mention_matcher(records_map, name_variants)
+
+    def bench_get_known_records_map():
+        loop.run_until_complete(linker.get_known_records_map(db_client))
+
+    def bench_insert_links():
+        for record in records:
+            linker.insert_links(
+                copy.deepcopy(record), records_map, matcher, "html", name_variants
+            )
+
+    def bench_link_all():
+        # every run starts from the unlinked lore without link state
+        client = loop.run_until_complete(create_client())
+        known_records = KnownRecords()
+        loop.run_until_complete(known_records.load(client))
+        app = SimpleNamespace(
+            db_clients={"mongo": client},
+            known_records=known_records,
+            config={"linker": {"storage": "html"}},
+        )
+        loop.run_until_complete(linker.link_all(app))
+
+    person = next(record for record in records if record["type"] == "person")
+    long_text = " ".join(
+        article for record in records for article in record["articles"].values()
+    )
+    substrings = linker.get_all_possible_names_from_record(person)
+
+    def bench_recursive_replace():
+        linker.recursive_replace_substings_with_links(
+            long_text, substrings, person["name_id"]
+        )
+
+    try:
+        return {
+            "get_known_records_map": measure(
+                bench_get_known_records_map, len(records), repeat
+            ),
+            "insert_links": measure(bench_insert_links, len(records), repeat),
+            "link_all": measure(bench_link_all, len(records), repeat),
+            "recursive_replace_substings_with_links": measure(
+                bench_recursive_replace, len(long_text.split()), repeat
+            ),
+            "lore": {**lore_options, "records": len(records), "words": words},
+            "host": get_host(),
+        }
+    finally:
+        loop.close()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a description of every benchmark that is more than tolerance slower than in the baseline"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if name in ("lore", "host") or not previous:
+            continue
+        if result["seconds"] > previous["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['seconds']:.4f}s (baseline {previous['seconds']:.4f}s)"
+            )
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict] = None):
+    click.echo(
+        f"{'benchmark':<42}{'seconds':>10}{'items/s':>14}{'peak KiB':>12}{'baseline s':>12}"
+    )
+    for name, result in results.items():
+        if name in ("lore", "host"):
+            continue
+        previous = (baseline or {}).get(name, {}).get("seconds")
+        click.echo(
+            f"{name:<42}{result['seconds']:>10.4f}{result['items_per_second']:>14.1f}"
+            f"{result['peak_memory_kib']:>12.1f}{previous if previous is not None else '-':>12}"
+        )
+
+
+@click.command()
+@click.option("--persons", default=500, help="Number of generated persons")
+@click.option("--locations", default=250, help="Number of generated locations")
+@click.option("--organizations", default=250, help="Number of generated organizations")
+@click.option("--articles", default=3, help="Number of articles per record")
+@click.option("--article-words", default=300, help="Number of words per article")
+@click.option(
+    "--mention-density", default=0.05, help="Share of article words that are mentions"
+)
+@click.option("--seed", default=42, help="Seed of the lore generator")
+@click.option("--repeat", default=3, help="Number of runs per benchmark (best counts)")
+@click.option(
+    "--tolerance",
+    default=0.25,
+    help="Allowed slowdown compared to the baseline before failing",
+)
+@click.option("--baseline", default=BASELINE_PATH, help="Path of the baseline file")
+@click.option("--save", is_flag=True, help="Store the results as new baseline")
+def main(
+    persons,
+    locations,
+    organizations,
+    articles,
+    article_words,
+    mention_density,
+    seed,
+    repeat,
+    tolerance,
+    baseline,
+    save,
+):
+    lore_options = {
+        "persons": persons,
+        "locations": locations,
+        "organizations": organizations,
+        "articles": articles,
+        "article_words": article_words,
+        "mention_density": mention_density,
+        "seed": seed,
+    }
+    results = run_benchmarks(lore_options, repeat)
+
+    previous = None
+    if os.path.exists(baseline):
+        with open(baseline) as file:
+            previous = json.load(file)
+        previous_lore = previous.get("lore", {})
+        if {key: previous_lore.get(key) for key in lore_options} != lore_options:
+            click.echo("baseline was measured with another lore, not comparing")
+            previous = None
+        elif previous.get("host") != results["host"]:
+            click.echo(
+                "baseline was measured on another host, not comparing (regenerate it with --save)"
+            )
+            previous = None
+
+    print_results(results, previous)
+
+    if save or not os.path.exists(baseline):
+        # the first run on a machine is its baseline
+        with open(baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        click.echo(f"saved baseline to {baseline}")
+        return
+
+    regressions = compare(results, previous or {}, tolerance)
+    if regressions:
+        click.echo("regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Generator for synthetic lore used by the benchmarks."""
+
+import random
+import string
+from typing import List
+from bson import ObjectId
+
+FILLER_WORDS = [
+    "und",
+    "der",
+    "die",
+    "das",
+    "mit",
+    "von",
+    "nach",
+    "gegen",
+    "wurde",
+    "hatte",
+    "seine",
+    "ihre",
+    "kampf",
+    "reise",
+    "stadt",
+    "burg",
+    "schwert",
+    "krone",
+    "winter",
+    "handel",
+]
+
+
+def _random_name(rng: random.Random, length: int = 7) -> str:
+    # names must not contain digits or '_' so their purified name stays unique
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def _generate_records(
+    rng: random.Random, record_type: str, amount: int, used_names: set
+) -> List[dict]:
+    records = []
+    while len(records) < amount:
+        name = _random_name(rng)
+        if name in used_names:
+            continue
+        used_names.add(name)
+
+        record = {
+            "_id": ObjectId(),
+            "type": record_type,
+            "name_id": name,
+            "infobox": {"general": {"origin": None}},
+            "articles": {},
+        }
+        if record_type == "person":
+            record["names"] = [name.capitalize(), _random_name(rng, 5).capitalize()]
+            record["last_name"] = _random_name(rng, 9).capitalize()
+        records.append(record)
+    return records
+
+
+def _mention(rng: random.Random, record: dict) -> str:
+    if record["type"] != "person":
+        return record["name_id"].capitalize()
+
+    # use all kinds of name variants of persons
+    names = record["names"]
+    return rng.choice(
+        [
+            names[0],
+            " ".join(names),
+            f"{names[0]} {record['last_name']}",
+            f"{' '.join(names)} {record['last_name']}",
+        ]
+    )
+
+
+def generate_article(
+    rng: random.Random, records: List[dict], words: int, mention_density: float
+) -> str:
+    """Generates an article of filler words in which roughly mention_density of all words are mentions of records
+
+    Args:
+        rng (random.Random): random number generator (seeded for reproducible lore)
+        records (List[dict]): the records that can be mentioned
+        words (int): number of words of the article
+        mention_density (float): share of words that are mentions (0.0 - 1.0)
+
+    Returns:
+        str: the article text
+    """
+    parts = []
+    for _ in range(words):
+        if records and rng.random() < mention_density:
+            parts.append(_mention(rng, rng.choice(records)))
+        else:
+            parts.append(rng.choice(FILLER_WORDS))
+    return " ".join(parts) + "."
+
+
+def generate_lore(
+    persons: int = 500,
+    locations: int = 250,
+    organizations: int = 250,
+    articles: int = 3,
+    article_words: int = 300,
+    mention_density: float = 0.05,
+    seed: int = 42,
+) -> List[dict]:
+    """Generates a synthetic lore of unlinked records
+
+    Args:
+        persons (int, optional): number of person records. Defaults to 500.
+        locations (int, optional): number of location records. Defaults to 250.
+        organizations (int, optional): number of organization records. Defaults to 250.
+        articles (int, optional): number of articles per record. Defaults to 3.
+        article_words (int, optional): number of words per article. Defaults to 300.
+        mention_density (float, optional): share of article words that mention other records. Defaults to 0.05.
+        seed (int, optional): seed of the random number generator. Defaults to 42.
+
+    Returns:
+        List[dict]: the generated records
+    """
+    rng = random.Random(seed)
+    used_names = set()
+    records = (
+        _generate_records(rng, "person", persons, used_names)
+        + _generate_records(rng, "location", locations, used_names)
+        + _generate_records(rng, "organization", organizations, used_names)
+    )
+
+    locations = [record for record in records if record["type"] == "location"]
+    for record in records:
+        if locations:
+            record["infobox"]["general"]["origin"] = rng.choice(locations)[
+                "name_id"
+            ].capitalize()
+        for index in range(articles):
+            record["articles"][f"article_{index}"] = generate_article(
+                rng, records, article_words, mention_density
+            )
+    return records
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+from backend.api import backlinks, linker
+from backend.api.known_records import KnownRecords
+from backend.db_clients.memory_client import MemoryClient
+
+
+def test_unlink_record():
+    record = {
+        "infobox": {"origin": '<a href="umaron">Umaron</a>', "age": 58},
+        "articles": {
+            "history": 'Aus <a href="umaron">Umaron</a> zu <a href="garrett">Garrett</a>',
+            "empty": None,
+        },
+    }
+    backlinks.unlink_record(record, "umaron")
+    assert record == {
+        "infobox": {"origin": "Umaron", "age": 58},
+        "articles": {
+            "history": 'Aus Umaron zu <a href="garrett">Garrett</a>',
+            "empty": None,
+        },
+    }
+
+
+def test_relink_backlinks_stamps_the_link_state():
+    app = SimpleNamespace(
+        config={"linker": {"storage": "html"}},
+        db_clients={},
+        known_records=KnownRecords(),
+    )
+    db_client = MemoryClient(app)
+    db_client.on_write.append(app.known_records.on_write)
+    umaron_id = asyncio.run(db_client.store({"name_id": "umaron", "type": "location"}))
+    asyncio.run(
+        db_client.store(
+            {
+                "name_id": "garrett",
+                "type": "location",
+                "articles": {"history": 'Founded by <a href="umaron">Umaron</a>'},
+                "linked_records": [umaron_id],
+            }
+        )
+    )
+    asyncio.run(db_client.delete({"_id": umaron_id}, None))
+
+    assert asyncio.run(backlinks.relink_backlinks(app, umaron_id, "umaron")) == 1
+    garrett = asyncio.run(db_client.find({"name_id": "garrett"}))
+    assert garrett["articles"]["history"] == "Founded by Umaron"
+    assert garrett["link_state"]["hash"] == linker.get_content_hash(garrett)
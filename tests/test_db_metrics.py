@@ -0,0 +1,57 @@
+import asyncio
+from prometheus_client import REGISTRY
+from backend.db_clients import metrics
+from backend.db_clients.memory_client import MemoryClient
+
+
+def sample(name: str, operation: str, collection: str = "metrics_test") -> float:
+    labels = {"operation": operation, "collection": collection}
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_instrument_is_a_noop_when_disabled():
+    client = MemoryClient(default_coll="metrics_test")
+    find = client.find
+    metrics.instrument(client, {"enabled": False})
+    assert client.find == find
+    assert "find" not in vars(client)
+
+
+def test_instrument_counts_operations():
+    client = metrics.instrument(
+        MemoryClient(default_coll="metrics_test"),
+        {"enabled": True, "payload_sizes": True},
+    )
+
+    async def operations():
+        await client.store({"name_id": "umaron"})
+        await client.store({"name_id": "garrett"})
+        await client.find_many({})
+        return [record async for record in client.iter_many({})]
+
+    assert len(asyncio.run(operations())) == 2
+    assert sample("db_operation_seconds_count", "store") == 2
+    assert sample("db_documents_total", "store") == 2
+    assert sample("db_documents_total", "find_many") == 2
+    assert sample("db_payload_bytes_total", "find_many") > 0
+    assert sample("db_documents_total", "iter_many") == 2
+
+
+def test_nested_operations_are_recorded_once():
+    client = MemoryClient(default_coll="metrics_nested")
+
+    async def delete(filter, data, **kwargs):
+        # like a false delete, which is written with update
+        return await client.update(filter, {"$set": {"deleted": True}})
+
+    client.delete = delete
+    metrics.instrument(client, {"enabled": True})
+
+    async def operations():
+        record_id = await client.store({"name_id": "umaron"})
+        await client.delete({"_id": record_id}, None)
+        await client.update({"_id": record_id}, {"$set": {"deleted": False}})
+
+    asyncio.run(operations())
+    assert sample("db_operation_seconds_count", "delete", "metrics_nested") == 1
+    assert sample("db_operation_seconds_count", "update", "metrics_nested") == 1
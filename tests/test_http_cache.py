@@ -0,0 +1,77 @@
+import datetime
+from types import SimpleNamespace
+import pytest
+from aiohttp.test_utils import make_mocked_request
+from bson import ObjectId
+from backend import http_cache
+
+
+@pytest.fixture
+def app():
+    return SimpleNamespace(
+        config={"linker": {"storage": "html"}},
+        page_version="templates-v1",
+        known_records=SimpleNamespace(version=1),
+    )
+
+
+@pytest.fixture
+def record():
+    return {
+        "_id": ObjectId("611be36d862be82b4a41ee68"),
+        "creation_date": datetime.datetime(2021, 8, 17, 16, 0, 0, 500),
+    }
+
+
+def test_etag_follows_record_and_page_versions(app, record):
+    validators = http_cache.get_record_validators(app, record)
+    assert validators["last_modified"].tzinfo == datetime.timezone.utc
+    assert http_cache.get_record_validators(app, dict(record)) == validators
+
+    modified = {**record, "last_modified": datetime.datetime(2021, 8, 18)}
+    assert http_cache.get_record_validators(app, modified)["etag"] != validators["etag"]
+
+    app.page_version = "templates-v2"
+    assert http_cache.get_record_validators(app, record)["etag"] != validators["etag"]
+
+    assert http_cache.get_record_validators(app, {"_id": record["_id"]}) is None
+
+
+def test_is_not_modified(app, record):
+    validators = http_cache.get_record_validators(app, record)
+
+    def request(headers: dict):
+        return make_mocked_request("GET", "/records/umaron", headers=headers)
+
+    assert http_cache.is_not_modified(
+        request({"If-None-Match": f'"other", "{validators["etag"]}"'}), validators
+    )
+    assert not http_cache.is_not_modified(
+        request({"If-None-Match": '"other"'}), validators
+    )
+    assert http_cache.is_not_modified(
+        request({"If-Modified-Since": "Tue, 17 Aug 2021 16:00:00 GMT"}), validators
+    )
+    assert not http_cache.is_not_modified(
+        request({"If-Modified-Since": "Tue, 17 Aug 2021 15:59:59 GMT"}), validators
+    )
+    # the ETag wins
+    assert not http_cache.is_not_modified(
+        request(
+            {
+                "If-None-Match": '"other"',
+                "If-Modified-Since": "Tue, 17 Aug 2021 16:00:00 GMT",
+            }
+        ),
+        validators,
+    )
+    assert not http_cache.is_conditional(request({}))
+
+
+def test_parse_conditional_headers():
+    assert http_cache.parse_etags(None) is None
+    assert http_cache.parse_etags('W/"abc", "def", *') == ["abc", "def", "*"]
+    assert http_cache.parse_http_date("Tue, 17 Aug 2021 16:00:00 GMT") == (
+        datetime.datetime(2021, 8, 17, 16, tzinfo=datetime.timezone.utc)
+    )
+    assert http_cache.parse_http_date("yesterday") is None
@@ -0,0 +1,41 @@
+import asyncio
+from pymongo import ASCENDING
+from backend import indexes
+
+
+class FakeCollection:
+    def __init__(self, existing, stats):
+        self.existing = existing
+        self.stats = stats
+
+    async def list_indexes(self):
+        for name in self.existing:
+            yield {"name": name}
+
+    async def aggregate(self, pipeline):
+        for name, ops in self.stats.items():
+            yield {"name": name, "accesses": {"ops": ops}}
+
+
+def test_get_index_report():
+    spec = {
+        "records": [
+            {"keys": [("name_id", ASCENDING)], "unique": True},
+            {"keys": [("linked_records", ASCENDING)]},
+        ]
+    }
+    db = {
+        "records": FakeCollection(
+            ["_id_", "name_id_1", "type_1"],
+            {"_id_": 0, "name_id_1": 12, "type_1": 0},
+        )
+    }
+
+    report = asyncio.run(indexes.get_index_report(db, spec))
+    assert report == {
+        "records": {
+            "missing": ["linked_records_1"],
+            "unknown": ["type_1"],
+            "unused": ["type_1"],
+        }
+    }
@@ -0,0 +1,148 @@
+import pytest
+from bson import ObjectId
+from backend.api.known_records import KnownRecords
+
+## Fixtures ##
+
+
+@pytest.fixture
+def umaron():
+    return {
+        "_id": ObjectId("611be36d862be82b4a41ee68"),
+        "name_id": "umaron",
+        "type": "location",
+        "infobox": {},
+    }
+
+
+@pytest.fixture
+def nolen():
+    return {
+        "_id": ObjectId("0123456789ab0123456789ab"),
+        "name_id": "nolen2",
+        "type": "person",
+        "names": ["Nolen"],
+        "last_name": "Silverbridge",
+    }
+
+
+@pytest.fixture
+def nolen1():
+    return {
+        "_id": ObjectId("666f6f2d6261722d71757578"),
+        "name_id": "nolen1",
+        "type": "person",
+        "names": ["Nolen"],
+    }
+
+
+@pytest.fixture
+def known_records(umaron, nolen):
+    known_records = KnownRecords()
+    known_records.upsert([umaron, nolen])
+    return known_records
+
+
+## Tests ##
+
+
+def test_upsert_projects_records(known_records, umaron):
+    records_map = known_records.snapshot().records_map
+    assert set(records_map) == {"umaron", "nolen"}
+    assert records_map["umaron"] == {
+        "_id": umaron["_id"],
+        "name_id": "umaron",
+        "type": "location",
+    }
+
+
+def test_snapshots_are_not_modified(known_records, umaron):
+    snapshot = known_records.snapshot()
+    known_records.remove([umaron["_id"]])
+
+    assert "umaron" in snapshot.records_map
+    assert "umaron" not in known_records.snapshot().records_map
+    assert known_records.version == snapshot.version + 1
+
+
+def test_shared_names(known_records, nolen, nolen1):
+    known_records.upsert([nolen1])
+    entry = known_records.snapshot().records_map["nolen"]
+    assert entry["name_id"] == "nolen2"
+
+    # updating the first record keeps it as the entry of the name
+    known_records.upsert([{**nolen, "last_name": "Goldbridge"}])
+    entry = known_records.snapshot().records_map["nolen"]
+    assert entry["last_name"] == "Goldbridge"
+
+    known_records.remove([nolen["_id"]])
+    entry = known_records.snapshot().records_map["nolen"]
+    assert entry["name_id"] == "nolen1"
+
+
+def test_rename(known_records, umaron):
+    known_records.upsert([{**umaron, "name_id": "umaron_city"}])
+    records_map = known_records.snapshot().records_map
+    assert records_map["umaron"]["name_id"] == "umaron_city"
+
+    known_records.upsert([{**umaron, "name_id": "danamark"}])
+    records_map = known_records.snapshot().records_map
+    assert "umaron" not in records_map
+    assert records_map["danamark"]["_id"] == umaron["_id"]
+
+
+def test_matcher_follows_the_snapshot(known_records, umaron):
+    assert known_records.snapshot().matcher.find("Umaron") == [(0, 6, "umaron")]
+    known_records.remove([umaron["_id"]])
+    assert known_records.snapshot().matcher.find("Umaron") == []
+
+
+def test_extend(known_records, nolen1):
+    snapshot = known_records.snapshot()
+    extended = snapshot.extend(
+        [nolen1, {"_id": ObjectId(), "name_id": "garrett", "type": "person"}]
+    )
+
+    assert extended.records_map["garrett"]["name_id"] == "garrett"
+    assert extended.records_map["nolen"] is snapshot.records_map["nolen"]
+    assert extended.version != snapshot.version
+    assert extended.version != snapshot.extend([]).version
+
+    assert "garrett" not in snapshot.records_map
+
+
+def test_complete_follows_writes(known_records, umaron, nolen):
+    assert known_records.complete("nol") == [
+        {
+            "name": "Nolen",
+            "_id": nolen["_id"],
+            "name_id": "nolen2",
+            "type": "person",
+        },
+        {
+            "name": "Nolen Silverbridge",
+            "_id": nolen["_id"],
+            "name_id": "nolen2",
+            "type": "person",
+        },
+    ]
+    assert known_records.complete("u", types=["person"]) == []
+
+    known_records.upsert([{**nolen, "last_name": "Goldbridge"}])
+    assert [completion["name"] for completion in known_records.complete("nol")] == [
+        "Nolen",
+        "Nolen Goldbridge",
+    ]
+
+    known_records.upsert([{**umaron, "name_id": "danamark"}])
+    assert known_records.complete("uma") == []
+    assert known_records.complete("dana")[0]["_id"] == umaron["_id"]
+
+
+def test_writes_without_known_field_changes_keep_the_snapshot(known_records, umaron):
+    snapshot = known_records.snapshot()
+    known_records.upsert([{**umaron, "articles": {"history": "Founded by Garrett"}}])
+    assert known_records.snapshot() is snapshot
+
+    known_records.upsert([{**umaron, "type": "city"}])
+    assert known_records.version == snapshot.version + 1
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from backend.api.link_pipeline import LinkPipeline
+
+
+async def stream(items):
+    for item in items:
+        yield item
+
+
+def test_pipeline_links_and_writes_all_records():
+    written = []
+
+    async def link(record):
+        await asyncio.sleep(0)
+        return None if record["skip"] else record["id"]
+
+    async def write(linked):
+        async for item in linked:
+            written.append(item)
+        return len(written)
+
+    records = [{"id": index, "skip": index % 3 == 0} for index in range(100)]
+    pipeline = LinkPipeline(link, write, link_concurrency=3, queue_size=5)
+    stats = asyncio.run(pipeline.run(stream(records)))
+
+    assert sorted(written) == [index for index in range(100) if index % 3]
+    assert stats == {"read": 100, "linked": 66, "skipped": 34, "written": 66}
+
+
+def test_pipeline_raises_link_errors():
+    async def link(record):
+        raise ValueError("broken record")
+
+    async def write(linked):
+        return len([item async for item in linked])
+
+    pipeline = LinkPipeline(link, write, link_concurrency=2, queue_size=1)
+    with pytest.raises(ValueError):
+        asyncio.run(pipeline.run(stream([{}] * 10)))
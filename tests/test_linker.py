@@ -1,7 +1,12 @@
+import asyncio
+import copy
 import pytest
 import yaml
 import os
+from types import SimpleNamespace
 from backend.api import linker
+from backend.api.known_records import KnownRecords
+from backend.db_clients.memory_client import MemoryClient
 from bson import ObjectId
 
 ## Fixtures ##
@@ -136,30 +141,6 @@ def test_get_all_possible_names_from_record(nolen_record, nolen_possible_names):
     )
 
 
-@pytest.mark.parametrize(
-    "input_text, expected",
-    [
-        ("", (None, -1)),
-        ("Seine Freunde nannten ihn Nolen.", ("Nolen", 26)),
-        (
-            "Getauft wurde er Nolen Constantin Lepidus.",
-            ("Nolen Constantin Lepidus", 17),
-        ),
-        (
-            "Doch Nolen Constantin Lepidus Silverbridge war sein ganzer Name.",
-            ("Nolen Constantin Lepidus Silverbridge", 5),
-        ),
-        (
-            'Der <a href="nolen2">Nolen Constantin Lepidus Silverbridge</a> Typ',
-            (None, -1),
-        ),
-    ],
-)
-def test_get_longest_matching_substring(input_text, expected, nolen_possible_names):
-    result = linker.get_longest_matching_substring(input_text, nolen_possible_names)
-    assert result == expected
-
-
 @pytest.mark.parametrize(
     "input_text, name_id, expected",
     [
@@ -283,3 +264,193 @@ def test_insert_links(nolen_record, replace_context_nolen):
     # don't link to own page
     assert nolen_record["articles"]["description"].find("Nolen") == 0
     assert ObjectId("0123456789ab0123456789ab") not in nolen_record["linked_records"]
+
+
+def test_insert_links_into_articles_is_idempotent(nolen_record, replace_context_nolen):
+    articles, linked_ids = linker.insert_links_into_articles(
+        nolen_record["articles"], replace_context_nolen
+    )
+    linked_articles = dict(articles)
+
+    articles, relinked_ids = linker.insert_links_into_articles(
+        articles, replace_context_nolen
+    )
+    assert articles == linked_articles
+    assert relinked_ids == linked_ids
+
+
+def test_link_mentions_does_not_nest_links(replace_context_nolen):
+    matcher = linker.build_mention_matcher(replace_context_nolen)
+    text, mentioned = linker.link_mentions(
+        'Vor <a href="elsewhere">Umaron</a> und Umaron', replace_context_nolen, matcher
+    )
+    assert text == 'Vor <a href="elsewhere">Umaron</a> und <a href="umaron">Umaron</a>'
+    assert mentioned == {"umaron"}
+
+
+def test_get_changed_records(replace_context_nolen):
+    fingerprints = linker.get_known_records_fingerprints(replace_context_nolen)
+    link_state = {"generation": 1, "records": list(fingerprints.values())}
+    assert linker.get_changed_records(link_state, fingerprints) == (set(), set())
+
+    replace_context_nolen["garrett"]["last_name"] = "von Umaron"
+    del replace_context_nolen["umaron"]
+    changed_keys, changed_ids = linker.get_changed_records(
+        link_state, linker.get_known_records_fingerprints(replace_context_nolen)
+    )
+    assert changed_keys == {"garrett", "umaron"}
+    assert changed_ids == {
+        ObjectId("666f6f2d6261722d71757578"),
+        ObjectId("611be36d862be82b4a41ee68"),
+    }
+
+
+def test_link_all_removes_links_to_deleted_records():
+    app = SimpleNamespace(
+        config={"linker": {"storage": "html"}},
+        db_clients={},
+        known_records=KnownRecords(),
+    )
+    db_client = MemoryClient(app)
+    db_client.on_write.append(app.known_records.on_write)
+    umaron_id = asyncio.run(db_client.store({"name_id": "umaron", "type": "location"}))
+    asyncio.run(
+        db_client.store(
+            {
+                "name_id": "garrett",
+                "type": "location",
+                "articles": {"history": "Founded by Umaron"},
+            }
+        )
+    )
+    asyncio.run(app.known_records.load(db_client))
+    asyncio.run(linker.link_all(app))
+    garrett = asyncio.run(db_client.find({"name_id": "garrett"}))
+    assert garrett["articles"]["history"] == 'Founded by <a href="umaron">Umaron</a>'
+
+    # deleted while nothing relinked the records linking to it
+    asyncio.run(db_client.delete({"_id": umaron_id}, None))
+    asyncio.run(linker.link_all(app))
+
+    garrett = asyncio.run(db_client.find({"name_id": "garrett"}))
+    assert garrett["articles"]["history"] == "Founded by Umaron"
+
+
+def test_needs_relink(nolen_record, replace_context_nolen):
+    no_changes = (set(), set(), linker.build_mention_matcher({}))
+    assert linker.needs_relink(nolen_record, *no_changes)
+
+    nolen_record["link_state"] = {
+        "generation": 1,
+        "hash": linker.get_content_hash(nolen_record),
+    }
+    assert not linker.needs_relink(nolen_record, *no_changes)
+
+    changed_matcher = linker.build_mention_matcher(
+        {"garrett": replace_context_nolen["garrett"]}
+    )
+    assert linker.needs_relink(nolen_record, {"garrett"}, set(), changed_matcher)
+
+    nolen_record["articles"]["history"] = "Ein neuer Absatz"
+    assert linker.needs_relink(nolen_record, *no_changes)
+
+
+def test_insert_links_lists_linked_records_once(nolen_record, replace_context_nolen):
+    nolen_record["articles"]["history"] = "Garrett und Garrett aus Umaron"
+    linker.insert_links(nolen_record, replace_context_nolen)
+    assert nolen_record["linked_records"] == [
+        ObjectId("611be36d862be82b4a41ee68"),
+        ObjectId("666f6f2d6261722d71757578"),
+    ]
+
+
+def test_render_mentions_equals_html_links(nolen_record, replace_context_nolen):
+    html_record = linker.insert_links(
+        copy.deepcopy(nolen_record), replace_context_nolen
+    )
+    spans_record = linker.insert_links(
+        copy.deepcopy(nolen_record), replace_context_nolen, storage="spans"
+    )
+
+    # the text is not changed when storing spans
+    assert spans_record["articles"] == nolen_record["articles"]
+    assert spans_record["linked_records"] == html_record["linked_records"]
+
+    name_ids = {
+        record["_id"]: record["name_id"] for record in replace_context_nolen.values()
+    }
+    rendered = linker.render_mentions(spans_record, name_ids.get)
+    assert rendered["articles"] == html_record["articles"]
+    assert (
+        rendered["infobox"]["biographical_info"]["origin"]
+        == html_record["infobox"]["biographical_info"]["origin"]
+    )
+
+
+def test_render_mentions_skips_unknown_targets(nolen_record, replace_context_nolen):
+    spans_record = linker.insert_links(
+        nolen_record, replace_context_nolen, storage="spans"
+    )
+    rendered = linker.render_mentions(spans_record, lambda record_id: None)
+    assert rendered["articles"] == nolen_record["articles"]
+
+
+def test_build_name_variants(replace_context_nolen, nolen_possible_names):
+    replace_context_nolen["nolen1"] = {
+        "type": "person",
+        "names": ["Nolen"],
+        "name_id": "nolen1",
+    }
+    name_variants = linker.build_name_variants(replace_context_nolen)
+
+    assert set(name_variants) == {"garrett", "nolen", "nolen1"}
+    assert set(name_variants["nolen"]["names"]) == nolen_possible_names
+    assert name_variants["nolen"]["names"][0] == "Nolen Constantin Lepidus Silverbridge"
+    assert name_variants["nolen"]["names"][-1] == "Nolen"
+
+
+def test_recursive_replace_substings_with_links_long_text(nolen_possible_names):
+    mentions = 50000
+    text = "Nolen Silverbridge und Nolen. " * (mentions // 2)
+    linked = linker.recursive_replace_substings_with_links(
+        text, nolen_possible_names, "nolen2"
+    )
+    assert linked.count('<a href="nolen2">') == mentions
+    assert linked.startswith(
+        '<a href="nolen2">Nolen Silverbridge</a> und <a href="nolen2">Nolen</a>. '
+    )
+
+
+def test_get_record_diff_only_contains_changed_paths():
+    stored = {
+        "name_id": "garrett",
+        "creation_date": "yesterday",
+        "infobox": {"general": {"origin": "Umaron", "age": 58}},
+        "articles": {"history": "Aus Umaron", "family": "Keine", "old": "weg"},
+        "linked_records": [],
+    }
+    linked = copy.deepcopy(stored)
+    del linked["creation_date"]
+    del linked["articles"]["old"]
+    linked["infobox"]["general"]["origin"] = '<a href="umaron">Umaron</a>'
+    linked["articles"]["history"] = 'Aus <a href="umaron">Umaron</a>'
+    linked["linked_records"] = ["umaron_id"]
+
+    diff = linker.get_record_diff(stored, linked)
+    assert diff["set"] == {
+        "infobox.general.origin": '<a href="umaron">Umaron</a>',
+        "articles.history": 'Aus <a href="umaron">Umaron</a>',
+        "linked_records": ["umaron_id"],
+    }
+    assert diff["unset"] == ["articles.old"]
+    assert linker.get_record_diff(stored, copy.deepcopy(stored)) == {
+        "set": {},
+        "unset": [],
+    }
+
+
+def test_get_record_diff_sets_keys_that_are_no_field_paths():
+    diff = linker.get_record_diff(
+        {"articles": {"a.b": "alt"}}, {"articles": {"a.b": "neu"}}
+    )
+    assert diff == {"set": {"articles": {"a.b": "neu"}}, "unset": []}
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from backend.db_clients.memory_client import MemoryClient
+
+
+@pytest.fixture
+def client():
+    client = MemoryClient()
+
+    async def fill():
+        for name in ["umaron", "garrett", "nolen"]:
+            await client.store(
+                {
+                    "name_id": name,
+                    "type": "person",
+                    "articles": {"history": name},
+                    "linked_records": [name.upper()],
+                }
+            )
+
+    asyncio.run(fill())
+    return client
+
+
+def test_find_by_indexed_name_id(client):
+    collection = client.collections["records"]
+    assert "name_id" in collection.indexes
+    assert collection.candidates({"name_id": "garrett"})[0]["name_id"] == "garrett"
+
+    record = asyncio.run(client.find({"name_id": "garrett"}, ["name_id"]))
+    assert set(record) == {"_id", "name_id"}
+    assert asyncio.run(client.find({"name_id": "unknown"})) is None
+
+
+def test_find_many_filters_sort_and_limit(client):
+    records = asyncio.run(client.find_many({}, {"articles": 0}, sort=[("name_id", -1)]))
+    assert [record["name_id"] for record in records] == ["umaron", "nolen", "garrett"]
+    assert "articles" not in records[0]
+
+    first = records[-1]["_id"]
+    after = asyncio.run(client.find_many({"_id": {"$gt": first}}, ["_id"], limit=1))
+    assert len(after) == 1 and after[0]["_id"] > first
+
+    assert [
+        record["name_id"]
+        for record in asyncio.run(client.find_many({"linked_records": "NOLEN"}))
+    ] == ["nolen"]
+
+
+def test_writes(client):
+    record = asyncio.run(client.find({"name_id": "nolen"}))
+    diff = {"set": {"articles.family": "none"}, "unset": ["articles.history"]}
+    assert asyncio.run(client.apply_diff({"_id": record["_id"]}, diff)) == 1
+    assert asyncio.run(client.find({"_id": record["_id"]}))["articles"] == {
+        "family": "none"
+    }
+
+    # unique index of the records' name_id
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(client.store({"name_id": "nolen"}))
+
+    assert (
+        asyncio.run(client.replace({"_id": record["_id"]}, {"name_id": "nolan"})) == 1
+    )
+    assert asyncio.run(client.find({"name_id": "nolen"})) is None
+    assert asyncio.run(client.find({"name_id": "nolan"}))["_id"] == record["_id"]
+
+    assert asyncio.run(client.delete({"_id": record["_id"]}, None)) == 1
+    assert asyncio.run(client.find({"_id": record["_id"]})) is None
+    assert asyncio.run(client.delete({"_id": ObjectId()}, None)) == 0
+
+
+def test_store_many_skips_duplicates(client):
+    documents = [
+        {"name_id": "danamark", "type": "location"},
+        {"name_id": "nolen", "type": "person"},
+        {"name_id": "anvale", "type": "location"},
+    ]
+    stored_ids = asyncio.run(client.store_many(documents, batch_size=2))
+    assert stored_ids[0] == documents[0]["_id"]
+    assert stored_ids[1] is None
+    assert stored_ids[2] == documents[2]["_id"]
+    assert len(client.collections["records"].documents) == 5
+
+
+def test_on_write_covers_many_and_bulk_writes_of_the_default_collection():
+    client = MemoryClient()
+    client.on_write_fields = ["_id", "name_id"]
+    written = []
+
+    async def on_write(collection, operation, documents):
+        written.append((operation, documents))
+
+    client.on_write.append(on_write)
+
+    async def writes():
+        record_id = await client.store({"name_id": "umaron", "type": "location"})
+        await client.store({"state": "pending"}, coll="relink_jobs")
+        await client.update_many({}, {"$set": {"type": "city"}})
+        await client.bulk_apply_diffs(
+            [({"_id": record_id}, {"set": {"name_id": "danamark"}, "unset": []})]
+        )
+        await client.delete_many({}, None)
+        return record_id
+
+    record_id = asyncio.run(writes())
+    projected = {"_id": record_id, "name_id": "danamark"}
+    assert [operation for operation, _ in written] == [
+        "store",
+        "update",
+        "update",
+        "delete",
+    ]
+    assert written[1][1] == [{"_id": record_id, "name_id": "umaron"}]
+    assert written[2][1] == [projected]
+    assert written[3][1] == [projected]
@@ -0,0 +1,57 @@
+import pytest
+from backend.api.mention_matcher import MentionMatcher
+
+## Fixtures ##
+
+
+@pytest.fixture
+def name_matcher():
+    matcher = MentionMatcher()
+    matcher.add("Nolen", "nolen")
+    matcher.add("Nolen Silverbridge", "nolen")
+    matcher.add("Silverbridge", "silverbridge")
+    matcher.add("Umaron", "umaron")
+    return matcher.build()
+
+
+## Tests ##
+
+
+def test_iter_matches_finds_overlapping_matches(name_matcher):
+    matches = list(name_matcher.iter_matches("Nolen Silverbridge"))
+    assert (0, 5, "nolen") in matches
+    assert (0, 18, "nolen") in matches
+    assert (6, 18, "silverbridge") in matches
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", []),
+        ("nothing to see", []),
+        ("Nolen", [(0, 5, "nolen")]),
+        ("Nolen Silverbridge", [(0, 18, "nolen")]),
+        ("Umaron und Nolen", [(0, 6, "umaron"), (11, 16, "nolen")]),
+        ("minusUmaronminus", [(5, 11, "umaron")]),
+    ],
+)
+def test_find_returns_leftmost_longest_matches(text, expected, name_matcher):
+    assert name_matcher.find(text) == expected
+
+
+def test_find_ignores_values(name_matcher):
+    assert name_matcher.find("Nolen Silverbridge", ignore={"nolen"}) == [
+        (6, 18, "silverbridge")
+    ]
+
+
+def test_first_value_of_a_pattern_wins():
+    matcher = MentionMatcher()
+    matcher.add("Garrett", "garrett")
+    matcher.add("Garrett", "garrett2")
+    assert matcher.build().find("Garrett") == [(0, 7, "garrett")]
+
+
+def test_rank_follows_insertion_order(name_matcher):
+    assert name_matcher.rank("nolen") < name_matcher.rank("silverbridge")
+    assert name_matcher.rank("silverbridge") < name_matcher.rank("umaron")
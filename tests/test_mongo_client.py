@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from backend.db_clients.mongo_client import MongoClient
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+        self.finds = []
+
+    async def bulk_write(self, batch, ordered=True):
+        self.batches.append(batch)
+        return SimpleNamespace(acknowledged=True, modified_count=len(batch))
+
+    def find(self, filter, projection=None):
+        self.finds.append((filter, projection))
+
+        async def to_list(length):
+            return [{"_id": 2, "name_id": "umaron"}]
+
+        return SimpleNamespace(to_list=to_list)
+
+
+def create_client(collection: FakeCollection) -> MongoClient:
+    client = MongoClient.__new__(MongoClient)
+    client.default_coll = "records"
+    client.db = {"records": collection}
+    client.on_write = []
+    client.on_write_fields = None
+    client.cache = None
+    return client
+
+
+def test_bulk_replace_consumes_async_streams():
+    collection = FakeCollection()
+    client = create_client(collection)
+
+    async def replacements():
+        for index in range(5):
+            yield {"_id": index}, {"name_id": f"record{index}"}
+
+    modified = asyncio.run(client.bulk_replace(replacements(), batch_size=2))
+    assert modified == 5
+    assert [len(batch) for batch in collection.batches] == [2, 2, 1]
+
+
+def test_bulk_apply_diffs_skips_empty_diffs():
+    collection = FakeCollection()
+    client = create_client(collection)
+    diffs = [
+        ({"_id": 1}, {"set": {}, "unset": []}),
+        ({"_id": 2}, {"set": {"articles.history": "neu"}, "unset": ["articles.alt"]}),
+    ]
+
+    modified = asyncio.run(client.bulk_apply_diffs(diffs))
+    assert modified == 1
+    (update,) = collection.batches[0]
+    assert update._doc["$set"]["articles.history"] == "neu"
+    assert update._doc["$unset"] == {"articles.alt": ""}
+
+
+def test_bulk_writes_notify_the_projected_written_records():
+    collection = FakeCollection()
+    client = create_client(collection)
+    client.db["relink_jobs"] = collection
+    client.on_write_fields = ["_id", "name_id"]
+    written = []
+
+    async def on_write(collection, operation, documents):
+        written.append((collection, operation, documents))
+
+    client.on_write.append(on_write)
+    diffs = [({"_id": 2}, {"set": {"name_id": "umaron"}, "unset": []})]
+    asyncio.run(client.bulk_apply_diffs(diffs))
+    asyncio.run(client.bulk_apply_diffs(diffs, coll="relink_jobs"))
+    # diffs of other fields (e.g. links) are not fetched
+    link_diffs = [({"_id": 3}, {"set": {"articles.history": "neu"}, "unset": []})]
+    asyncio.run(client.bulk_apply_diffs(link_diffs))
+
+    assert collection.finds == [({"$or": [{"_id": 2}]}, ["_id", "name_id"])]
+    assert written == [("records", "update", [{"_id": 2, "name_id": "umaron"}])]
+
+
+def test_bulk_writes_do_not_leak_when_the_stream_fails():
+    class SlowCollection(FakeCollection):
+        async def bulk_write(self, batch, ordered=True):
+            await asyncio.sleep(1)
+            return await super().bulk_write(batch, ordered)
+
+    client = create_client(SlowCollection())
+
+    async def replacements():
+        for index in range(3):
+            yield {"_id": index}, {"name_id": f"record{index}"}
+        raise RuntimeError("read failed")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await client.bulk_replace(replacements(), batch_size=1)
+        return [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,54 @@
+import pytest
+from backend.api.name_trie import NameTrie
+
+## Fixtures ##
+
+
+@pytest.fixture
+def trie():
+    trie = NameTrie()
+    for record_id, name in enumerate(
+        ["Umaron", "Umar", "Umbra", "Nolen", "Nolen Silverbridge", "Garrett"]
+    ):
+        trie.add(name, record_id, name)
+    return trie
+
+
+## Tests ##
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        ("u", ["Umar", "Umaron", "Umbra"]),
+        ("UMA", ["Umar", "Umaron"]),
+        ("umaro", ["Umaron"]),
+        ("nolen ", ["Nolen Silverbridge"]),
+        ("x", []),
+        ("umarons", []),
+    ],
+)
+def test_complete(trie, prefix, expected):
+    assert trie.complete(prefix) == expected
+
+
+def test_limit_and_filter(trie):
+    assert trie.complete("", limit=2) == ["Garrett", "Nolen"]
+    assert trie.complete("u", accept=lambda name: "b" in name) == ["Umbra"]
+
+
+def test_shared_names_and_removal(trie):
+    trie.add("umar", "other", "Umar (other)")
+    assert trie.complete("umar", limit=3) == ["Umar", "Umar (other)", "Umaron"]
+    assert len(trie) == 7
+
+    trie.remove("Umar", 1)
+    trie.remove("Umar", "other")
+    trie.remove("Umbra", 2)
+    trie.remove("Umbra", 2)
+    assert trie.complete("u") == ["Umaron"]
+    assert len(trie) == 4
+
+    # the remaining key is still found after its path was merged back together
+    trie.add("Umbra", 2, "Umbra")
+    assert trie.complete("um") == ["Umaron", "Umbra"]
@@ -0,0 +1,58 @@
+import pytest
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from backend import mongo
+from backend.pool_metrics import PoolMetricsListener
+
+
+def sample(name: str, connection: str) -> float:
+    return REGISTRY.get_sample_value(name, {"connection": connection}) or 0
+
+
+def test_pool_metrics_listener():
+    listener = PoolMetricsListener("test")
+    event = SimpleNamespace(address=("mongo", 27017), reason="timeout")
+
+    listener.connection_created(event)
+    listener.connection_check_out_started(event)
+    assert sample("mongo_pool_waiters", "test") == 1
+    listener.connection_checked_out(event)
+    assert sample("mongo_pool_waiters", "test") == 0
+    assert sample("mongo_pool_connections_in_use", "test") == 1
+    assert sample("mongo_pool_checkout_seconds_count", "test") == 1
+
+    listener.connection_checked_in(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+    assert sample("mongo_pool_connections_in_use", "test") == 0
+    assert sample("mongo_pool_connections", "test") == 1
+    assert (
+        REGISTRY.get_sample_value(
+            "mongo_pool_checkout_failures_total",
+            {"connection": "test", "reason": "timeout"},
+        )
+        == 1
+    )
+
+
+def test_get_pool_options():
+    options = mongo.get_pool_options({"db": "iuun", "maxPoolSize": 10})
+    assert options == {
+        "maxPoolSize": 10,
+        "minPoolSize": 0,
+        "waitQueueTimeoutMS": None,
+        "maxIdleTimeMS": None,
+    }
+    with pytest.raises(ValueError):
+        mongo.get_pool_options({"maxPoolSize": 10, "minPoolSize": 20})
+    with pytest.raises(ValueError):
+        mongo.get_pool_options({"waitQueueTimeoutMS": -1})
+    with pytest.raises(ValueError):
+        mongo.get_pool_options({"maxPoolSize": True})
+    # pymongo rejects 0 for the timeouts
+    for option in ("waitQueueTimeoutMS", "maxIdleTimeMS"):
+        with pytest.raises(ValueError, match="positive integer"):
+            mongo.get_pool_options({option: 0})
+    # 0 is valid for the pool sizes (e.g. maxPoolSize 0 means no limit)
+    options = mongo.get_pool_options({"maxPoolSize": 0, "minPoolSize": 0})
+    assert options["maxPoolSize"] == options["minPoolSize"] == 0
@@ -0,0 +1,57 @@
+import time
+from bson import ObjectId
+from backend.db_clients.record_cache import RecordCache
+from backend.lru_cache import LRUCache
+
+
+def cached_find(cache: RecordCache, filter: dict, document: dict = None):
+    key = cache.get_key("records", filter, (), {})
+    found = cache.get(key)
+    if found is None and document is not None:
+        cache.set(document, cache.epoch)
+    return found
+
+
+def test_record_cache_by_id_and_name_id():
+    cache = RecordCache()
+    record = {"_id": ObjectId(), "name_id": "garrett", "articles": {}}
+
+    assert cached_find(cache, {"name_id": "garrett"}, record) is None
+    assert cached_find(cache, {"_id": record["_id"]}) == record
+    found = cached_find(cache, {"name_id": "garrett"})
+    assert found == record
+    # hits are copies, so callers may modify them
+    found["articles"]["history"] = "changed"
+    assert cached_find(cache, {"name_id": "garrett"}) == record
+
+
+def test_record_cache_does_not_cache_projections_or_other_collections():
+    cache = RecordCache()
+    assert cache.get_key("records", {"_id": 1}, (["name_id"],), {}) is None
+    assert cache.get_key("users", {"name_id": "garrett"}, (), {}) is None
+    assert cache.get_key("records", {"name_id": {"$in": ["garrett"]}}, (), {}) is None
+
+
+def test_record_cache_invalidation():
+    cache = RecordCache()
+    record = {"_id": ObjectId(), "name_id": "garrett"}
+    cached_find(cache, {"_id": record["_id"]}, record)
+
+    cache.invalidate("records", {"_id": record["_id"]})
+    assert cached_find(cache, {"_id": record["_id"]}) is None
+    assert cached_find(cache, {"name_id": "garrett"}) is None
+
+    # a find that started before a write must not fill the cache with what it read
+    epoch = cache.epoch
+    cache.invalidate("records", {"name_id": "garrett"})
+    cache.set(record, epoch)
+    assert cached_find(cache, {"_id": record["_id"]}) is None
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(2, ttl=0.01)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert "a" not in cache
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from backend.api import linker
+from backend.api.handlers import records
+from backend.api.known_records import KnownRecords
+from backend.api.link_executor import LinkExecutor
+from backend.db_clients.memory_client import MemoryClient
+
+## Fixtures ##
+
+
+@pytest.fixture
+def app():
+    app = SimpleNamespace(
+        config={"linker": {}},
+        db_clients={},
+        known_records=KnownRecords(),
+        link_executor=LinkExecutor(),
+        relink_queue=None,
+    )
+    db_client = MemoryClient(app)
+    db_client.on_write.append(app.known_records.on_write)
+    return app
+
+
+def request(app, data: dict, **match_info):
+    async def json():
+        return data
+
+    return SimpleNamespace(app=app, json=json, match_info=match_info)
+
+
+def post(app, data: dict) -> dict:
+    return asyncio.run(records.post(request(app, data)))
+
+
+## Tests ##
+
+
+def test_post_of_an_existing_name_id_conflicts(app):
+    assert post(app, {"name_id": "umaron", "type": "location"})["status"] == 201
+
+    response = post(app, {"name_id": "umaron", "type": "person"})
+    assert response == records.NAME_ID_CONFLICT
+    assert response["status"] == 409
+
+
+def test_rename_to_an_existing_name_id_conflicts(app):
+    post(app, {"name_id": "umaron", "type": "location"})
+    record_id = post(app, {"name_id": "garrett", "type": "location"})["data"]
+
+    response = asyncio.run(
+        records.put(
+            request(
+                app,
+                {"name_id": "umaron", "type": "location"},
+                record_id=str(record_id),
+            )
+        )
+    )
+    assert response == records.NAME_ID_CONFLICT
+    stored = asyncio.run(app.db_clients["mongo"].find({"_id": record_id}))
+    assert stored["name_id"] == "garrett"
+
+
+def test_put_stamps_the_link_state(app):
+    record_id = post(app, {"name_id": "umaron", "type": "location"})["data"]
+    data = {"name_id": "umaron", "type": "location", "articles": {"a": "neu"}}
+
+    response = asyncio.run(records.put(request(app, data, record_id=str(record_id))))
+    assert response["status"] == 200
+    stored = asyncio.run(app.db_clients["mongo"].find({"_id": record_id}))
+    assert stored["link_state"]["hash"] == linker.get_content_hash(stored)
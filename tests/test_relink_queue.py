@@ -0,0 +1,177 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from backend.api import linker, relink_queue
+from backend.api.known_records import KnownRecords
+from backend.api.link_executor import LinkExecutor
+from backend.api.relink_queue import JOBS_COLL, RelinkQueue
+from backend.db_clients.memory_client import MemoryClient
+
+## Fixtures ##
+
+
+@pytest.fixture
+def app():
+    app = SimpleNamespace(
+        config={"linker": {}},
+        db_clients={},
+        known_records=KnownRecords(),
+        link_executor=LinkExecutor(),
+    )
+    db_client = MemoryClient(app)
+    db_client.on_write.append(app.known_records.on_write)
+    return app
+
+
+@pytest.fixture
+def queue(app):
+    return RelinkQueue(app, delay=0, retry_delay=0, max_attempts=2)
+
+
+def store(app, record: dict):
+    return asyncio.run(app.db_clients["mongo"].store(record))
+
+
+def get_jobs(app) -> list:
+    return asyncio.run(app.db_clients["mongo"].find_many({}, coll=JOBS_COLL))
+
+
+def work_off(queue):
+    async def run():
+        while True:
+            job = await queue._claim()
+            if job is None:
+                return
+            await queue._run_job(job)
+
+    asyncio.run(run())
+
+
+## Tests ##
+
+
+def test_jobs_of_a_record_coalesce(app, queue):
+    record_id = store(app, {"name_id": "umaron", "type": "location"})
+    asyncio.run(queue.enqueue(record_id, ["umaron_old"]))
+    asyncio.run(queue.enqueue(record_id, ["umaron_older"]))
+    asyncio.run(queue.enqueue(record_id))
+
+    jobs = get_jobs(app)
+    assert len(jobs) == 1
+    assert jobs[0]["state"] == "pending"
+    assert jobs[0]["old_name_ids"] == ["umaron_old", "umaron_older"]
+
+
+def test_new_records_are_linked_by_existing_records(app, queue):
+    mentioning = {
+        "name_id": "garrett",
+        "type": "location",
+        "articles": {"history": "Garrett was founded by Umaron"},
+    }
+    other = {"name_id": "nolen", "type": "location", "articles": {"history": "Nolen"}}
+    store(app, mentioning)
+    store(app, other)
+    record_id = store(app, {"name_id": "umaron", "type": "location"})
+
+    asyncio.run(queue.enqueue_many([record_id]))
+    work_off(queue)
+
+    db_client = app.db_clients["mongo"]
+    relinked = asyncio.run(db_client.find({"name_id": "garrett"}))
+    assert relinked["articles"]["history"] == (
+        'Garrett was founded by <a href="umaron">Umaron</a>'
+    )
+    assert relinked["linked_records"] == [record_id]
+    # the next link_all does not relink it again
+    assert relinked["link_state"]["hash"] == linker.get_content_hash(relinked)
+    assert "last_modified" not in asyncio.run(db_client.find({"name_id": "nolen"}))
+    assert get_jobs(app) == []
+
+
+def test_links_to_the_old_name_are_replaced(app, queue):
+    record_id = store(app, {"name_id": "umaron", "type": "location"})
+    store(
+        app,
+        {
+            "name_id": "garrett",
+            "type": "location",
+            "articles": {"history": 'Founded by <a href="umaron">Umaron</a>'},
+            "linked_records": [record_id],
+        },
+    )
+    db_client = app.db_clients["mongo"]
+    asyncio.run(db_client.update({"_id": record_id}, {"$set": {"name_id": "danamark"}}))
+
+    asyncio.run(queue.enqueue(record_id, ["umaron"]))
+    work_off(queue)
+
+    relinked = asyncio.run(db_client.find({"name_id": "garrett"}))
+    assert relinked["articles"]["history"] == "Founded by Umaron"
+
+
+def test_failed_jobs_are_retried_and_kept(app, queue):
+    record_id = store(app, {"name_id": "umaron", "type": "location"})
+
+    async def fail(*args):
+        raise RuntimeError("db gone")
+
+    queue.relink = fail
+    asyncio.run(queue.enqueue(record_id))
+    work_off(queue)
+
+    jobs = get_jobs(app)
+    assert len(jobs) == 1
+    assert jobs[0]["state"] == "failed"
+    assert jobs[0]["attempts"] == 2
+
+
+def test_scan_candidates_find_mentions_within_words(app):
+    queue = RelinkQueue(app, delay=0, candidates="scan")
+    store(
+        app,
+        {
+            "name_id": "garrett",
+            "type": "location",
+            "articles": {"history": "Umaronstadt was founded by Garrett"},
+        },
+    )
+    record_id = store(app, {"name_id": "umaron", "type": "location"})
+
+    asyncio.run(queue.enqueue(record_id))
+    work_off(queue)
+
+    relinked = asyncio.run(app.db_clients["mongo"].find({"name_id": "garrett"}))
+    assert relinked["linked_records"] == [record_id]
+
+
+def test_only_stale_running_jobs_are_recovered(app, queue):
+    db_client = app.db_clients["mongo"]
+    now = datetime.datetime.utcnow()
+    for name_id, started in (
+        ("umaron", now - datetime.timedelta(hours=1)),
+        ("garrett", now),
+    ):
+        record_id = store(app, {"name_id": name_id, "type": "location"})
+        asyncio.run(
+            db_client.store(
+                {"record_id": record_id, "state": "running", "started": started},
+                coll=JOBS_COLL,
+            )
+        )
+
+    asyncio.run(queue._recover())
+
+    states = sorted(job["state"] for job in get_jobs(app))
+    assert states == ["pending", "running"]
+
+
+def test_failed_enqueue_of_new_records_is_logged(app, queue, caplog):
+    async def fail(*args):
+        raise RuntimeError("db gone")
+
+    queue.enqueue_many = fail
+    app.relink_queue = queue
+    asyncio.run(relink_queue.schedule_many(app, [ObjectId()]))
+    assert "Could not schedule" in caplog.text
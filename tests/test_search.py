@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from backend.api import search
+from backend.db_clients.memory_client import MemoryClient
+
+
+@pytest.fixture
+def db_client():
+    db_client = MemoryClient()
+
+    async def fill():
+        for record in [
+            {
+                "name_id": "garrett",
+                "type": "location",
+                "articles": {"history": "Umaron founded Garrett in the year 12"},
+            },
+            {"name_id": "umaron", "type": "location", "articles": {"history": ""}},
+            {
+                "name_id": "umaron1",
+                "type": "person",
+                "names": ["Umaron"],
+                "last_name": "Silverbridge",
+                "infobox": {"born": "Garrett"},
+            },
+            {"name_id": "nolen", "type": "person", "names": ["Nolen"]},
+        ]:
+            await db_client.store(record)
+
+    asyncio.run(fill())
+    return db_client
+
+
+def test_names_rank_higher(db_client):
+    records, next_offset = asyncio.run(search.search_records(db_client, "umaron"))
+    assert [record["name_id"] for record in records] == [
+        "umaron",
+        "umaron1",
+        "garrett",
+    ]
+    assert records[0]["score"] > records[-1]["score"]
+    assert set(records[0]) == {"_id", "name_id", "type", "score"}
+    assert next_offset is None
+
+
+def test_type_filter_and_pages(db_client):
+    records, _ = asyncio.run(search.search_records(db_client, "garrett", ["person"]))
+    assert [record["name_id"] for record in records] == ["umaron1"]
+
+    first, next_offset = asyncio.run(
+        search.search_records(db_client, "umaron garrett", limit=2)
+    )
+    assert next_offset == 2
+    second, next_offset = asyncio.run(
+        search.search_records(db_client, "umaron garrett", offset=next_offset, limit=2)
+    )
+    assert next_offset is None
+    assert len(first) == 2 and len(second) == 1
+    assert not {record["_id"] for record in first} & {
+        record["_id"] for record in second
+    }
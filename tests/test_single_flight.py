@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from backend.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_call():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"name_id": "umaron"}
+
+    async def run():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("umaron", call) for _ in range(5)))
+        assert len(flight) == 0
+        # landed flights are not cached
+        await flight.do("umaron", call)
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results)
+
+
+def test_errors_are_shared():
+    async def call():
+        await asyncio.sleep(0.01)
+        raise KeyError("umaron")
+
+    async def run():
+        flight = SingleFlight("test")
+        return await asyncio.gather(
+            *(flight.do("umaron", call) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, KeyError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return "page"
+
+    async def run():
+        flight = SingleFlight("test")
+        first = asyncio.ensure_future(flight.do("umaron", call))
+        second = asyncio.ensure_future(flight.do("umaron", call))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "page"
+    assert len(started) == 1
+
+
+def test_call_is_cancelled_with_its_last_caller():
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        flight = SingleFlight("test")
+        callers = [asyncio.ensure_future(flight.do("umaron", call)) for _ in range(2)]
+        await asyncio.sleep(0.005)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight
+
+    assert len(asyncio.run(run())) == 0
+    assert cancelled == [1]
+
+
+def test_caller_after_the_last_cancelled_caller_starts_a_new_call():
+    async def call():
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def run():
+        flight = SingleFlight("test")
+        first = asyncio.ensure_future(flight.do("umaron", call))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # the call of the first caller is being cancelled, the next caller must not join it
+        return await flight.do("umaron", call)
+
+    assert asyncio.run(run()) == "page"
@@ -0,0 +1,50 @@
+import os
+import jinja2
+from backend import template_cache
+
+
+def create_env(config: dict) -> jinja2.Environment:
+    return jinja2.Environment(
+        autoescape=True, **template_cache.get_environment_options(config)
+    )
+
+
+def test_precompile_fills_the_bytecode_cache(tmp_path, monkeypatch):
+    config = {"bytecode_cache": str(tmp_path / "cache")}
+    count = template_cache.precompile(create_env(config))
+
+    assert count > 0
+    assert len(os.listdir(tmp_path / "cache")) == count
+
+    # a new environment (e.g. another worker) loads the templates from the cache instead of compiling them
+    env = create_env(config)
+
+    def compile(*args, **kwargs):
+        raise AssertionError("template was compiled again")
+
+    monkeypatch.setattr(env, "compile", compile)
+    assert template_cache.precompile(env) == count
+
+
+def test_auto_reload_follows_debug_unless_configured():
+    assert not template_cache.get_environment_options({})["auto_reload"]
+    assert template_cache.get_environment_options({}, debug=True)["auto_reload"]
+    assert not template_cache.get_environment_options(
+        {"auto_reload": False}, debug=True
+    )["auto_reload"]
+    assert template_cache.get_environment_options({})["bytecode_cache"] is None
+
+
+def test_unusable_cache_directories_do_not_fail(tmp_path, monkeypatch):
+    # a file where the directory should be created
+    (tmp_path / "file").write_text("")
+    config = {"bytecode_cache": str(tmp_path / "file" / "cache")}
+    assert template_cache.get_bytecode_cache(config) is None
+
+    # a read-only cache is used to load templates, but never written
+    config = {"bytecode_cache": str(tmp_path / "cache")}
+    monkeypatch.setattr(template_cache.os, "access", lambda *args: False)
+    env = create_env(config)
+    assert isinstance(env.bytecode_cache, template_cache.ReadOnlyBytecodeCache)
+    assert template_cache.precompile(env) > 0
+    assert os.listdir(tmp_path / "cache") == []